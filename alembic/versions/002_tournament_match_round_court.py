@@ -0,0 +1,31 @@
+"""unique (tournament, round, court) for tournament matches
+
+Revision ID: 002_tournament_match_round_court
+Revises: 001_add_telegram_chats
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '002_tournament_match_round_court'
+down_revision: Union[str, None] = '001_add_telegram_chats'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Один матч на корт в раунде — основа идемпотентной отправки раунда
+    # (POST /tournaments/{id}/rounds). NULL в round/court не конфликтуют.
+    op.create_unique_constraint(
+        'uq_tournament_matches_round_court',
+        'tournament_matches',
+        ['tournament_id', 'round_number', 'court_number'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_tournament_matches_round_court', 'tournament_matches', type_='unique')
@@ -0,0 +1,104 @@
+"""indexes for hot query patterns
+
+Revision ID: 003_hot_query_indexes
+Revises: 002_tournament_match_round_court
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '003_hot_query_indexes'
+down_revision: Union[str, None] = '002_tournament_match_round_court'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STAT_COLUMNS = (
+    'games_played', 'wins_games', 'draws_games', 'losses_games',
+    'wins_sets', 'losses_sets', 'points_scored', 'points_conceded',
+    'delta_points', 'delta_sets',
+)
+
+# (имя, таблица, колонки, unique, WHERE)
+INDEXES = (
+    # Поиск матчей игрока (история, пересчёт рейтинга). Для tournament_id отдельный
+    # индекс не нужен: он первая колонка uq_tournament_matches_round_court (002)
+    ('ix_tournament_matches_player1_id', 'tournament_matches', 'player1_id', False, None),
+    ('ix_tournament_matches_player2_id', 'tournament_matches', 'player2_id', False, None),
+    # get_user_chats: чаты игрока по статусу участия
+    ('ix_chat_members_player_status', 'chat_members', 'player_id, status', False, None),
+    # Одна строка статистики на (player_id, mode, chat_id) — цель ON CONFLICT.
+    # NULL в unique-индексе не конфликтуют, поэтому общая статистика (chat_id IS NULL)
+    # покрыта отдельным частичным индексом
+    ('uq_player_mode_stats_player_mode_chat', 'player_mode_stats', 'player_id, mode, chat_id', True,
+     'chat_id IS NOT NULL'),
+    ('uq_player_mode_stats_player_mode_global', 'player_mode_stats', 'player_id, mode', True,
+     'chat_id IS NULL'),
+)
+
+# Триграммные индексы для /players/search (ILIKE '%q%'), только PostgreSQL
+TRGM_INDEXES = (
+    ('ix_players_display_name_trgm', 'players', 'display_name gin_trgm_ops'),
+    ('ix_players_username_trgm', 'players', 'username gin_trgm_ops'),
+    ('ix_players_tg_id_trgm', 'players', '(CAST(tg_id AS VARCHAR)) gin_trgm_ops'),
+)
+
+
+def _merge_duplicate_stats() -> None:
+    """Сливает дубликаты статистики в строку с минимальным id, иначе unique-индекс не создастся."""
+    sums = ', '.join(f'SUM(COALESCE({c}, 0)) AS {c}' for c in STAT_COLUMNS)
+    assignments = ', '.join(f'{c} = agg.{c}' for c in STAT_COLUMNS)
+    op.execute(
+        f"""
+        UPDATE player_mode_stats SET {assignments}
+        FROM (
+            SELECT MIN(id) AS keep_id, {sums}
+            FROM player_mode_stats
+            GROUP BY player_id, mode, chat_id
+            HAVING COUNT(*) > 1
+        ) AS agg
+        WHERE player_mode_stats.id = agg.keep_id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM player_mode_stats
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM player_mode_stats GROUP BY player_id, mode, chat_id
+        )
+        """
+    )
+
+
+def upgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    _merge_duplicate_stats()
+    if is_postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CREATE INDEX CONCURRENTLY не блокирует запись в большие таблицы, но не
+    # работает внутри транзакции. Если сборка прервалась, PostgreSQL оставляет
+    # невалидный индекс: удалите его (DROP INDEX CONCURRENTLY) и повторите upgrade.
+    concurrently = 'CONCURRENTLY ' if is_postgres else ''
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique, where in INDEXES:
+            op.execute(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}IF NOT EXISTS {name} "
+                f"ON {table} ({columns})" + (f' WHERE {where}' if where else '')
+            )
+        if is_postgres:
+            for name, table, expression in TRGM_INDEXES:
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin ({expression})')
+
+
+def downgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    concurrently = 'CONCURRENTLY ' if is_postgres else ''
+    with op.get_context().autocommit_block():
+        if is_postgres:
+            for name, _, _ in TRGM_INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        for name, *_ in INDEXES:
+            op.execute(f'DROP INDEX {concurrently}IF EXISTS {name}')
@@ -0,0 +1,79 @@
+"""player search key function and indexes
+
+Revision ID: 004_player_search_key
+Revises: 003_hot_query_indexes
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '004_player_search_key'
+down_revision: Union[str, None] = '003_hot_query_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Порядок и таблицы замен должны совпадать с backend/search.py (search_key)
+TRANSLIT_STEPS = (
+    ('щ', 'sch'), ('ш', 'sh'), ('ч', 'ch'), ('ж', 'zh'), ('ц', 'ts'),
+    ('ю', 'yu'), ('я', 'ya'), ('ї', 'yi'), ('є', 'ye'),
+)
+TRANSLIT_FROM = 'абвгдеёзийклмнопрстуфхыэіґъь'
+TRANSLIT_TO = 'abvgdeeziyklmnoprstufhyeig'
+LATIN_STEPS = (('kh', 'h'), ('x', 'ks'), ('w', 'v'), ('q', 'k'))
+
+SEARCH_INDEXES = (
+    # префикс имени/username и слово внутри имени (LIKE 'q%', LIKE '% q%')
+    ('ix_players_search_name_trgm', 'player_search_key(display_name) gin_trgm_ops', 'gin'),
+    ('ix_players_search_username_trgm', 'player_search_key(username) gin_trgm_ops', 'gin'),
+    # запросы короче трёх символов триграммы не покрывают — для них btree по префиксу
+    ('ix_players_search_name_prefix', 'player_search_key(display_name) text_pattern_ops', 'btree'),
+    ('ix_players_search_username_prefix', 'player_search_key(username) text_pattern_ops', 'btree'),
+)
+
+# Индексы 003 по сырым колонкам поиску больше не нужны
+OLD_TRGM_INDEXES = (
+    ('ix_players_display_name_trgm', 'display_name gin_trgm_ops'),
+    ('ix_players_username_trgm', 'username gin_trgm_ops'),
+)
+
+
+def _search_key_sql() -> str:
+    expression = 'lower(value)'
+    for src, dst in TRANSLIT_STEPS:
+        expression = f"replace({expression}, '{src}', '{dst}')"
+    expression = f"translate({expression}, '{TRANSLIT_FROM}', '{TRANSLIT_TO}')"
+    for src, dst in LATIN_STEPS:
+        expression = f"replace({expression}, '{src}', '{dst}')"
+    return f"btrim(regexp_replace({expression}, '[^a-z0-9]+', ' ', 'g'))"
+
+
+def upgrade() -> None:
+    # Вне PostgreSQL поиск работает по индексу в памяти процесса
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION player_search_key(value text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT {_search_key_sql()} $$
+        """
+    )
+    with op.get_context().autocommit_block():
+        for name, expression, method in SEARCH_INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON players USING {method} ({expression})')
+        for name, _ in OLD_TRGM_INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, expression in OLD_TRGM_INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON players USING gin ({expression})')
+        for name, *_ in SEARCH_INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    op.execute('DROP FUNCTION IF EXISTS player_search_key(text)')
@@ -0,0 +1,31 @@
+"""players index for keyset pagination by rating
+
+Revision ID: 005_players_rating_keyset
+Revises: 004_player_search_key
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '005_players_rating_keyset'
+down_revision: Union[str, None] = '004_player_search_key'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # GET /players: ORDER BY current_rating DESC, id ASC после курсора — без сортировки всей таблицы
+    concurrently = 'CONCURRENTLY ' if op.get_bind().dialect.name == 'postgresql' else ''
+    with op.get_context().autocommit_block():
+        op.execute(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS ix_players_rating_id ON players (current_rating DESC, id)'
+        )
+
+
+def downgrade() -> None:
+    concurrently = 'CONCURRENTLY ' if op.get_bind().dialect.name == 'postgresql' else ''
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX {concurrently}IF EXISTS ix_players_rating_id')
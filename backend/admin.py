@@ -0,0 +1,87 @@
+"""
+Служебные эндпоинты для администраторов сервиса (не путать с админами чатов).
+Доступ по заголовку X-Admin-Token, см. auth.require_admin.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from .auth import require_admin
+from .cache import leaderboard_cache
+from .events import tournament_events
+from .profiler import MAX_PROFILE_SECONDS, collapsed, profiler, routes_by_template
+from .request_stats import sql_stats
+from .standings import live_standings
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    """Счётчики попаданий/промахов кеша таблиц рейтинга и число живых турнирных таблиц."""
+    return {"leaderboard": leaderboard_cache.stats(), "standings": live_standings.stats()}
+
+
+@router.post("/cache/clear")
+def cache_clear():
+    """Полный сброс кеша таблиц рейтинга."""
+    leaderboard_cache.clear()
+    return {"status": "ok"}
+
+
+@router.get("/streams/stats")
+def stream_stats():
+    """Подписчики потоков турниров и число разосланных событий."""
+    return tournament_events.stats()
+
+
+@router.get("/sql/stats")
+def sql_stats_endpoint():
+    """Гистограммы длительности запросов, времени в БД и числа SQL-выражений по маршрутам."""
+    return sql_stats()
+
+
+def _profile_response(stacks, **headers) -> PlainTextResponse:
+    filename = f"profile-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.collapsed"
+    return PlainTextResponse(collapsed(stacks), headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        **{f"X-Profile-{name.title()}": str(value) for name, value in headers.items()},
+    })
+
+
+@router.post("/profile/sample")
+async def profile_sample(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    all_workers: bool = True,
+    idle: bool = False,
+):
+    """
+    Сэмплирование стеков всех потоков в течение seconds секунд (по умолчанию —
+    во всех воркерах uvicorn). Ответ — collapsed stacks для flamegraph.pl/speedscope;
+    idle=true — считать и простаивающие стеки.
+    """
+    stacks, workers = await profiler.sample(seconds, interval_ms / 1000, all_workers, idle)
+    return _profile_response(stacks, workers=workers)
+
+
+@router.post("/profile/requests")
+async def profile_requests(
+    request: Request,
+    route: str = Query(..., description="Шаблон маршрута, например /tournaments/{tournament_id}"),
+    method: Optional[str] = None,
+    count: int = Query(10, ge=1, le=1000),
+    timeout: float = Query(60, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(1, ge=1, le=1000),
+):
+    """
+    Профиль следующих count запросов маршрута в этом воркере (или всех, что
+    успеют за timeout секунд): стеки снимаются, пока такой запрос в работе.
+    """
+    routes = routes_by_template(request.app.routes, route)
+    stacks, captured = await profiler.capture_requests(
+        routes, method.upper() if method else None, count, timeout, interval_ms / 1000,
+    )
+    return _profile_response(stacks, requests=captured)
@@ -1,42 +1,187 @@
 """
 Модуль для аутентификации и авторизации.
-Пока используется упрощённая схема через заголовок X-User-Tg-Id.
-В будущем можно заменить на JWT или OAuth.
+
+Поддерживаются две схемы:
+- Authorization: Bearer <token> — подписанный сессионный токен (см. session.py),
+  проверяется без запросов к БД, роли в чатах берутся из токена;
+- заголовок X-User-Tg-Id — упрощённая схема, игрок и роли читаются из БД.
 """
-from fastapi import Header, HTTPException, Depends
+from dataclasses import dataclass, field
+from fastapi import Header, HTTPException, Depends, Query
+from sqlalchemy import case, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
-from .db import get_db
+import hmac
+import os
+from .db import get_async_db, get_db
 from .models import Player, ChatAdmin, ChatMember, TelegramChat
+from .session import SessionError, verify_stream_ticket, verify_token
 
 
-async def get_current_user(
-    x_user_tg_id: Optional[int] = Header(None, alias="X-User-Tg-Id"),
-    db: Session = Depends(get_db),
-) -> Player:
-    """
-    Получает текущего пользователя по tg_id из заголовка.
-    В продакшене это должно быть через JWT или OAuth.
-    """
-    if x_user_tg_id is None:
-        raise HTTPException(
-            status_code=401,
-            detail="Требуется аутентификация. Укажите X-User-Tg-Id в заголовке."
-        )
-    
-    player = db.query(Player).filter(Player.tg_id == x_user_tg_id).first()
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    tg_id: int
+    # {chat_id: "admin" | "member"} из токена; None — роли нужно читать из БД
+    roles: Optional[dict[int, str]] = field(default=None, compare=False)
+
+
+def _token_user(authorization: Optional[str]) -> Optional[CurrentUser]:
+    """Пользователь из Authorization: Bearer <token> или None, если заголовка нет."""
+    if not (authorization and authorization.lower().startswith("bearer ")):
+        return None
+    try:
+        payload = verify_token(authorization[7:].strip())
+    except SessionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    return CurrentUser(id=payload["pid"], tg_id=payload["tg"], roles=payload["roles"])
+
+
+def _header_user(x_user_tg_id: Optional[int], player) -> CurrentUser:
     if not player:
         raise HTTPException(
             status_code=404,
             detail=f"Игрок с tg_id={x_user_tg_id} не найден. Зарегистрируйтесь через бота."
         )
-    
-    return player
+    return CurrentUser(id=player.id, tg_id=player.tg_id)
+
+
+def _require_tg_id(x_user_tg_id: Optional[int]) -> None:
+    if x_user_tg_id is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Требуется аутентификация. Укажите X-User-Tg-Id в заголовке."
+        )
+
+
+def get_current_user(
+    authorization: Optional[str] = Header(None),
+    x_user_tg_id: Optional[int] = Header(None, alias="X-User-Tg-Id"),
+    db: Session = Depends(get_db),
+) -> CurrentUser:
+    """
+    Получает текущего пользователя из сессионного токена,
+    а если его нет — по tg_id из заголовка X-User-Tg-Id.
+
+    Для sync-эндпоинтов: сессия get_db общая с эндпоинтом (FastAPI кеширует
+    зависимость в пределах запроса), так что запрос держит одно соединение.
+    Async-эндпоинтам — get_current_user_async.
+    """
+    user = _token_user(authorization)
+    if user is not None:
+        return user
+    _require_tg_id(x_user_tg_id)
+    player = db.execute(select(Player.id, Player.tg_id).where(Player.tg_id == x_user_tg_id)).first()
+    return _header_user(x_user_tg_id, player)
+
+
+async def get_current_user_async(
+    authorization: Optional[str] = Header(None),
+    x_user_tg_id: Optional[int] = Header(None, alias="X-User-Tg-Id"),
+    db: AsyncSession = Depends(get_async_db),
+) -> CurrentUser:
+    """То же, что get_current_user, на AsyncSession — для async-эндпоинтов с get_async_db."""
+    user = _token_user(authorization)
+    if user is not None:
+        return user
+    _require_tg_id(x_user_tg_id)
+    result = await db.execute(select(Player.id, Player.tg_id).where(Player.tg_id == x_user_tg_id))
+    return _header_user(x_user_tg_id, result.first())
+
+
+async def get_stream_user(
+    tournament_id: int,
+    ticket: Optional[str] = Query(None, description="Билет потока из POST /tournaments/{id}/stream-ticket"),
+    authorization: Optional[str] = Header(None),
+    x_user_tg_id: Optional[int] = Header(None, alias="X-User-Tg-Id"),
+    db: AsyncSession = Depends(get_async_db),
+) -> CurrentUser:
+    """
+    get_current_user для долгих потоков турнира (SSE). EventSource не умеет слать
+    заголовки, поэтому вместо сессионного токена в URL передаётся короткий билет
+    этого турнира (?ticket=, см. session.issue_stream_ticket): URL попадает в логи.
+    Соединение с БД возвращается в пул сразу после проверки, а не держится
+    до конца потока.
+    """
+    try:
+        if ticket:
+            try:
+                payload = verify_stream_ticket(ticket, tournament_id)
+            except SessionError as e:
+                raise HTTPException(status_code=401, detail=str(e))
+            return CurrentUser(id=payload["pid"], tg_id=payload["tg"], roles=payload["roles"])
+        return await get_current_user_async(authorization, x_user_tg_id, db)
+    finally:
+        await db.close()
+
+
+def get_player_roles(player_id: int, db: Session) -> dict[int, str]:
+    """
+    Роли игрока во всех чатах одним запросом: {chat_id: "admin" | "member"}.
+    Админство важнее членства.
+    """
+    admin_rows = select(ChatAdmin.chat_id, literal("admin").label("role")).where(
+        ChatAdmin.admin_player_id == player_id
+    )
+    member_rows = select(ChatMember.chat_id, literal("member").label("role")).where(
+        ChatMember.player_id == player_id,
+        ChatMember.status == "active",
+    )
+    roles: dict[int, str] = {}
+    for chat_id, role in db.execute(union_all(admin_rows, member_rows)):
+        if roles.get(chat_id) != "admin":
+            roles[chat_id] = role
+    return roles
+
+
+def get_chat_role(chat_id: int, user: CurrentUser, db: Session) -> Optional[str]:
+    """Роль пользователя в чате ("admin" | "member") или None."""
+    if user.roles is not None:
+        return user.roles.get(chat_id)
+
+    is_admin = db.query(ChatAdmin).filter(
+        ChatAdmin.chat_id == chat_id,
+        ChatAdmin.admin_player_id == user.id
+    ).first() is not None
+    if is_admin:
+        return "admin"
+
+    is_member = db.query(ChatMember).filter(
+        ChatMember.chat_id == chat_id,
+        ChatMember.player_id == user.id,
+        ChatMember.status == "active"
+    ).first() is not None
+    return "member" if is_member else None
+
+
+def require_chat_role(
+    chat_id: int,
+    user: CurrentUser,
+    db: Session,
+    allow_member: bool = False,
+) -> str:
+    """
+    Проверяет, что пользователь является админом (или участником, если allow_member=True) чата.
+    Возвращает роль или выбрасывает HTTPException. С токеном не делает запросов к БД.
+    """
+    role = get_chat_role(chat_id, user, db)
+    if role == "admin" or (allow_member and role == "member"):
+        return role
+
+    # Различаем "нет такого чата" и "нет прав" только на пути ошибки
+    if db.query(TelegramChat.id).filter(TelegramChat.id == chat_id).first() is None:
+        raise HTTPException(status_code=404, detail=f"Чат с id={chat_id} не найден")
+
+    raise HTTPException(
+        status_code=403,
+        detail=f"У вас нет прав доступа к чату {chat_id}. Требуются права администратора."
+    )
 
 
 def check_chat_admin_access(
     chat_id: int,
-    user: Player,
+    user: CurrentUser,
     db: Session,
     allow_member: bool = False,
 ) -> TelegramChat:
@@ -44,72 +189,102 @@ def check_chat_admin_access(
     Проверяет, что пользователь является админом (или участником, если allow_member=True) чата.
     Возвращает объект чата или выбрасывает HTTPException.
     """
-    # Проверяем, что чат существует
+    require_chat_role(chat_id, user, db, allow_member=allow_member)
+
     chat = db.query(TelegramChat).filter(TelegramChat.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail=f"Чат с id={chat_id} не найден")
-    
-    # Проверяем права админа
-    is_admin = db.query(ChatAdmin).filter(
-        ChatAdmin.chat_id == chat_id,
-        ChatAdmin.admin_player_id == user.id
-    ).first() is not None
-    
-    if is_admin:
-        return chat
-    
-    # Если разрешено и для участников
-    if allow_member:
-        is_member = db.query(ChatMember).filter(
-            ChatMember.chat_id == chat_id,
-            ChatMember.player_id == user.id,
-            ChatMember.status == "active"
-        ).first() is not None
-        
-        if is_member:
-            return chat
-    
-    raise HTTPException(
-        status_code=403,
-        detail=f"У вас нет прав доступа к чату {chat_id}. Требуются права администратора."
+    return chat
+
+
+def user_chats_statement(
+    user: CurrentUser,
+    admin_only: bool = False,
+    chat_id: Optional[int] = None,
+):
+    """
+    Запрос чатов пользователя вместе с ролью: строки (id, tg_chat_id, title, type, role).
+    С токеном роль в запрос не входит — тогда вторым значением возвращается
+    словарь ролей из токена, а запрос выбирает только (id, tg_chat_id, title, type).
+    Первое значение None — у пользователя нет подходящих чатов.
+    """
+    chat_columns = (TelegramChat.id, TelegramChat.tg_chat_id, TelegramChat.title, TelegramChat.type)
+
+    if user.roles is not None:
+        # Роли уже в токене — остаётся только прочитать сами чаты
+        roles = {
+            cid: role for cid, role in user.roles.items()
+            if (role == "admin" or not admin_only) and (chat_id is None or cid == chat_id)
+        }
+        if not roles:
+            return None, roles
+        stmt = select(*chat_columns).where(
+            TelegramChat.id.in_(roles.keys())
+        ).order_by(TelegramChat.title)
+        return stmt, roles
+
+    # Членства пользователя: админство (1) и активное участие (0) в одном UNION ALL
+    admin_rows = select(
+        ChatAdmin.chat_id.label("chat_id"), literal(1).label("is_admin")
+    ).where(ChatAdmin.admin_player_id == user.id)
+    member_rows = select(
+        ChatMember.chat_id.label("chat_id"), literal(0).label("is_admin")
+    ).where(
+        ChatMember.player_id == user.id,
+        ChatMember.status == "active",
     )
+    if chat_id is not None:
+        admin_rows = admin_rows.where(ChatAdmin.chat_id == chat_id)
+        member_rows = member_rows.where(ChatMember.chat_id == chat_id)
+    memberships = (admin_rows if admin_only else union_all(admin_rows, member_rows)).subquery()
+
+    is_admin = func.max(memberships.c.is_admin)
+    role = case((is_admin == 1, "admin"), else_="member").label("role")
+    stmt = select(*chat_columns, role).join(
+        memberships, memberships.c.chat_id == TelegramChat.id
+    ).group_by(*chat_columns).order_by(TelegramChat.title)
+    return stmt, None
 
 
-def get_user_chats(user: Player, db: Session, admin_only: bool = False) -> list[TelegramChat]:
+def _with_roles(rows, roles: Optional[dict[int, str]]) -> list:
+    if roles is None:
+        return list(rows)
+    return [(*row, roles[row.id]) for row in rows]
+
+
+def get_user_chats(
+    user: CurrentUser,
+    db: Session,
+    admin_only: bool = False,
+    chat_id: Optional[int] = None,
+) -> list:
     """
-    Получает список чатов, где пользователь является админом (или участником).
+    Получает список чатов, где пользователь является админом (или участником),
+    одним запросом вместе с ролью. Строки: (id, tg_chat_id, title, type, role).
     
     Args:
         user: Текущий пользователь
         db: Сессия БД
         admin_only: Если True, возвращает только чаты, где пользователь админ
+        chat_id: Если указан, возвращает только этот чат (если у пользователя есть роль в нём)
     """
-    if admin_only:
-        # Только чаты, где пользователь админ
-        admin_chats = db.query(TelegramChat).join(
-            ChatAdmin,
-            ChatAdmin.chat_id == TelegramChat.id
-        ).filter(
-            ChatAdmin.admin_player_id == user.id
-        ).order_by(TelegramChat.title).all()
-        return admin_chats
-    else:
-        # Чаты, где пользователь админ или участник
-        admin_chat_ids = db.query(ChatAdmin.chat_id).filter(
-            ChatAdmin.admin_player_id == user.id
-        ).subquery()
-        
-        member_chat_ids = db.query(ChatMember.chat_id).filter(
-            ChatMember.player_id == user.id,
-            ChatMember.status == "active"
-        ).subquery()
-        
-        chats = db.query(TelegramChat).filter(
-            (TelegramChat.id.in_(admin_chat_ids)) |
-            (TelegramChat.id.in_(member_chat_ids))
-        ).order_by(TelegramChat.title).all()
-        
-        return chats
+    stmt, roles = user_chats_statement(user, admin_only, chat_id)
+    if stmt is None:
+        return []
+    return _with_roles(db.execute(stmt), roles)
+
+
+async def get_user_chats_async(
+    user: CurrentUser,
+    db: AsyncSession,
+    admin_only: bool = False,
+    chat_id: Optional[int] = None,
+) -> list:
+    """То же, что get_user_chats, для AsyncSession."""
+    stmt, roles = user_chats_statement(user, admin_only, chat_id)
+    if stmt is None:
+        return []
+    return _with_roles(await db.execute(stmt), roles)
 
 
 async def get_chat_id_from_request(
@@ -127,3 +302,18 @@ async def get_chat_id_from_request(
         )
     return result
 
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+async def require_admin(
+    x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+) -> None:
+    """
+    Доступ к служебным /admin эндпоинтам по токену из env ADMIN_TOKEN.
+    Если ADMIN_TOKEN не задан, служебные эндпоинты выключены.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Служебные эндпоинты отключены (ADMIN_TOKEN не задан)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Неверный X-Admin-Token")
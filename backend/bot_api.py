@@ -3,12 +3,17 @@ API эндпоинты для Telegram бота.
 Эти эндпоинты используются ботом для регистрации чатов и синхронизации участников.
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import bindparam, delete, func, update
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone
+import time
 
-from .db import get_db
+from .db import dialect_insert, get_db
+from .session import revoke_sessions
+from .search import mark_players_changed
+from .tracing import tracer
 from .models import (
     Player,
     TelegramChat,
@@ -36,6 +41,9 @@ class ChatRegisterResponse(BaseModel):
 class MemberSyncRequest(BaseModel):
     tg_chat_id: int
     members: List[dict]  # [{"tg_id": int, "username": str|null, "display_name": str, "is_admin": bool}]
+    # Пометить участников чата, которых нет в members, как left.
+    # Включать только если members — полный список группы (бот сейчас присылает только админов).
+    mark_missing_left: bool = False
 
 
 class MemberUpdateRequest(BaseModel):
@@ -47,6 +55,11 @@ class MemberUpdateRequest(BaseModel):
     is_admin: Optional[bool] = None
 
 
+class MemberBatchRequest(BaseModel):
+    # События из outbox бота, по порядку; для пары (чат, пользователь) побеждает последнее
+    updates: List[MemberUpdateRequest]
+
+
 @router.post("/chats/register", response_model=ChatRegisterResponse)
 def register_chat(
     data: ChatRegisterRequest,
@@ -90,6 +103,64 @@ def register_chat(
     )
 
 
+def _upsert_players(db: Session, members_by_tg: dict[int, dict]) -> tuple[dict[int, int], int]:
+    """
+    Создаёт/обновляет игроков пачкой: один IN-запрос на существующих и один
+    INSERT ... ON CONFLICT (tg_id) только для новых и изменившихся.
+    Ключи "username"/"display_name" обновляются, только если присутствуют в данных.
+    Возвращает ({tg_id: player_id}, число уже существовавших игроков).
+    """
+    if not members_by_tg:
+        return {}, 0
+
+    existing_players = {
+        tg_id: (player_id, username, display_name)
+        for player_id, tg_id, username, display_name in db.query(
+            Player.id, Player.tg_id, Player.username, Player.display_name
+        ).filter(Player.tg_id.in_(members_by_tg.keys()))
+    }
+
+    player_rows = []
+    for tg_id, member_data in members_by_tg.items():
+        existing = existing_players.get(tg_id)
+        if existing is None:
+            player_rows.append({
+                "tg_id": tg_id,
+                "username": member_data.get("username"),
+                "display_name": member_data.get("display_name", f"User {tg_id}"),
+            })
+            continue
+        _, username, display_name = existing
+        new_username = member_data["username"] if "username" in member_data else username
+        new_display_name = member_data["display_name"] if "display_name" in member_data else display_name
+        if (new_username, new_display_name) != (username, display_name):
+            player_rows.append({
+                "tg_id": tg_id,
+                "username": new_username,
+                "display_name": new_display_name,
+            })
+
+    player_ids = {tg_id: existing[0] for tg_id, existing in existing_players.items()}
+    if player_rows:
+        players_table = Player.__table__
+        stmt = dialect_insert(db, players_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[players_table.c.tg_id],
+            set_={
+                "username": stmt.excluded.username,
+                "display_name": stmt.excluded.display_name,
+            },
+        ).returning(players_table.c.id, players_table.c.tg_id)
+        for player_id, tg_id in db.execute(stmt, player_rows):
+            player_ids[tg_id] = player_id
+        # поисковый индекс обновится после commit
+        mark_players_changed(
+            db,
+            [(player_ids[row["tg_id"]], row["tg_id"], row["username"], row["display_name"]) for row in player_rows],
+        )
+    return player_ids, len(existing_players)
+
+
 @router.post("/chats/members/sync")
 def sync_chat_members(
     data: MemberSyncRequest,
@@ -98,7 +169,21 @@ def sync_chat_members(
     """
     Синхронизирует список участников чата.
     Вызывается ботом при команде /sync или автоматически при событиях.
+
+    Работает пачками: существующие игроки, участники и админы читаются одним
+    IN-запросом каждый, разница считается в памяти, а запись идёт
+    многострочными INSERT ... ON CONFLICT и одним DELETE/UPDATE.
+    Количество запросов не зависит от размера группы.
     """
+    started = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    def mark(stage: str) -> None:
+        timings[stage] = round((time.perf_counter() - started) * 1000 - sum(timings.values()), 2)
+        # этап — спан в трассе запроса (SQL этапа лежат рядом, по времени внутри него)
+        end_ns = time.time_ns()
+        tracer.record(f"sync.{stage}", end_ns - int(timings[stage] * 1e6), end_ns, members=len(data.members))
+
     # Находим чат
     chat = db.query(TelegramChat).filter(
         TelegramChat.tg_chat_id == data.tg_chat_id
@@ -109,83 +194,121 @@ def sync_chat_members(
             status_code=404,
             detail=f"Чат с tg_chat_id={data.tg_chat_id} не найден. Сначала зарегистрируйте чат."
         )
-    
-    updated_count = 0
-    created_count = 0
-    
+
+    # Последнее упоминание tg_id в payload побеждает
+    members_by_tg: dict[int, dict] = {}
     for member_data in data.members:
         tg_id = member_data.get("tg_id")
-        if not tg_id:
-            continue
-        
-        # Создаём или обновляем игрока
-        player = db.query(Player).filter(Player.tg_id == tg_id).first()
-        if not player:
-            player = Player(
-                tg_id=tg_id,
-                username=member_data.get("username"),
-                display_name=member_data.get("display_name", f"User {tg_id}"),
-            )
-            db.add(player)
-            db.flush()
-            created_count += 1
-        else:
-            # Обновляем данные игрока
-            if "username" in member_data:
-                player.username = member_data["username"]
-            if "display_name" in member_data:
-                player.display_name = member_data["display_name"]
-            updated_count += 1
-        
-        # Добавляем/обновляем запись участника чата
-        chat_member = db.query(ChatMember).filter(
+        if tg_id:
+            members_by_tg[tg_id] = member_data
+
+    # ---- игроки: один IN-запрос и один upsert только для новых и изменившихся ----
+    player_ids, existing_count = _upsert_players(db, members_by_tg)
+    mark("players")
+    created_count = len(members_by_tg) - existing_count
+    updated_count = existing_count
+
+    all_player_ids = list(player_ids.values())
+    admin_flags = {
+        player_ids[tg_id]: bool(member_data.get("is_admin", False))
+        for tg_id, member_data in members_by_tg.items()
+    }
+
+    # ---- участники: активируем отсутствующих и неактивных ----
+    member_status = dict(
+        db.query(ChatMember.player_id, ChatMember.status).filter(
             ChatMember.chat_id == chat.id,
-            ChatMember.player_id == player.id
-        ).first()
-        
-        if not chat_member:
-            chat_member = ChatMember(
-                chat_id=chat.id,
-                player_id=player.id,
-                status="active",
+            ChatMember.player_id.in_(all_player_ids),
+        )
+    ) if all_player_ids else {}
+    mark("prefetch_members")
+
+    member_rows = [
+        {"chat_id": chat.id, "player_id": player_id, "status": "active"}
+        for player_id in all_player_ids
+        if member_status.get(player_id) != "active"
+    ]
+    if member_rows:
+        members_table = ChatMember.__table__
+        stmt = dialect_insert(db, members_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[members_table.c.chat_id, members_table.c.player_id],
+            set_={"status": "active", "updated_at": func.now()},
+        )
+        db.execute(stmt, member_rows)
+
+    left_ids: list[int] = []
+    if data.mark_missing_left:
+        result = db.execute(
+            update(ChatMember)
+            .where(
+                ChatMember.chat_id == chat.id,
+                ChatMember.status == "active",
+                ChatMember.player_id.not_in(all_player_ids),
             )
-            db.add(chat_member)
-        else:
-            chat_member.status = "active"
-            chat_member.updated_at = datetime.now(timezone.utc)
-        
-        # Обновляем админов
-        is_admin = member_data.get("is_admin", False)
-        if is_admin:
-            admin = db.query(ChatAdmin).filter(
-                ChatAdmin.chat_id == chat.id,
-                ChatAdmin.admin_player_id == player.id
-            ).first()
-            
-            if not admin:
-                admin = ChatAdmin(
-                    chat_id=chat.id,
-                    admin_player_id=player.id,
-                    role="admin",  # Можно улучшить, определяя owner
-                )
-                db.add(admin)
-        else:
-            # Убираем из админов, если больше не админ
-            admin = db.query(ChatAdmin).filter(
+            .values(status="left", updated_at=func.now())
+            .returning(ChatMember.player_id)
+            .execution_options(synchronize_session=False)
+        )
+        left_ids = list(result.scalars())
+    mark("members")
+
+    # ---- админы: вставляем недостающих, удаляем разжалованных ----
+    current_admins = {
+        player_id for (player_id,) in db.query(ChatAdmin.admin_player_id).filter(
+            ChatAdmin.chat_id == chat.id,
+            ChatAdmin.admin_player_id.in_(all_player_ids),
+        )
+    } if all_player_ids else set()
+    mark("prefetch_admins")
+
+    admin_rows = [
+        {"chat_id": chat.id, "admin_player_id": player_id, "role": "admin"}  # Можно улучшить, определяя owner
+        for player_id, is_admin in admin_flags.items()
+        if is_admin and player_id not in current_admins
+    ]
+    demoted = [
+        player_id
+        for player_id, is_admin in admin_flags.items()
+        if not is_admin and player_id in current_admins
+    ]
+    if admin_rows:
+        stmt = dialect_insert(db, ChatAdmin.__table__).on_conflict_do_nothing()
+        db.execute(stmt, admin_rows)
+    if demoted:
+        db.execute(
+            delete(ChatAdmin)
+            .where(
                 ChatAdmin.chat_id == chat.id,
-                ChatAdmin.admin_player_id == player.id
-            ).first()
-            if admin:
-                db.delete(admin)
-    
+                ChatAdmin.admin_player_id.in_(demoted),
+            )
+            .execution_options(synchronize_session=False)
+        )
+    mark("admins")
+
     db.commit()
-    
+    mark("commit")
+
+    # Роли изменились — выпущенные сессионные токены этих игроков больше не верны
+    revoke_sessions(
+        [row["player_id"] for row in member_rows]
+        + left_ids
+        + [row["admin_player_id"] for row in admin_rows]
+        + demoted
+    )
+    timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+
     return {
         "status": "success",
         "chat_id": chat.id,
         "members_processed": len(data.members),
         "players_created": created_count,
         "players_updated": updated_count,
+        "members_activated": len(member_rows),
+        "members_left": len(left_ids),
+        "admins_added": len(admin_rows),
+        "admins_removed": len(demoted),
+        "timings_ms": timings,
     }
 
 
@@ -231,6 +354,9 @@ def update_chat_member(
         ChatMember.player_id == player.id
     ).first()
     
+    old_status = chat_member.status if chat_member else None
+    roles_changed = False
+
     if data.status == "left" or data.status == "kicked":
         if chat_member:
             chat_member.status = data.status
@@ -261,6 +387,7 @@ def update_chat_member(
                     role="admin",
                 )
                 db.add(admin)
+                roles_changed = True
         else:
             admin = db.query(ChatAdmin).filter(
                 ChatAdmin.chat_id == chat.id,
@@ -268,8 +395,17 @@ def update_chat_member(
             ).first()
             if admin:
                 db.delete(admin)
+                roles_changed = True
+
+    new_status = chat_member.status if chat_member else None
+    if (old_status == "active") != (new_status == "active"):
+        roles_changed = True
     
     db.commit()
+
+    # Отзываем сессионные токены со старыми ролями
+    if roles_changed:
+        revoke_sessions([player.id])
     
     return {
         "status": "success",
@@ -277,3 +413,147 @@ def update_chat_member(
         "player_id": player.id,
     }
 
+
+
+@router.post("/chats/members/batch")
+def batch_update_chat_members(
+    data: MemberBatchRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    Пакетное применение событий участников из outbox бота (new_chat_members,
+    left_chat_member и т.д.) — то же, что /chats/members/update, но для многих
+    чатов и пользователей за один запрос и одну транзакцию.
+
+    Повтор того же пакета безопасен: применяется итоговое состояние, а не разница.
+    События для незарегистрированных чатов пропускаются и возвращаются в skipped_chats.
+    """
+    # Склеиваем события по (чат, пользователь): непустые поля поздних событий перекрывают ранние
+    events: dict[tuple[int, int], dict] = {}
+    for item in data.updates:
+        key = (item.tg_chat_id, item.tg_user_id)
+        events.setdefault(key, {}).update(item.model_dump(exclude_none=True))
+
+    tg_chat_ids = {tg_chat_id for tg_chat_id, _ in events}
+    chat_ids = dict(
+        db.query(TelegramChat.tg_chat_id, TelegramChat.id).filter(
+            TelegramChat.tg_chat_id.in_(tg_chat_ids)
+        )
+    ) if tg_chat_ids else {}
+    skipped_chats = sorted(tg_chat_ids - chat_ids.keys())
+    events = {key: event for key, event in events.items() if key[0] in chat_ids}
+
+    # ---- игроки ----
+    members_by_tg: dict[int, dict] = {}
+    for (_, tg_user_id), event in events.items():
+        member_data = members_by_tg.setdefault(tg_user_id, {})
+        if "username" in event:
+            member_data["username"] = event["username"]
+        if event.get("display_name"):
+            member_data["display_name"] = event["display_name"]
+    player_ids, _ = _upsert_players(db, members_by_tg)
+
+    pairs = {
+        (chat_ids[tg_chat_id], player_ids[tg_user_id]): event
+        for (tg_chat_id, tg_user_id), event in events.items()
+    }
+    all_chat_ids = {chat_id for chat_id, _ in pairs}
+    all_player_ids = {player_id for _, player_id in pairs}
+
+    # ---- участники ----
+    member_status = {
+        (chat_id, player_id): status
+        for chat_id, player_id, status in db.query(
+            ChatMember.chat_id, ChatMember.player_id, ChatMember.status
+        ).filter(
+            ChatMember.chat_id.in_(all_chat_ids),
+            ChatMember.player_id.in_(all_player_ids),
+        )
+    } if pairs else {}
+
+    member_rows = []
+    leave_rows = []
+    for (chat_id, player_id), event in pairs.items():
+        status = event.get("status") or "active"
+        current = member_status.get((chat_id, player_id))
+        if status in ("left", "kicked"):
+            # Ушедших, которых backend не знал, не создаём (как и в /chats/members/update)
+            if current is not None and current != status:
+                leave_rows.append({"b_chat_id": chat_id, "b_player_id": player_id, "b_status": status})
+        elif current != status:
+            member_rows.append({"chat_id": chat_id, "player_id": player_id, "status": status})
+
+    if member_rows:
+        members_table = ChatMember.__table__
+        stmt = dialect_insert(db, members_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[members_table.c.chat_id, members_table.c.player_id],
+            set_={"status": stmt.excluded.status, "updated_at": func.now()},
+        )
+        db.execute(stmt, member_rows)
+    if leave_rows:
+        members_table = ChatMember.__table__
+        db.execute(
+            update(members_table)
+            .where(
+                members_table.c.chat_id == bindparam("b_chat_id"),
+                members_table.c.player_id == bindparam("b_player_id"),
+            )
+            .values(status=bindparam("b_status"), updated_at=func.now()),
+            leave_rows,
+        )
+
+    # ---- админы ----
+    admin_pairs = {
+        pair: event["is_admin"] for pair, event in pairs.items() if "is_admin" in event
+    }
+    current_admins = {
+        (chat_id, player_id)
+        for chat_id, player_id in db.query(ChatAdmin.chat_id, ChatAdmin.admin_player_id).filter(
+            ChatAdmin.chat_id.in_({chat_id for chat_id, _ in admin_pairs}),
+            ChatAdmin.admin_player_id.in_({player_id for _, player_id in admin_pairs}),
+        )
+    } if admin_pairs else set()
+
+    admin_rows = [
+        {"chat_id": chat_id, "admin_player_id": player_id, "role": "admin"}
+        for (chat_id, player_id), is_admin in admin_pairs.items()
+        if is_admin and (chat_id, player_id) not in current_admins
+    ]
+    demoted_rows = [
+        {"b_chat_id": chat_id, "b_player_id": player_id}
+        for (chat_id, player_id), is_admin in admin_pairs.items()
+        if not is_admin and (chat_id, player_id) in current_admins
+    ]
+    if admin_rows:
+        stmt = dialect_insert(db, ChatAdmin.__table__).on_conflict_do_nothing()
+        db.execute(stmt, admin_rows)
+    if demoted_rows:
+        admins_table = ChatAdmin.__table__
+        db.execute(
+            delete(admins_table).where(
+                admins_table.c.chat_id == bindparam("b_chat_id"),
+                admins_table.c.admin_player_id == bindparam("b_player_id"),
+            ),
+            demoted_rows,
+        )
+
+    db.commit()
+
+    # Роли изменились — выпущенные сессионные токены этих игроков больше не верны
+    revoke_sessions(
+        [row["player_id"] for row in member_rows if row["status"] == "active"]
+        + [row["b_player_id"] for row in leave_rows]
+        + [row["admin_player_id"] for row in admin_rows]
+        + [row["b_player_id"] for row in demoted_rows]
+    )
+
+    return {
+        "status": "success",
+        "processed": len(pairs),
+        "skipped_chats": skipped_chats,
+        "members_activated": len(member_rows),
+        "members_left": len(leave_rows),
+        "admins_added": len(admin_rows),
+        "admins_removed": len(demoted_rows),
+    }
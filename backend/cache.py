@@ -0,0 +1,239 @@
+"""
+In-process кеш готовых ответов (уже сериализованных в bytes).
+
+Используется для таблиц рейтинга: ключ (mode, chat_id), LRU + TTL вытеснение,
+single-flight — при пачке одинаковых запросов таблицу считает только первый,
+остальные ждут его результат.
+
+Инвалидация привязана к транзакциям: пути записи помечают ключи как грязные
+в сессии (mark_leaderboard_dirty), а сброс происходит только после commit.
+Кеш живёт внутри одного процесса uvicorn; при нескольких воркерах у каждого
+свой кеш, и чужие записи он увидит не позже чем через TTL.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from observability.metrics import CallbackMetric
+
+from .models import RatingModeEnum
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Optional[bytes] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, bytes]] = OrderedDict()
+        self._flights: dict[Hashable, _Flight] = {}
+        self._async_flights: dict[Hashable, asyncio.Future] = {}
+        self._generations: dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable) -> Optional[bytes]:
+        """Свежее значение из кеша или None. Вызывать под self._lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+        del self._entries[key]
+        self.evictions += 1
+        return None
+
+    def _store(self, key: Hashable, generation: int, value: bytes) -> None:
+        """Сохраняет результат, если ключ не инвалидировали во время расчёта. Под self._lock."""
+        if self._generations.get(key, 0) != generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generations.get(key, 0)
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._store(key, generation, flight.value)
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+        return flight.value
+
+    async def aget_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        """То же, что get_or_compute, для async-эндпоинтов: ожидающие не блокируют event loop."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+
+            future = self._async_flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                # исключение лидера могут не забрать, если ожидающих нет
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                generation = self._generations.get(key, 0)
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            with self._lock:
+                if self._async_flights.get(key) is future:
+                    del self._async_flights[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._store(key, generation, value)
+            if self._async_flights.get(key) is future:
+                del self._async_flights[key]
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+            # новые запросы не должны присоединяться к расчёту, начатому до записи
+            self._flights.pop(key, None)
+            self._async_flights.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in set(self._entries) | set(self._flights) | set(self._async_flights):
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+            self._flights.clear()
+            self._async_flights.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            }
+
+
+leaderboard_cache = ResponseCache(
+    max_entries=int(os.getenv("LEADERBOARD_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("LEADERBOARD_CACHE_TTL", "300")),
+)
+
+# Счётчики кеша уже ведутся под его локом — в /metrics они читаются при сборе
+for _name, _documentation in (
+    ("hits", "Ответы из кеша"),
+    ("misses", "Промахи кеша (ответ посчитан заново)"),
+    ("coalesced", "Запросы, дождавшиеся чужого расчёта того же ключа"),
+    ("evictions", "Вытеснения по TTL и размеру"),
+):
+    CallbackMetric(f"padel_cache_{_name}_total", _documentation, "counter", ("cache",),
+                   lambda attr=_name: [(("leaderboard",), getattr(leaderboard_cache, attr))])
+CallbackMetric("padel_cache_entries", "Записей в кеше", "gauge", ("cache",),
+               lambda: [(("leaderboard",), len(leaderboard_cache._entries))])
+
+# Ключ в Session.info с набором грязных ключей рейтинга
+_DIRTY_KEY = "leaderboard_dirty"
+_ALL = "*"
+
+
+def leaderboard_key(mode: RatingModeEnum, chat_id: Optional[int]) -> tuple[str, Optional[int]]:
+    return (RatingModeEnum(mode).value, chat_id)
+
+
+def mark_leaderboard_dirty(db: Session, mode: Optional[RatingModeEnum] = None, chat_id: Optional[int] = None) -> None:
+    """
+    Помечает таблицы рейтинга для сброса после commit.
+    Затрагивается таблица чата и общая таблица режима (chat_id=None),
+    без mode — сбрасываются все таблицы.
+    """
+    dirty = db.info.setdefault(_DIRTY_KEY, set())
+    if mode is None:
+        dirty.add(_ALL)
+        return
+    dirty.add(leaderboard_key(mode, chat_id))
+    dirty.add(leaderboard_key(mode, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    if _ALL in dirty:
+        leaderboard_cache.clear()
+        return
+    for key in dirty:
+        leaderboard_cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
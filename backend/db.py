@@ -1,17 +1,177 @@
+import logging
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from observability.metrics import CallbackMetric
+
+from .tracing import current_span, tracer
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
 
-engine = create_engine(DATABASE_URL)
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def pool_options(url: URL) -> dict:
+    """
+    Настройки пула соединений из env (одинаковые для sync и async движков):
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE (секунды).
+    Для SQLite пул не настраивается.
+    """
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+
+def async_database_url(url: URL) -> URL:
+    """
+    Async-драйвер для того же DATABASE_URL: postgresql -> asyncpg, sqlite -> aiosqlite.
+    Можно переопределить через ASYNC_DATABASE_URL.
+    """
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        query = dict(url.query)
+        # asyncpg не понимает sslmode из libpq-строк (Render и т.п.)
+        sslmode = query.pop("sslmode", None)
+        if sslmode is not None:
+            query["ssl"] = sslmode
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+_url = make_url(DATABASE_URL)
+engine = create_engine(_url, **pool_options(_url))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async-стек для горячих read-эндпоинтов: не занимает поток threadpool на время ожидания БД
+_async_url = make_url(os.getenv("ASYNC_DATABASE_URL") or async_database_url(_url))
+async_engine = create_async_engine(_async_url, **pool_options(_async_url))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _pool_values(method: str):
+    """Значение метода пула (checkedout, overflow) для обоих движков; у пулов без него — пропуск."""
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        read = getattr(pool, method, None)
+        if read is not None:
+            yield (name,), read()
+
+
+CallbackMetric("padel_db_pool_checked_out", "Соединения, выданные из пула", "gauge", ("engine",),
+               lambda: _pool_values("checkedout"))
+CallbackMetric("padel_db_pool_overflow", "Соединения сверх pool_size (отрицательное — ещё не открытые)",
+               "gauge", ("engine",), lambda: _pool_values("overflow"))
+CallbackMetric("padel_db_pool_size", "Размер пула (pool_size)", "gauge", ("engine",),
+               lambda: _pool_values("size"))
+
+
+# ==================== Статистика SQL на запрос ====================
+
+sql_logger = logging.getLogger("backend.sql")
+
+# Запросы дольше стольких миллисекунд логируются с планом (EXPLAIN); 0 — выключено
+SQL_EXPLAIN_SLOW_MS = float(os.getenv("SQL_EXPLAIN_SLOW_MS", "0"))
+# Сколько символов SQL класть в атрибут спана трассы
+SPAN_STATEMENT_CHARS = 1000
+
+
+class QueryStats:
+    """SQL одного HTTP-запроса: число выражений, суммарное время в БД и самое медленное."""
+
+    __slots__ = ("statements", "db_time", "slowest_time", "slowest_statement")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+
+
+# Статистика текущего запроса; ставит её middleware (request_stats.py).
+# Контекст переходит и в threadpool sync-эндпоинтов, и в greenlet async-драйвера
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def track_queries() -> QueryStats:
+    """Начинает сбор статистики SQL для текущего контекста (запроса) и возвращает её."""
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # сырой курсор DBAPI: EXPLAIN не проходит через события движка
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(part) for part in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # на одном соединении выражения идут по одному; у упавшего after_cursor_execute
+    # не будет, и его отметку просто перезапишет следующее
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"]
+    if current_span() is not None:
+        end_ns = time.time_ns()
+        tracer.record("sql", end_ns - int(elapsed * 1e9), end_ns, "client",
+                      **{"db.system": conn.dialect.name, "db.statement": statement[:SPAN_STATEMENT_CHARS]})
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+        if elapsed > stats.slowest_time:
+            stats.slowest_time = elapsed
+            stats.slowest_statement = statement
+
+    if SQL_EXPLAIN_SLOW_MS and elapsed * 1000 >= SQL_EXPLAIN_SLOW_MS:
+        # план — только для одиночных выражений чтения: у executemany нет одного набора
+        # параметров, а EXPLAIN ANALYZE (и его аналоги) мы не используем
+        if executemany or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            sql_logger.warning("slow statement %.1f ms: %s", elapsed * 1000, statement)
+            return
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:  # план — диагностика, запрос уже выполнен
+            plan = f"EXPLAIN failed: {e!r}"
+        sql_logger.warning("slow statement %.1f ms: %s\n%s", elapsed * 1000, statement, plan)
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
 
 
 def get_db():
@@ -20,3 +180,18 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def dialect_insert(db: Session, table):
+    """
+    insert() текущего диалекта с поддержкой ON CONFLICT.
+    В продакшене это Postgres, для локальной разработки поддерживается SQLite.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
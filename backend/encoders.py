@@ -0,0 +1,56 @@
+"""
+Быстрая сериализация списков строк из БД прямо в JSON (bytes).
+
+Горячие списки (/players, /players/search, /rating/{mode}) выбирают только
+нужные колонки кортежами, а не ORM-сущности, и кодируют их заранее
+собранным TypeAdapter над TypedDict с теми же полями, что у pydantic-модели
+ответа. Для TypedDict pydantic-core только сериализует, без валидации и без
+создания объектов модели на каждую строку; FastAPI ответ-Response тоже
+не перепроверяет.
+
+Модель ответа остаётся единственным описанием полей: она указывается в
+response_model (OpenAPI) и из неё же строится кодировщик.
+"""
+from typing import Iterable, List, Sequence
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+from .tracing import tracer
+
+
+class RowEncoder:
+    """
+    Кодировщик строк для модели ответа. columns — колонки select в порядке
+    полей модели (имена колонок или label должны совпадать с полями).
+    """
+
+    def __init__(self, model: type[BaseModel], columns: Sequence):
+        self.fields: tuple[str, ...] = tuple(model.model_fields)
+        keys = tuple(column.key for column in columns)
+        if keys != self.fields:
+            raise ValueError(f"Колонки {keys} не совпадают с полями {model.__name__}: {self.fields}")
+        self.columns = tuple(columns)
+        row_type = TypedDict(
+            f"{model.__name__}Row",
+            {name: info.annotation for name, info in model.model_fields.items()},
+        )
+        self._adapter = TypeAdapter(List[row_type])
+        self._row_adapter = TypeAdapter(row_type)
+
+    def encode(self, rows: Iterable[Sequence]) -> bytes:
+        """JSON-массив объектов из кортежей, колонки в порядке self.fields."""
+        fields = self.fields
+        with tracer.span("serialize", format="json"):
+            return self._adapter.dump_json([dict(zip(fields, row)) for row in rows])
+
+    def encode_lines(self, rows: Iterable[Sequence]) -> bytes:
+        """NDJSON: по объекту на строку, каждый завершается переводом строки."""
+        fields = self.fields
+        dump = self._row_adapter.dump_json
+        with tracer.span("serialize", format="ndjson"):
+            return b"".join(dump(dict(zip(fields, row))) + b"\n" for row in rows)
+
+    def response(self, rows: Iterable[Sequence]) -> Response:
+        return Response(content=self.encode(rows), media_type="application/json")
@@ -0,0 +1,237 @@
+"""
+Живые события турниров для GET /tournaments/{id}/stream (Server-Sent Events).
+
+Путь записи (POST /matches, /tournaments/{id}/rounds) после commit вызывает
+push_results: новые матчи применяются к живой таблице (live_standings), и,
+если у турнира есть подписчики, им рассылаются:
+
+- event: match — результат каждого нового матча;
+- event: standings — diff таблицы: только строки, у которых что-то
+  поменялось (включая место), с версией таблицы.
+
+При подключении клиент сначала получает event: snapshot — всю таблицу.
+Строки diff с версией не выше снимка клиент может пропустить.
+
+Рассылка — внутри процесса: кадр SSE кодируется один раз и кладётся в
+ограниченную очередь каждого подписчика (через call_soon_threadsafe —
+sync-эндпоинты работают в threadpool). Медленный клиент, не успевший
+выбрать очередь, не копит события: очередь сбрасывается, и вместо них он
+получает свежий snapshot. Без событий раз в STREAM_HEARTBEAT секунд
+уходит комментарий-heartbeat, чтобы прокси не закрывали соединение.
+
+Подписчики и события живут в одном процессе uvicorn: при нескольких
+воркерах поток видит только записи своего воркера.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from typing import Iterable, Optional
+
+from .models import ScoringTypeEnum
+from .standings import TournamentStandings, live_standings
+
+# Служебный маркер в очереди: подписчик отстал, нужен новый snapshot
+RESYNC = object()
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+def sse_frame(event: str, data: dict, event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def match_event(tournament_id: int, m) -> dict:
+    score_type = m.score_type.value if isinstance(m.score_type, ScoringTypeEnum) else m.score_type
+    return {
+        "tournament_id": tournament_id,
+        "match_id": m.id,
+        "round_number": m.round_number,
+        "court_number": m.court_number,
+        "player1_id": m.player1_id,
+        "player2_id": m.player2_id,
+        "score_type": score_type,
+        "points1": m.points1,
+        "points2": m.points2,
+        "sets1": m.sets1,
+        "sets2": m.sets2,
+    }
+
+
+def snapshot_event(standings: TournamentStandings) -> dict:
+    """Вся таблица турнира. Вызывать под standings.lock."""
+    return {
+        "tournament_id": standings.tournament_id,
+        "version": standings.version,
+        "rounds_played": len(standings.rounds),
+        "standings": standings.table(),
+    }
+
+
+class Subscriber:
+    __slots__ = ("tournament_id", "loop", "queue", "lagged", "resyncs")
+
+    def __init__(self, tournament_id: int, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.tournament_id = tournament_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+        self.resyncs = 0
+
+    def offer(self, frame: bytes) -> None:
+        """Кладёт кадр в очередь. Выполняется в event loop подписчика."""
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # отставшие события бесполезны — клиент получит новый snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.lagged = True
+            self.resyncs += 1
+
+
+class TournamentEventHub:
+    def __init__(self, queue_size: int = 256, heartbeat: float = 15.0, max_subscribers: int = 5000):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscriber]] = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.resyncs = 0
+
+    @classmethod
+    def from_env(cls) -> "TournamentEventHub":
+        return cls(
+            queue_size=int(os.getenv("STREAM_QUEUE_SIZE", "256")),
+            heartbeat=float(os.getenv("STREAM_HEARTBEAT", "15")),
+            max_subscribers=int(os.getenv("STREAM_MAX_SUBSCRIBERS", "5000")),
+        )
+
+    def has_subscribers(self, tournament_id: int) -> bool:
+        return tournament_id in self._subscribers
+
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, tournament_id: int) -> Subscriber:
+        """Новый подписчик в текущем event loop."""
+        subscriber = Subscriber(tournament_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(tournament_id, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.tournament_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.tournament_id]
+            self._count -= 1
+            self.resyncs += subscriber.resyncs
+
+    def publish(self, tournament_id: int, event: str, data: dict) -> None:
+        """Рассылает событие подписчикам турнира. Можно вызывать из любого потока."""
+        with self._lock:
+            subscribers = tuple(self._subscribers.get(tournament_id, ()))
+        if not subscribers:
+            return
+        frame = sse_frame(event, data, next(self._ids))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, frame)
+            except RuntimeError:
+                # event loop подписчика уже закрыт
+                self.unsubscribe(subscriber)
+        self.published += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tournaments": len(self._subscribers),
+                "subscribers": self._count,
+                "published": self.published,
+                "resyncs": self.resyncs + sum(
+                    subscriber.resyncs for subscribers in self._subscribers.values() for subscriber in subscribers
+                ),
+            }
+
+
+tournament_events = TournamentEventHub.from_env()
+# таблица с подписчиками должна оставаться в памяти: push_results обновляет именно её
+live_standings.pinned = tournament_events.has_subscribers
+
+
+def push_results(tournament_id: int, matches: Iterable) -> None:
+    """
+    Применяет только что записанные матчи (после commit) к живой таблице и
+    рассылает события подписчикам. Без подписчиков — просто live_standings.push.
+    """
+    if not tournament_events.has_subscribers(tournament_id):
+        live_standings.push(tournament_id, matches)
+        return
+
+    standings = live_standings.loaded(tournament_id)
+    if standings is None:
+        new = list(matches)
+        diff = None
+    else:
+        with standings.lock:
+            new = [m for m in matches if m.id not in standings.applied]
+            if not new:
+                return
+            before = {row["player_id"]: row for row in standings.table()}
+            standings.apply(new)
+            diff = {
+                "tournament_id": tournament_id,
+                "version": standings.version,
+                "rounds_played": len(standings.rounds),
+                "rows": [row for row in standings.table() if before.get(row["player_id"]) != row],
+            }
+
+    for m in new:
+        tournament_events.publish(tournament_id, "match", match_event(tournament_id, m))
+    if diff is not None:
+        tournament_events.publish(tournament_id, "standings", diff)
+
+
+async def stream_frames(hub: TournamentEventHub, standings: TournamentStandings):
+    """
+    Кадры SSE для одного подписчика: snapshot, затем события и heartbeat.
+    Подписка оформляется при старте потока (до snapshot), поэтому события
+    между snapshot и первым чтением очереди не теряются.
+    """
+    subscriber = hub.subscribe(standings.tournament_id)
+    try:
+        with standings.lock:
+            snapshot = snapshot_event(standings)
+        yield sse_frame("snapshot", snapshot)
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), timeout=hub.heartbeat)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT_FRAME
+                continue
+            if frame is RESYNC:
+                subscriber.lagged = False
+                with standings.lock:
+                    snapshot = snapshot_event(standings)
+                yield sse_frame("snapshot", snapshot)
+            else:
+                yield frame
+    finally:
+        hub.unsubscribe(subscriber)
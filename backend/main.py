@@ -1,8 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ConfigDict, field_validator
 
-from .db import Base, engine, get_db
+from observability.metrics import CONTENT_TYPE, REGISTRY
+
+from .db import AsyncSessionLocal, Base, SessionLocal, dialect_insert, engine, get_db, get_async_db
 from .models import (
     Player,
     PlayerModeStats,
@@ -16,24 +20,69 @@ from .models import (
     ChatAdmin,
     ChatMember,
 )
-from .auth import get_current_user, check_chat_admin_access, get_user_chats, get_chat_id_from_request
+from .auth import (
+    CurrentUser,
+    get_current_user,
+    get_current_user_async,
+    get_stream_user,
+    require_chat_role,
+    get_user_chats,
+    get_user_chats_async,
+    get_player_roles,
+    get_chat_id_from_request,
+)
+from .session import SessionError, issue_stream_ticket, issue_token, validate_init_data
 from .bot_api import router as bot_router
+from .admin import router as admin_router
+from .cache import leaderboard_cache, leaderboard_key
+from .stats import apply_match_stats, apply_stats_deltas, round_deltas
+from .schedule import AMERICANO_MODES, AmericanoScheduler, ScheduleParams, default_rounds
+from .standings import LIVE_PAIRING_MODES, live_standings
+from .events import push_results, stream_frames, tournament_events
+from .versions import not_modified, set_cache_headers, table_versions
+from .encoders import RowEncoder
+from .search import find_players
+from .pagination import after_cursor, next_cursor
+from .request_stats import RequestStatsMiddleware
+from .profiler import install_signal_handler, uninstall_signal_handler
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from datetime import datetime
+from types import SimpleNamespace
+from contextlib import asynccontextmanager
 from fastapi import Query
-from sqlalchemy import or_, String, cast
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
 import os
 
+# Логи backend.* (в т.ч. строка на запрос из request_stats); uvicorn настраивает только свои логгеры
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+)
+logger = logging.getLogger(__name__)
+
 # ВАЖНО: Не используем create_all в продакшене!
 # Таблицы создаются через Alembic миграции.
 # Раскомментируйте следующую строку только для локальной разработки:
 # Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Padel Backend API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Профилирование по заданию соседнего воркера (POST /admin/profile/sample):
+    # обработчик SIGUSR2 ставит процесс-воркер при старте, а не любой импорт backend.main
+    install_signal_handler()
+    yield
+    uninstall_signal_handler()
+
+
+app = FastAPI(title="Padel Backend API", lifespan=lifespan)
 
 # Подключаем роутер для бота
 app.include_router(bot_router)
+# Служебные эндпоинты (X-Admin-Token)
+app.include_router(admin_router)
 
 # Разрешаем запросы с фронта
 # CORS_ORIGINS из .env, по умолчанию для локальной разработки
@@ -46,7 +95,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "X-DB-Statements", "X-DB-Time-Ms", "X-DB-Slowest-Ms", "X-Trace-Id"],
 )
+# Статистика SQL по запросам; добавлен последним — снаружи CORS, видит все ответы
+app.add_middleware(RequestStatsMiddleware)
 
 
 
@@ -65,8 +117,7 @@ class PlayerOut(BaseModel):
     current_rating: float
     rating_letter: str | None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class PlayerListOut(BaseModel):
@@ -78,8 +129,7 @@ class PlayerListOut(BaseModel):
     current_rating: float
     rating_letter: str | None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class RatingModeOut(BaseModel):
     code: RatingModeEnum
@@ -105,11 +155,49 @@ class PlayerRatingRow(BaseModel):
     delta_points: int
     delta_sets: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 
+# Колонки горячих списков в порядке полей моделей ответа (см. encoders.py)
+player_encoder = RowEncoder(
+    PlayerOut,
+    (
+        Player.id,
+        Player.tg_id,
+        Player.username,
+        Player.display_name,
+        Player.gender,
+        Player.current_rating,
+        Player.rating_letter,
+    ),
+)
+player_list_encoder = RowEncoder(PlayerListOut, player_encoder.columns)
+# позиция ключа пагинации /players в строке
+PLAYER_RATING_INDEX = player_list_encoder.fields.index("current_rating")
+rating_encoder = RowEncoder(
+    PlayerRatingRow,
+    (
+        Player.id.label("player_id"),
+        Player.display_name,
+        Player.username,
+        Player.gender,
+        Player.current_rating,
+        Player.rating_letter,
+        PlayerModeStats.games_played,
+        PlayerModeStats.wins_games,
+        PlayerModeStats.draws_games,
+        PlayerModeStats.losses_games,
+        PlayerModeStats.wins_sets,
+        PlayerModeStats.losses_sets,
+        PlayerModeStats.points_scored,
+        PlayerModeStats.points_conceded,
+        PlayerModeStats.delta_points,
+        PlayerModeStats.delta_sets,
+    ),
+)
+
+
 class TournamentCreate(BaseModel):
     name: str
     mode: RatingModeEnum
@@ -140,8 +228,7 @@ class TournamentOut(BaseModel):
     sets_limit: Optional[int]
     participants: List[int]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class MatchCreate(BaseModel):
@@ -173,8 +260,82 @@ class MatchOut(BaseModel):
     sets2: Optional[int]
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RoundMatchIn(BaseModel):
+    court_number: int
+    player1_id: int
+    player2_id: int
+    points1: Optional[int] = None
+    points2: Optional[int] = None
+    sets1: Optional[int] = None
+    sets2: Optional[int] = None
+
+
+class RoundCreate(BaseModel):
+    round_number: int
+    matches: List[RoundMatchIn]
+
+
+class RoundOut(BaseModel):
+    tournament_id: int
+    round_number: int
+    created: int  # матчей записано этим запросом
+    already_recorded: int  # матчей, уже записанных раньше (повтор отправки)
+    matches: List[MatchOut]
+
+class StandingRowOut(BaseModel):
+    rank: int
+    player_id: int
+    games: int
+    wins: int
+    draws: int
+    losses: int
+    score_for: int
+    score_against: int
+    delta: int
+    byes: int
+
+
+class StandingsOut(BaseModel):
+    tournament_id: int
+    mode: RatingModeEnum
+    rounds_played: int
+    standings: List[StandingRowOut]
+
+
+class ScheduleRequest(BaseModel):
+    courts: int
+    rounds: Optional[int] = None  # по умолчанию — чтобы каждый сыграл в паре с каждым
+    teams: Optional[List[List[int]]] = None  # для AM_TEAM; по умолчанию — пары по порядку участников
+    restarts: int = 8
+    seed: Optional[int] = None
+
+
+class ScheduleCourtOut(BaseModel):
+    court_number: int
+    team1: List[int]
+    team2: List[int]
+
+
+class ScheduleRoundOut(BaseModel):
+    round_number: int
+    courts: List[ScheduleCourtOut]
+    byes: List[int]
+
+
+class ScheduleOut(BaseModel):
+    tournament_id: int
+    mode: RatingModeEnum
+    courts: int
+    rounds: List[ScheduleRoundOut]
+    quality: dict
+
+
+class NextRoundOut(ScheduleRoundOut):
+    tournament_id: int
+    mode: RatingModeEnum
 
 MODE_LABELS = {
     RatingModeEnum.AM_CLASSIC: "Americano classic",
@@ -196,8 +357,11 @@ class ChatOut(BaseModel):
     type: Optional[str]
     role: Optional[str] = None  # admin, member (вычисляется для текущего пользователя)
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Порядок колонок в строках get_user_chats
+CHAT_OUT_FIELDS = ("id", "tg_chat_id", "title", "type", "role")
 
 
 # ==================== Health check ====================
@@ -207,12 +371,71 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Метрики процесса для Prometheus (снаружи закрыт в nginx, собирается по внутренней сети)."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+# ==================== Сессии WebApp ====================
+
+class SessionCreate(BaseModel):
+    init_data: str  # Telegram.WebApp.initData как есть
+
+
+class SessionOut(BaseModel):
+    token: str
+    expires_at: int
+    player_id: int
+    tg_id: int
+    roles: dict[int, str]
+
+
+@app.post("/auth/session", response_model=SessionOut)
+def create_session(data: SessionCreate, db: Session = Depends(get_db)):
+    """
+    Обменивает Telegram initData на короткоживущий подписанный токен.
+    Дальше WebApp передаёт его в Authorization: Bearer <token>.
+    """
+    try:
+        tg_user = validate_init_data(data.init_data)
+    except SessionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    player = db.query(Player.id, Player.tg_id).filter(Player.tg_id == tg_user["id"]).first()
+    if not player:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Игрок с tg_id={tg_user['id']} не найден. Зарегистрируйтесь через бота."
+        )
+
+    roles = get_player_roles(player.id, db)
+    try:
+        token, expires_at = issue_token(player.id, player.tg_id, roles)
+    except SessionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return SessionOut(
+        token=token,
+        expires_at=expires_at,
+        player_id=player.id,
+        tg_id=player.tg_id,
+        roles=roles,
+    )
+
+
 # ==================== Эндпоинты для чатов ====================
 
+# Таблицы, от которых зависит список чатов пользователя
+CHAT_TABLES = ("tg_chats", "chat_members", "chat_admins")
+
+
 @app.get("/chats", response_model=List[ChatOut])
-def list_chats(
-    user: Player = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def list_chats(
+    request: Request,
+    response: Response,
+    user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
     admin_only: bool = Query(False, description="Показывать только чаты, где пользователь админ")
 ):
     """
@@ -220,55 +443,33 @@ def list_chats(
     По умолчанию показывает чаты, где пользователь админ или участник.
     Если admin_only=True, показывает только чаты, где пользователь админ.
     """
-    chats = get_user_chats(user, db, admin_only=admin_only)
-    
-    result = []
-    for chat in chats:
-        # Определяем роль пользователя
-        is_admin = db.query(ChatAdmin).filter(
-            ChatAdmin.chat_id == chat.id,
-            ChatAdmin.admin_player_id == user.id
-        ).first() is not None
-        
-        role = "admin" if is_admin else "member"
-        
-        result.append(ChatOut(
-            id=chat.id,
-            tg_chat_id=chat.tg_chat_id,
-            title=chat.title,
-            type=chat.type,
-            role=role
-        ))
-    
-    return result
+    roles = sorted(user.roles.items()) if user.roles is not None else None
+    etag = table_versions.etag(CHAT_TABLES, None, user.id, admin_only, roles)
+    cached = not_modified(request, etag, public=False)
+    if cached is not None:
+        return cached
+    set_cache_headers(response, etag, public=False)
+    rows = await get_user_chats_async(user, db, admin_only=admin_only)
+    return [dict(zip(CHAT_OUT_FIELDS, row)) for row in rows]
 
 
 @app.get("/chats/{chat_id}", response_model=ChatOut)
 def get_chat(
     chat_id: int,
-    user: Player = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
     Получает информацию о конкретном чате.
     Пользователь должен быть админом или участником чата.
     """
-    chat = check_chat_admin_access(chat_id, user, db, allow_member=True)
-    
-    is_admin = db.query(ChatAdmin).filter(
-        ChatAdmin.chat_id == chat.id,
-        ChatAdmin.admin_player_id == user.id
-    ).first() is not None
-    
-    role = "admin" if is_admin else "member"
-    
-    return ChatOut(
-        id=chat.id,
-        tg_chat_id=chat.tg_chat_id,
-        title=chat.title,
-        type=chat.type,
-        role=role
-    )
+    rows = get_user_chats(user, db, chat_id=chat_id)
+    if not rows:
+        # на пути ошибки различаем 404 и 403
+        require_chat_role(chat_id, user, db, allow_member=True)
+        # проверка роли прошла, а выборка пуста (данные изменились между запросами)
+        raise HTTPException(status_code=404, detail=f"Чат с id={chat_id} не найден")
+    return dict(zip(CHAT_OUT_FIELDS, rows[0]))
 
 
 from sqlalchemy.exc import SQLAlchemyError
@@ -293,122 +494,181 @@ def register_player(data: PlayerCreate, db: Session = Depends(get_db)):
         return player
     except SQLAlchemyError as e:
         db.rollback()
-        print("DB ERROR in /players/register:", repr(e))  # уйдёт в логи Render
+        logger.exception(f"DB error in /players/register: {e!r}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/players/by_tg/{tg_id}", response_model=PlayerOut)
-def get_player_by_tg(tg_id: int, db: Session = Depends(get_db)):
+def get_player_by_tg(tg_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = table_versions.etag(("players",))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
     player = db.query(Player).filter(Player.tg_id == tg_id).first()
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
+    set_cache_headers(response, etag)
     return player
 
+PLAYERS_PAGE_DEFAULT = 100
+PLAYERS_PAGE_MAX = 1000
+# Строк на одно чтение из серверного курсора в режиме NDJSON
+PLAYERS_STREAM_BATCH = 500
+
+
+def _players_query(chat_id: Optional[int], cursor: Optional[str]):
+    """Игроки по (current_rating DESC, id ASC), после курсора, при chat_id — активные участники чата."""
+    query = select(*player_list_encoder.columns)
+    if chat_id is not None:
+        query = query.join(ChatMember, ChatMember.player_id == Player.id).where(
+            ChatMember.chat_id == chat_id,
+            ChatMember.status == "active",
+        )
+    after = after_cursor(Player.current_rating, Player.id, cursor)
+    if after is not None:
+        query = query.where(after)
+    return query.order_by(Player.current_rating.desc(), Player.id.asc())
+
+
+async def _stream_players(query):
+    # своя сессия: зависимость get_async_db может закрыться раньше, чем поток дочитают
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=PLAYERS_STREAM_BATCH))
+        async for rows in result.partitions():
+            yield player_list_encoder.encode_lines(rows)
+
+
 @app.get("/players", response_model=List[PlayerListOut])
-def list_players(db: Session = Depends(get_db)):
-    players = (
-        db.query(Player)
-        .order_by(Player.current_rating.desc(), Player.id.asc())
-        .all()
-    )
-    return players
+async def list_players(
+    request: Request,
+    limit: Optional[int] = Query(
+        None, ge=1, le=PLAYERS_PAGE_MAX,
+        description=f"Размер страницы (по умолчанию {PLAYERS_PAGE_DEFAULT}; для ndjson — без ограничения)",
+    ),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor предыдущей страницы"),
+    chat_id: Optional[int] = Query(None, description="Только активные участники чата"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson — потоковая выгрузка"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Игроки по рейтингу (current_rating DESC, id ASC) страницами по limit.
+    Если есть следующая страница, её курсор приходит в заголовках X-Next-Cursor
+    и Link (rel="next").
+
+    format=ndjson отдаёт все строки после cursor (или limit строк) по одному
+    JSON-объекту на строку, читая их из БД серверным курсором частями —
+    список целиком не собирается ни в памяти, ни в ответе.
+    """
+    query = _players_query(chat_id, cursor)
+    if format == "ndjson":
+        if limit is not None:
+            query = query.limit(limit)
+        return StreamingResponse(
+            _stream_players(query),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+        )
+
+    limit = limit or PLAYERS_PAGE_DEFAULT
+    tables = ("players",) if chat_id is None else ("players", "chat_members")
+    etag = table_versions.etag(tables, chat_id, limit, cursor)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    response = player_list_encoder.response(rows[:limit])
+    next_page = next_cursor(rows, limit, PLAYER_RATING_INDEX, 0)
+    if next_page is not None:
+        response.headers["X-Next-Cursor"] = next_page
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_page)}>; rel="next"'
+    set_cache_headers(response, etag)
+    return response
 
 @app.get("/players/search", response_model=List[PlayerOut])
-def search_players(
+async def search_players(
     q: str = Query(..., min_length=1),
     chat_id: Optional[int] = Query(None, description="ID чата для фильтрации поиска"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Поиск игроков по имени, username или tg_id (частичное совпадение).
+    Поиск игроков по началу имени, слова в имени, username или tg_id, без
+    учёта регистра и раскладки (кириллица/латиница). Порядок — по качеству
+    совпадения, затем по рейтингу (см. backend/search.py).
     Если указан chat_id, ищет только среди участников этого чата.
     """
-    pattern = f"%{q}%"
-    query = db.query(Player).filter(
-        or_(
-            Player.display_name.ilike(pattern),
-            Player.username.ilike(pattern),
-            cast(Player.tg_id, String).ilike(pattern),
-        )
-    )
-    
-    if chat_id is not None:
-        query = query.join(ChatMember, ChatMember.player_id == Player.id).filter(
-            ChatMember.chat_id == chat_id,
-            ChatMember.status == "active"
-        )
-    
-    players = query.order_by(Player.display_name.asc()).limit(20).all()
-    return players
+    rows = await find_players(db, q, chat_id, player_encoder.columns, SessionLocal)
+    return player_encoder.response(rows)
 
 
 @app.get("/rating/modes", response_model=List[RatingModeOut])
-def list_rating_modes():
+def list_rating_modes(request: Request, response: Response):
+    # список режимов меняется только с деплоем: версия — эпоха процесса
+    etag = table_versions.etag((), None, "modes")
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    set_cache_headers(response, etag)
     return [
         RatingModeOut(code=mode, name=MODE_LABELS[mode])
         for mode in RatingModeEnum
     ]
 
+# Таблицы, от которых зависит таблица рейтинга
+RATING_TABLES = ("players", "player_mode_stats")
+
+
 @app.get("/rating/{mode}", response_model=List[PlayerRatingRow])
-def get_rating_table(
+async def get_rating_table(
+    request: Request,
     mode: RatingModeEnum,
     chat_id: Optional[int] = Query(None, description="ID чата для фильтрации рейтинга"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Таблица рейтинга для выбранного режима.
     Если указан chat_id, показывает рейтинг только для этого чата.
     Сейчас сортируем по current_rating и delta_points.
-    Позже сюда можно вставить твой реальный алгоритм расчёта и буквы рейтинга.
+    Готовый JSON кешируется по (mode, chat_id) и сбрасывается после записи матчей
+    и пересчёта рейтинга (см. cache.py); If-None-Match с актуальной версией
+    получает 304 без обращения к БД (см. versions.py).
     """
-    # join Player + PlayerModeStats
+    etag = table_versions.etag(RATING_TABLES, chat_id)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    key = leaderboard_key(mode, chat_id)
+    body = await leaderboard_cache.aget_or_compute(key, lambda: _build_rating_table(db, mode, chat_id))
+    response = Response(content=body, media_type="application/json")
+    set_cache_headers(response, etag)
+    return response
+
+
+async def _build_rating_table(db: AsyncSession, mode: RatingModeEnum, chat_id: Optional[int]) -> bytes:
+    # join Player + PlayerModeStats, только нужные колонки
     q = (
-        db.query(Player, PlayerModeStats)
+        select(*rating_encoder.columns)
         .join(PlayerModeStats, PlayerModeStats.player_id == Player.id)
-        .filter(PlayerModeStats.mode == mode)
+        .where(PlayerModeStats.mode == mode)
     )
     
     # Фильтр по chat_id, если указан
     if chat_id is not None:
-        q = q.filter(PlayerModeStats.chat_id == chat_id)
+        q = q.where(PlayerModeStats.chat_id == chat_id)
     
     q = q.order_by(Player.current_rating.desc(), PlayerModeStats.delta_points.desc())
-
-    rows: List[PlayerRatingRow] = []
-    for player, stats in q.all():
-        rows.append(
-            PlayerRatingRow(
-                player_id=player.id,
-                display_name=player.display_name,
-                username=player.username,
-                gender=player.gender,
-                current_rating=player.current_rating,
-                rating_letter=player.rating_letter,
-                games_played=stats.games_played,
-                wins_games=stats.wins_games,
-                draws_games=stats.draws_games,
-                losses_games=stats.losses_games,
-                wins_sets=stats.wins_sets,
-                losses_sets=stats.losses_sets,
-                points_scored=stats.points_scored,
-                points_conceded=stats.points_conceded,
-                delta_points=stats.delta_points,
-                delta_sets=stats.delta_sets,
-            )
-        )
-    return rows
+    return rating_encoder.encode((await db.execute(q)).all())
 
 
 @app.post("/tournaments", response_model=TournamentOut)
 def create_tournament(
     payload: TournamentCreate,
     chat_id: int = Query(..., description="ID чата для создания турнира"),
-    user: Player = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     try:
-        # Проверяем права доступа к чату
-        chat = check_chat_admin_access(chat_id, user, db, allow_member=False)
+        # Проверяем права доступа к чату (с сессионным токеном — без запросов к БД)
+        require_chat_role(chat_id, user, db, allow_member=False)
         
         # базовая валидация лимитов
         if payload.scoring_type == ScoringTypeEnum.POINTS:
@@ -425,7 +685,7 @@ def create_tournament(
             scoring_type=payload.scoring_type,
             points_limit=payload.points_limit if payload.scoring_type == ScoringTypeEnum.POINTS else None,
             sets_limit=payload.sets_limit if payload.scoring_type == ScoringTypeEnum.SETS else None,
-            chat_id=chat.id,
+            chat_id=chat_id,
         )
         db.add(tournament)
         db.flush()  # получаем tournament.id без commit
@@ -483,9 +743,7 @@ def create_tournament(
         raise
     except Exception as e:
         db.rollback()
-        import traceback
-        error_detail = f"Ошибка при создании турнира: {str(e)}\n{traceback.format_exc()}"
-        print(f"ERROR in /tournaments: {error_detail}")  # для логов
+        logger.exception(f"Error in POST /tournaments: {e!r}")
         raise HTTPException(status_code=500, detail=f"Ошибка при создании турнира: {str(e)}")
 
 @app.post("/matches", response_model=MatchOut)
@@ -497,6 +755,12 @@ def create_match(payload: MatchCreate, db: Session = Depends(get_db)):
     if payload.score_type == ScoringTypeEnum.SETS:
         if payload.sets1 is None or payload.sets2 is None:
             raise HTTPException(status_code=400, detail="Для score_type=sets нужно указать sets1/sets2")
+    if payload.player1_id == payload.player2_id:
+        raise HTTPException(status_code=400, detail="player1_id и player2_id должны различаться")
+
+    tournament = db.query(Tournament).filter(Tournament.id == payload.tournament_id).first()
+    if not tournament:
+        raise HTTPException(status_code=404, detail=f"Турнир с id={payload.tournament_id} не найден")
 
     match = TournamentMatch(
         tournament_id=payload.tournament_id,
@@ -511,7 +775,364 @@ def create_match(payload: MatchCreate, db: Session = Depends(get_db)):
         sets2=payload.sets2,
     )
     db.add(match)
+    db.flush()
+
+    # статистика игроков обновляется дельтой в той же транзакции
+    apply_match_stats(db, match, tournament.mode, tournament.chat_id)
+
     db.commit()
     db.refresh(match)
+    push_results(match.tournament_id, [match])
     return match
 
+
+
+# Поля матча, по которым повтор отправки раунда считается тем же самым
+ROUND_MATCH_FIELDS = ("player1_id", "player2_id", "points1", "points2", "sets1", "sets2")
+
+
+def validate_round(tournament: Tournament, payload: RoundCreate, participant_ids: set[int]) -> List[str]:
+    """
+    Проверяет все матчи раунда за один проход и возвращает список всех ошибок
+    (пустой — раунд корректен). Участники проверяются, если они заданы у турнира.
+    """
+    errors: List[str] = []
+    if payload.round_number < 1:
+        errors.append("round_number должен быть положительным")
+    if not payload.matches:
+        errors.append("В раунде нет матчей")
+
+    if tournament.scoring_type == ScoringTypeEnum.POINTS:
+        required, limit, limit_name = ("points1", "points2"), tournament.points_limit, "points_limit"
+    else:
+        required, limit, limit_name = ("sets1", "sets2"), tournament.sets_limit, "sets_limit"
+
+    courts_seen: set[int] = set()
+    court_of_player: dict[int, int] = {}
+    for m in payload.matches:
+        where = f"корт {m.court_number}"
+        if m.court_number < 1:
+            errors.append(f"{where}: court_number должен быть положительным")
+        if m.court_number in courts_seen:
+            errors.append(f"{where}: корт указан в раунде несколько раз")
+        courts_seen.add(m.court_number)
+
+        if m.player1_id == m.player2_id:
+            errors.append(f"{where}: player1_id и player2_id должны различаться")
+        for player_id in (m.player1_id, m.player2_id):
+            if participant_ids and player_id not in participant_ids:
+                errors.append(f"{where}: игрок {player_id} не участвует в турнире")
+            other_court = court_of_player.setdefault(player_id, m.court_number)
+            if other_court != m.court_number:
+                errors.append(f"{where}: игрок {player_id} уже играет на корте {other_court}")
+
+        for name in ROUND_MATCH_FIELDS[2:]:
+            value = getattr(m, name)
+            if value is not None and value < 0:
+                errors.append(f"{where}: {name} не может быть отрицательным")
+        missing = [name for name in required if getattr(m, name) is None]
+        if missing:
+            errors.append(
+                f"{where}: для scoring_type={tournament.scoring_type.value} нужно указать {'/'.join(missing)}"
+            )
+        elif limit is not None and max(getattr(m, name) for name in required) > limit:
+            errors.append(f"{where}: счёт превышает {limit_name}={limit}")
+    return errors
+
+
+@app.post("/tournaments/{tournament_id}/rounds", response_model=RoundOut)
+def submit_round(
+    tournament_id: int,
+    payload: RoundCreate,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Записывает все матчи раунда одним запросом: проверка всех матчей за один проход,
+    один многострочный INSERT и пакетное обновление статистики в одной транзакции.
+
+    Идемпотентно по (турнир, раунд, корт): уже записанные корты с тем же составом
+    и счётом пропускаются, с другим — 409.
+    """
+    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    if not tournament:
+        raise HTTPException(status_code=404, detail=f"Турнир с id={tournament_id} не найден")
+    if tournament.chat_id is not None:
+        require_chat_role(tournament.chat_id, user, db, allow_member=False)
+
+    participant_ids = set(
+        db.scalars(select(TournamentPlayer.player_id).where(TournamentPlayer.tournament_id == tournament_id))
+    )
+    errors = validate_round(tournament, payload, participant_ids)
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    existing = {
+        match.court_number: match
+        for match in db.query(TournamentMatch).filter(
+            TournamentMatch.tournament_id == tournament_id,
+            TournamentMatch.round_number == payload.round_number,
+        )
+    }
+    rows = [
+        {
+            "tournament_id": tournament_id,
+            "round_number": payload.round_number,
+            "court_number": m.court_number,
+            "score_type": tournament.scoring_type,
+            **{name: getattr(m, name) for name in ROUND_MATCH_FIELDS},
+        }
+        for m in payload.matches
+    ]
+    conflicts = [
+        row["court_number"]
+        for row in rows
+        if row["court_number"] in existing
+        and any(getattr(existing[row["court_number"]], name) != row[name] for name in ROUND_MATCH_FIELDS)
+    ]
+    if conflicts:
+        raise HTTPException(
+            status_code=409,
+            detail=f"В раунде {payload.round_number} на кортах {sorted(conflicts)} уже записаны другие матчи",
+        )
+
+    new_rows = [row for row in rows if row["court_number"] not in existing]
+    created_rows = []
+    if new_rows:
+        table = TournamentMatch.__table__
+        stmt = (
+            dialect_insert(db, table)
+            .values(new_rows)
+            .on_conflict_do_nothing(
+                index_elements=[table.c.tournament_id, table.c.round_number, table.c.court_number]
+            )
+            .returning(table.c.court_number)
+        )
+        # Корты, вставленные параллельным повтором, пропускаются и в статистике
+        inserted_courts = set(db.scalars(stmt))
+        created_rows = [row for row in new_rows if row["court_number"] in inserted_courts]
+
+        # статистика игроков обновляется дельтой в той же транзакции
+        apply_stats_deltas(
+            db,
+            tournament.mode,
+            tournament.chat_id,
+            round_deltas(SimpleNamespace(**row) for row in created_rows),
+        )
+
+    db.commit()
+
+    matches = (
+        db.query(TournamentMatch)
+        .filter(
+            TournamentMatch.tournament_id == tournament_id,
+            TournamentMatch.round_number == payload.round_number,
+        )
+        .order_by(TournamentMatch.court_number)
+        .all()
+    )
+    push_results(tournament_id, matches)
+    return RoundOut(
+        tournament_id=tournament_id,
+        round_number=payload.round_number,
+        created=len(created_rows),
+        already_recorded=len(payload.matches) - len(created_rows),
+        matches=[MatchOut.model_validate(match, from_attributes=True) for match in matches],
+    )
+
+
+# Верхние границы, чтобы один запрос не занял воркер надолго
+SCHEDULE_MAX_ROUNDS = 200
+SCHEDULE_MAX_RESTARTS = 64
+
+
+@app.post("/tournaments/{tournament_id}/schedule", response_model=ScheduleOut)
+def build_schedule(
+    tournament_id: int,
+    payload: ScheduleRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Строит расписание Americano (все раунды) для участников турнира:
+    минимум повторов партнёров и соперников, в AM_MIX — смешанные пары.
+    Расписание только возвращается: оно парное, а /rounds принимает одиночные
+    матчи (player1 против player2, один на корт), поэтому как есть не записывается.
+    """
+    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    if not tournament:
+        raise HTTPException(status_code=404, detail=f"Турнир с id={tournament_id} не найден")
+    if tournament.chat_id is not None:
+        require_chat_role(tournament.chat_id, user, db, allow_member=False)
+    if tournament.mode not in AMERICANO_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Расписание строится только для Americano, режим турнира: {tournament.mode.value}",
+        )
+    if payload.courts < 1:
+        raise HTTPException(status_code=400, detail="courts должен быть положительным")
+    if not 1 <= payload.restarts <= SCHEDULE_MAX_RESTARTS:
+        raise HTTPException(status_code=400, detail=f"restarts должен быть от 1 до {SCHEDULE_MAX_RESTARTS}")
+
+    rows = db.execute(
+        select(TournamentPlayer.player_id, Player.gender)
+        .join(Player, Player.id == TournamentPlayer.player_id)
+        .where(TournamentPlayer.tournament_id == tournament_id)
+        .order_by(TournamentPlayer.joined_at, TournamentPlayer.player_id)
+    ).all()
+    player_ids = [player_id for player_id, _ in rows]
+    genders = [gender for _, gender in rows]
+
+    rounds = payload.rounds or default_rounds(tournament.mode, len(player_ids), genders)
+    if not 1 <= rounds <= SCHEDULE_MAX_ROUNDS:
+        raise HTTPException(status_code=400, detail=f"rounds должен быть от 1 до {SCHEDULE_MAX_ROUNDS}")
+
+    teams = None
+    if payload.teams is not None:
+        if any(len(team) != 2 for team in payload.teams):
+            raise HTTPException(status_code=400, detail="Каждая команда — ровно два игрока")
+        teams = [tuple(team) for team in payload.teams]
+
+    try:
+        scheduler = AmericanoScheduler(
+            player_ids,
+            payload.courts,
+            mode=tournament.mode,
+            genders=genders,
+            teams=teams,
+            params=ScheduleParams(restarts=payload.restarts, seed=payload.seed),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    schedule = scheduler.build(rounds)
+
+    return ScheduleOut(
+        tournament_id=tournament_id,
+        mode=tournament.mode,
+        courts=payload.courts,
+        rounds=[
+            ScheduleRoundOut(
+                round_number=r.round_number,
+                courts=[
+                    ScheduleCourtOut(court_number=c.court_number, team1=list(c.team1), team2=list(c.team2))
+                    for c in r.courts
+                ],
+                byes=r.byes,
+            )
+            for r in schedule.rounds
+        ],
+        quality=schedule.quality(),
+    )
+
+
+def _tournament_for_viewer(tournament_id: int, user: CurrentUser, db: Session) -> Tournament:
+    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    if not tournament:
+        raise HTTPException(status_code=404, detail=f"Турнир с id={tournament_id} не найден")
+    if tournament.chat_id is not None:
+        require_chat_role(tournament.chat_id, user, db, allow_member=True)
+    return tournament
+
+
+@app.get("/tournaments/{tournament_id}/standings", response_model=StandingsOut)
+def get_standings(
+    tournament_id: int,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Текущая таблица турнира (инкрементальная, без перечитывания всех матчей)."""
+    tournament = _tournament_for_viewer(tournament_id, user, db)
+    standings = live_standings.get(db, tournament)
+    with standings.lock:
+        return StandingsOut(
+            tournament_id=tournament_id,
+            mode=tournament.mode,
+            rounds_played=len(standings.rounds),
+            standings=standings.table(),
+        )
+
+
+@app.get("/tournaments/{tournament_id}/next-round", response_model=NextRoundOut)
+def get_next_round(
+    tournament_id: int,
+    courts: Optional[int] = Query(None, ge=1, description="Число кортов (по умолчанию — сколько хватит игрокам)"),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Пары следующего раунда для Mexicano и King of the Court по текущей таблице.
+    Только возвращает пары и ничего не записывает.
+
+    Пары парные (две команды по два игрока на корт), а TournamentMatch и
+    /rounds хранят одиночные матчи player1 против player2, по одному на корт,
+    и validate_round не пускает игрока на корт дважды. Поэтому раунд из этого
+    ответа в /rounds как есть не записать. Таблица и продвижение King (корт и
+    исход последнего раунда) считаются по тем одиночным матчам, что записаны.
+    """
+    tournament = _tournament_for_viewer(tournament_id, user, db)
+    if tournament.mode not in LIVE_PAIRING_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Пары по таблице строятся для Mexicano и King of the Court, режим турнира: {tournament.mode.value}",
+        )
+    standings = live_standings.get(db, tournament)
+    with standings.lock:
+        pairing = standings.next_round(courts)
+    if not pairing["courts"]:
+        raise HTTPException(status_code=400, detail="Недостаточно игроков для раунда")
+    return NextRoundOut(tournament_id=tournament_id, mode=tournament.mode, **pairing)
+
+
+class StreamTicketOut(BaseModel):
+    ticket: str
+    expires_at: int
+
+
+@app.post("/tournaments/{tournament_id}/stream-ticket", response_model=StreamTicketOut)
+def create_stream_ticket(
+    tournament_id: int,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Короткоживущий билет для GET /tournaments/{id}/stream?ticket=...: сессионный
+    токен в URL EventSource попал бы в логи nginx и прокси. Билет открывает только
+    поток этого турнира; при переподключении после истечения нужен новый.
+    """
+    _tournament_for_viewer(tournament_id, user, db)
+    roles = user.roles if user.roles is not None else get_player_roles(user.id, db)
+    try:
+        ticket, expires_at = issue_stream_ticket(user.id, user.tg_id, roles, tournament_id)
+    except SessionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return StreamTicketOut(ticket=ticket, expires_at=expires_at)
+
+
+def _open_stream(tournament_id: int, user: CurrentUser):
+    """Проверка доступа и загрузка таблицы в своей короткой сессии (поток живёт долго)."""
+    with SessionLocal() as db:
+        tournament = _tournament_for_viewer(tournament_id, user, db)
+        return live_standings.get(db, tournament)
+
+
+@app.get("/tournaments/{tournament_id}/stream")
+async def stream_tournament(
+    tournament_id: int,
+    user: CurrentUser = Depends(get_stream_user),
+):
+    """
+    Поток Server-Sent Events турнира: snapshot таблицы при подключении,
+    затем match (новые результаты) и standings (изменившиеся строки таблицы).
+    """
+    standings = await run_in_threadpool(_open_stream, tournament_id, user)
+    if tournament_events.full():
+        raise HTTPException(status_code=503, detail="Слишком много подписчиков, попробуйте позже")
+    return StreamingResponse(
+        stream_frames(tournament_events, standings),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx не должен буферизовать поток
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -12,7 +12,9 @@ from sqlalchemy import (
     DateTime,
     Enum as SAEnum,
     ForeignKey,
+    Index,
     UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -51,6 +53,13 @@ class Player(Base):
     rating_letter = Column(String(2), nullable=True)  # типа "A+", "B-", "C" и т.д.
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Индексы поиска по player_search_key (pg_trgm) создаются миграцией 004 только в PostgreSQL
+
+    __table_args__ = (
+        # Порядок keyset-пагинации GET /players: (current_rating DESC, id ASC)
+        Index("ix_players_rating_id", current_rating.desc(), "id"),
+    )
+
     stats = relationship("PlayerModeStats", back_populates="player")
 
 
@@ -85,6 +94,25 @@ class PlayerModeStats(Base):
     extra1 = Column(Float, default=0.0)
     extra2 = Column(Float, default=0.0)
 
+    __table_args__ = (
+        # Одна строка на (player_id, mode, chat_id) — цель INSERT ... ON CONFLICT в stats.py.
+        # NULL в unique-индексе не конфликтуют, поэтому общая статистика — отдельный частичный индекс
+        Index(
+            "uq_player_mode_stats_player_mode_chat",
+            "player_id", "mode", "chat_id",
+            unique=True,
+            postgresql_where=text("chat_id IS NOT NULL"),
+            sqlite_where=text("chat_id IS NOT NULL"),
+        ),
+        Index(
+            "uq_player_mode_stats_player_mode_global",
+            "player_id", "mode",
+            unique=True,
+            postgresql_where=text("chat_id IS NULL"),
+            sqlite_where=text("chat_id IS NULL"),
+        ),
+    )
+
     player = relationship("Player", back_populates="stats")
 
 
@@ -155,8 +183,8 @@ class TournamentMatch(Base):
     round_number = Column(Integer, nullable=True)
     court_number = Column(Integer, nullable=True)
 
-    player1_id = Column(Integer, ForeignKey("players.id"), nullable=False)
-    player2_id = Column(Integer, ForeignKey("players.id"), nullable=False)
+    player1_id = Column(Integer, ForeignKey("players.id"), nullable=False, index=True)
+    player2_id = Column(Integer, ForeignKey("players.id"), nullable=False, index=True)
 
     score_type = Column(SAEnum(ScoringTypeEnum, name="scoringtypeenum"), nullable=False)
     points1 = Column(Integer, nullable=True)
@@ -166,6 +194,12 @@ class TournamentMatch(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Один матч на корт в раунде: повтор отправки раунда не создаёт дубликатов.
+        # Матчи без раунда/корта (NULL) ограничением не затрагиваются.
+        UniqueConstraint("tournament_id", "round_number", "court_number", name="uq_tournament_matches_round_court"),
+    )
+
     tournament = relationship("Tournament", back_populates="matches")
     player1 = relationship("Player", foreign_keys=[player1_id])
     player2 = relationship("Player", foreign_keys=[player2_id])
@@ -217,6 +251,8 @@ class ChatMember(Base):
 
     __table_args__ = (
         UniqueConstraint("chat_id", "player_id", name="uq_chat_members"),
+        # get_user_chats: чаты игрока по статусу участия
+        Index("ix_chat_members_player_status", "player_id", "status"),
     )
 
     chat = relationship("TelegramChat", back_populates="members")
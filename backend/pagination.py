@@ -0,0 +1,54 @@
+"""
+Keyset-пагинация списков по (значение DESC, id ASC).
+
+Курсор — непрозрачная строка (base64url) с ключом последней отданной строки;
+следующая страница начинается строго после него:
+
+    value <= last_value AND (value < last_value OR id > last_id)
+
+Первое условие — диапазон, по которому БД начинает чтение индекса
+(value DESC, id) с нужного места, а не с начала.
+
+В отличие от OFFSET, стоимость страницы не зависит от её номера, а вставки
+и удаления между запросами не сдвигают страницы (строка не пропадёт и не
+повторится, если её ключ не менялся).
+"""
+import base64
+import binascii
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(value: float, row_id: int) -> str:
+    # repr(float) восстанавливается float() без потерь
+    return base64.urlsafe_b64encode(f"{value!r}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, row_id = raw.rsplit(":", 1)
+        return float(value), int(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+
+def after_cursor(value_column, id_column, cursor: Optional[str]):
+    """Условие «после курсора» для порядка (value_column DESC, id_column ASC) или None."""
+    if cursor is None:
+        return None
+    value, row_id = decode_cursor(cursor)
+    return and_(value_column <= value, or_(value_column < value, id_column > row_id))
+
+
+def next_cursor(rows: Sequence, limit: int, value_index: int, id_index: int) -> Optional[str]:
+    """
+    Курсор следующей страницы. rows выбраны с limit + 1: лишняя строка
+    означает, что страница не последняя (сама она в ответ не попадает).
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last[value_index], last[id_index])
@@ -0,0 +1,382 @@
+"""
+Сэмплирующий профайлер по запросу администратора (POST /admin/profile/*).
+
+Семплер — поток, который раз в interval снимает стеки всех потоков процесса
+(sys._current_frames) и считает одинаковые стеки. Результат — collapsed
+stacks, строка на стек: «поток;внешний кадр;...;внутренний кадр число»,
+формат flamegraph.pl, speedscope и inferno. Простаивающие стеки (ожидание
+сокетов, задач, блокировок — IDLE_LEAVES) по умолчанию не считаются.
+
+Пока профилирование не запрошено, потока нет и хуков нет: middleware
+проверяет один атрибут (profiler.capture is None).
+
+Два режима:
+
+- sample(seconds) — T секунд во всех воркерах uvicorn: воркер, принявший
+  запрос, кладёт задание в PROFILE_DIR и шлёт SIGUSR2 остальным воркерам
+  (зарегистрированным в PROFILE_DIR/workers процессам с тем же родителем и
+  тем же временем старта — PID мог достаться другому процессу, а SIGUSR2
+  без обработчика его завершит); каждый пишет свои стеки в PROFILE_DIR,
+  принявший сливает их;
+- capture(route, count) — следующие N запросов маршрута (шаблон, как в
+  /metrics) в этом воркере: семплер снимает стеки, пока хотя бы один такой
+  запрос в работе. Стеки не привязаны к запросу: при параллельной нагрузке
+  в профиль попадут и соседние запросы того же процесса.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import sysconfig
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "padel-profiles"))
+# Ограничения на параметры профилирования
+MAX_PROFILE_SECONDS = 120
+MIN_INTERVAL = 0.001
+# Сколько ждать стеки других воркеров после окончания профилирования
+WORKER_GRACE = 3.0
+# Стек простаивает, если самый внутренний кадр — ожидание (event loop ждёт сокеты,
+# потоки пула ждут задач, служебный поток uvicorn ждёт сигналов супервизора)
+IDLE_LEAVES = (
+    "EpollSelector.select ", "KqueueSelector.select ", "PollSelector.select ", "SelectSelector.select ",
+    "Condition.wait ", "Connection._recv ", "Connection._poll ",
+)
+# Служебные потоки профайлера в профиль не попадают
+_OWN_THREADS = ("stack-sampler", "profile-job")
+
+_PATH_PREFIXES = sorted(
+    {p for p in (sysconfig.get_paths().get("purelib"), sysconfig.get_paths().get("stdlib"), os.getcwd()) if p},
+    key=len,
+    reverse=True,
+)
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip(os.sep)
+    return filename
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Поток, снимающий стеки остальных потоков раз в interval секунд."""
+
+    def __init__(self, interval: float, idle: bool = False):
+        self.interval = interval
+        self.idle = idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        # None — снимать всегда; иначе только пока gate() истинно
+        self.gate = None
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        labels: dict = {}
+        while not self._stop.wait(self.interval):
+            if self.gate is not None and not self.gate():
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, f"thread-{ident}")
+                if name.startswith(_OWN_THREADS):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                if not self.idle and stack and stack[0].startswith(IDLE_LEAVES):
+                    continue
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def parse_collapsed(text: str) -> Counter:
+    stacks: Counter = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack:
+            stacks[stack] += int(count)
+    return stacks
+
+
+class RequestCapture:
+    """Профиль следующих count запросов маршрута: семплер работает, пока такой запрос в работе."""
+
+    def __init__(self, routes: list, method: Optional[str], count: int, interval: float):
+        self.routes = routes
+        self.method = method
+        self.count = count
+        self.active = 0
+        self.completed = 0
+        self.done = asyncio.Event()
+        self.sampler = StackSampler(interval)
+        self.sampler.gate = lambda: self.active > 0
+
+    def matches(self, scope) -> bool:
+        if self.method is not None and scope["method"] != self.method:
+            return False
+        return any(route.matches(scope)[0] is Match.FULL for route in self.routes)
+
+    def begin(self, scope) -> bool:
+        if self.done.is_set() or not self.matches(scope):
+            return False
+        self.active += 1
+        return True
+
+    def end(self) -> None:
+        self.active -= 1
+        self.completed += 1
+        if self.completed >= self.count:
+            self.done.set()
+
+
+class Profiler:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.capture: Optional[RequestCapture] = None
+        self._busy = threading.Lock()
+        self._handled: set[str] = set()
+
+    # ---- режим «T секунд во всех воркерах» ----
+
+    def _acquire(self) -> None:
+        if not self._busy.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="Профилирование уже идёт")
+
+    async def sample(self, seconds: float, interval: float, all_workers: bool = True,
+                     idle: bool = False) -> tuple[Counter, int]:
+        """Стеки за seconds секунд: (стеки, число процессов в профиле)."""
+        self._acquire()
+        try:
+            profile_id = uuid.uuid4().hex
+            workers = sibling_workers() if all_workers else []
+            if workers:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                (self.directory / f"{profile_id}.json").write_text(
+                    json.dumps({"seconds": seconds, "interval": interval, "idle": idle, "created": time.time()})
+                )
+                for pid, started in workers:
+                    _signal_worker(pid, started)
+
+            sampler = StackSampler(interval, idle).start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stacks = sampler.stop()
+            stacks = Counter({f"worker-{os.getpid()};{stack}": count for stack, count in stacks.items()})
+
+            received = await self._collect(profile_id, workers, stacks)
+            return stacks, 1 + received
+        finally:
+            self._busy.release()
+
+    async def _collect(self, profile_id: str, workers: list[tuple[int, int]], stacks: Counter) -> int:
+        """Дожидается файлов других воркеров и добавляет их стеки; возвращает число воркеров."""
+        pending = {pid: self.directory / f"{profile_id}.{pid}.collapsed" for pid, _ in workers}
+        deadline = time.monotonic() + WORKER_GRACE
+        received = 0
+        while pending and time.monotonic() < deadline:
+            for pid, path in list(pending.items()):
+                if path.exists():
+                    for stack, count in parse_collapsed(path.read_text()).items():
+                        stacks[f"worker-{pid};{stack}"] += count
+                    path.unlink(missing_ok=True)
+                    del pending[pid]
+                    received += 1
+            if pending:
+                await asyncio.sleep(0.1)
+        if pending:
+            logger.warning(f"profile {profile_id}: no stacks from workers {sorted(pending)}")
+        (self.directory / f"{profile_id}.json").unlink(missing_ok=True)
+        return received
+
+    def on_signal(self, signum, frame) -> None:
+        """SIGUSR2 от соседнего воркера: запускает задания из PROFILE_DIR в отдельном потоке."""
+        threading.Thread(target=self._run_jobs, name="profile-job", daemon=True).start()
+
+    def _run_jobs(self) -> None:
+        for path in self.directory.glob("*.json"):
+            profile_id = path.stem
+            if profile_id in self._handled:
+                continue
+            try:
+                job = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if time.time() - job["created"] > job["seconds"] + WORKER_GRACE:
+                continue
+            self._handled.add(profile_id)
+            if not self._busy.acquire(blocking=False):
+                logger.warning(f"profile {profile_id}: skipped, this worker is already profiling")
+                continue
+            try:
+                sampler = StackSampler(job["interval"], job["idle"]).start()
+                time.sleep(job["seconds"])
+                stacks = sampler.stop()
+            finally:
+                self._busy.release()
+            target = self.directory / f"{profile_id}.{os.getpid()}.collapsed"
+            tmp = target.with_suffix(".tmp")
+            tmp.write_text(collapsed(stacks))
+            tmp.replace(target)
+
+    # ---- режим «следующие N запросов маршрута» ----
+
+    async def capture_requests(self, routes: list, method: Optional[str], count: int,
+                               timeout: float, interval: float) -> tuple[Counter, int]:
+        """Стеки следующих count запросов маршрута: (стеки, число пойманных запросов)."""
+        self._acquire()
+        capture = RequestCapture(routes, method, count, interval)
+        capture.sampler.start()
+        self.capture = capture
+        try:
+            try:
+                await asyncio.wait_for(capture.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self.capture = None
+            stacks = capture.sampler.stop()
+            self._busy.release()
+        return stacks, capture.completed
+
+
+def _proc_stat(pid: int) -> Optional[tuple[int, int]]:
+    """(PPID, время старта в тиках с загрузки) из /proc/<pid>/stat или None, если процесса нет."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # после имени процесса в скобках поля с третьего: состояние, PPID (4), ..., starttime (22)
+    fields = stat.rsplit(")", 1)[1].split()
+    return int(fields[1]), int(fields[19])
+
+
+def _signal_worker(pid: int, started: int) -> None:
+    """
+    SIGUSR2 воркеру, если под pid всё ещё он. Через pidfd проверка и сигнал
+    относятся к одному процессу: PID не успеет перейти к другому между ними.
+    """
+    try:
+        pidfd = os.pidfd_open(pid)
+    except AttributeError:
+        pidfd = None
+    except ProcessLookupError:
+        return
+    try:
+        stat = _proc_stat(pid)
+        if stat is None or stat[1] != started:
+            return
+        if pidfd is None:
+            os.kill(pid, signal.SIGUSR2)
+        else:
+            signal.pidfd_send_signal(pidfd, signal.SIGUSR2)
+    except ProcessLookupError:
+        pass
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def sibling_workers() -> list[tuple[int, int]]:
+    """
+    (PID, время старта) других воркеров uvicorn: зарегистрированы в PROFILE_DIR/workers
+    (значит, поставили обработчик SIGUSR2) и живы с тем же родителем и тем же временем
+    старта, что записано при регистрации. Записи завершившихся процессов удаляются.
+    """
+    registry = PROFILE_DIR / "workers"
+    if not registry.is_dir():
+        return []
+    me, parent = os.getpid(), os.getppid()
+    workers = []
+    for entry in registry.iterdir():
+        if not entry.name.isdigit() or int(entry.name) == me:
+            continue
+        pid = int(entry.name)
+        try:
+            registered = int(entry.read_text())
+        except (OSError, ValueError):
+            continue  # запись ещё не дописана или битая
+        stat = _proc_stat(pid)
+        if stat is None or stat[1] != registered:
+            entry.unlink(missing_ok=True)  # процесс завершился, PID мог достаться другому
+        elif stat[0] == parent:
+            workers.append((pid, registered))
+    return workers
+
+
+def routes_by_template(routes: Iterable, template: str) -> list:
+    found = [route for route in routes if getattr(route, "path", None) == template]
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Маршрут {template} не найден")
+    return found
+
+
+profiler = Profiler(PROFILE_DIR)
+
+
+def install_signal_handler() -> None:
+    """
+    SIGUSR2 — профилирование по заданию соседнего воркера; воркер записывает себя
+    в PROFILE_DIR/workers (файл <pid> со временем старта процесса), чтобы сигнал
+    получали только процессы с обработчиком. Вызывается при старте приложения,
+    только из главного потока и только на Linux (/proc).
+    """
+    if not hasattr(signal, "SIGUSR2") or threading.current_thread() is not threading.main_thread():
+        return
+    stat = _proc_stat(os.getpid())
+    if stat is None:
+        return
+    signal.signal(signal.SIGUSR2, profiler.on_signal)
+    try:
+        registry = PROFILE_DIR / "workers"
+        registry.mkdir(parents=True, exist_ok=True)
+        entry = registry / str(os.getpid())
+        tmp = entry.with_suffix(".tmp")
+        tmp.write_text(str(stat[1]))
+        tmp.replace(entry)
+    except OSError as e:
+        logger.warning(f"profiler: cannot register worker in {PROFILE_DIR}: {e!r}")
+
+
+def uninstall_signal_handler() -> None:
+    """Снимает регистрацию воркера при остановке приложения."""
+    (PROFILE_DIR / "workers" / str(os.getpid())).unlink(missing_ok=True)
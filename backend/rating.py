@@ -0,0 +1,395 @@
+"""
+Движок пересчёта рейтинга по всей истории матчей.
+
+Все матчи TournamentMatch проигрываются в хронологическом порядке отдельно
+для каждой пары (chat_id, mode). Арифметика Elo выполняется пачками в массивах
+NumPy, проиндексированных плотными id "слотов" — слот это (чат, режим, игрок).
+
+Матчи раскладываются по "поколениям": поколение матча на единицу больше
+последнего поколения любого из двух его слотов. Внутри одного поколения слоты
+не повторяются, поэтому всё поколение обновляется одной векторной операцией,
+а порядок матчей для каждого игрока сохраняется.
+
+Результат:
+- PlayerModeStats.extra1 — Elo-рейтинг игрока в режиме и чате;
+- PlayerModeStats.extra2 — неопределённость рейтинга (RD), уменьшается с числом игр
+  и масштабирует K-фактор, поэтому новички двигаются быстрее;
+- Player.current_rating — среднее extra1 игрока, взвешенное по числу игр;
+- Player.rating_letter — буква по порогам RATING_LETTERS.
+
+Слоты без строки PlayerModeStats (матчи записаны в обход stats.py) создаются
+через INSERT ... ON CONFLICT со счётчиками игр, сетов и очков, посчитанными
+по той же истории; у существующих строк меняются только extra1 и extra2.
+
+Запуск: python -m backend.rating [--k 32] [--dry-run]
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from .cache import mark_leaderboard_dirty
+from .db import dialect_insert
+from .stats import STAT_COLUMNS
+from .versions import mark_changed
+from .models import (
+    Player,
+    PlayerModeStats,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    Tournament,
+    TournamentMatch,
+)
+
+
+# Пороги букв рейтинга: (минимальный рейтинг, буква), по возрастанию
+RATING_LETTERS = (
+    (1300.0, "C"),
+    (1400.0, "C+"),
+    (1500.0, "B"),
+    (1600.0, "B+"),
+    (1700.0, "A"),
+    (1800.0, "A+"),
+)
+LOWEST_LETTER = "D"
+
+MODE_CODES = list(RatingModeEnum)
+
+
+@dataclass(frozen=True)
+class RatingParams:
+    initial: float = 1500.0
+    k: float = 32.0
+    scale: float = 400.0
+    rd_initial: float = 350.0
+    rd_min: float = 50.0
+    rd_decay: float = 0.5  # чем больше, тем быстрее RD падает с числом игр
+
+
+@dataclass
+class MatchArrays:
+    """Матчи в хронологическом порядке, разложенные по колонкам."""
+    player1: np.ndarray   # int64, Player.id
+    player2: np.ndarray   # int64, Player.id
+    mode: np.ndarray      # int64, индекс в MODE_CODES
+    chat: np.ndarray      # int64, TelegramChat.id или -1, если чата нет
+    score1: np.ndarray    # float64: 1 — победа player1, 0.5 — ничья, 0 — поражение
+    # Очки и сеты (int64, NULL -> 0) — для счётчиков новых строк статистики; None — не загружены
+    points1: Optional[np.ndarray] = None
+    points2: Optional[np.ndarray] = None
+    sets1: Optional[np.ndarray] = None
+    sets2: Optional[np.ndarray] = None
+
+
+@dataclass
+class RatingResult:
+    # По слотам (чат, режим, игрок)
+    slot_player: np.ndarray
+    slot_mode: np.ndarray
+    slot_chat: np.ndarray
+    rating: np.ndarray
+    rd: np.ndarray
+    games: np.ndarray
+    # По игрокам, сыгравшим хотя бы один матч
+    player_ids: np.ndarray
+    player_rating: np.ndarray
+    player_letter: list[str]
+    generations: int
+    # По слотам: колонка STAT_COLUMNS -> массив; None, если очки и сеты не загружены
+    counters: Optional[dict[str, np.ndarray]] = None
+
+
+def match_scores(
+    is_sets: np.ndarray,
+    points1: np.ndarray,
+    points2: np.ndarray,
+    sets1: np.ndarray,
+    sets2: np.ndarray,
+) -> np.ndarray:
+    """Исход для player1 по тем же правилам, что и в stats.py."""
+    diff = np.where(is_sets, sets1 - sets2, points1 - points2)
+    return (np.sign(diff) + 1.0) / 2.0
+
+
+def load_matches(db: Session) -> MatchArrays:
+    """Читает все матчи одной выборкой по колонкам, без ORM-объектов."""
+    stmt = (
+        select(
+            TournamentMatch.player1_id,
+            TournamentMatch.player2_id,
+            Tournament.mode,
+            Tournament.chat_id,
+            TournamentMatch.score_type,
+            TournamentMatch.points1,
+            TournamentMatch.points2,
+            TournamentMatch.sets1,
+            TournamentMatch.sets2,
+        )
+        .join(Tournament, Tournament.id == TournamentMatch.tournament_id)
+        .order_by(TournamentMatch.created_at.asc(), TournamentMatch.id.asc())
+    )
+    rows = db.execute(stmt).all()
+    if not rows:
+        empty_i = np.zeros(0, dtype=np.int64)
+        return MatchArrays(empty_i, empty_i, empty_i, empty_i, np.zeros(0))
+
+    p1, p2, modes, chats, score_types, pts1, pts2, st1, st2 = zip(*rows)
+    mode_index = {mode: i for i, mode in enumerate(MODE_CODES)}
+
+    def ints(values) -> np.ndarray:
+        return np.fromiter((v or 0 for v in values), dtype=np.int64, count=len(rows))
+
+    is_sets = np.fromiter(
+        (t == ScoringTypeEnum.SETS for t in score_types), dtype=bool, count=len(rows)
+    )
+    points1, points2, sets1, sets2 = ints(pts1), ints(pts2), ints(st1), ints(st2)
+    return MatchArrays(
+        player1=np.asarray(p1, dtype=np.int64),
+        player2=np.asarray(p2, dtype=np.int64),
+        mode=np.fromiter((mode_index[m] for m in modes), dtype=np.int64, count=len(rows)),
+        chat=np.fromiter((-1 if c is None else c for c in chats), dtype=np.int64, count=len(rows)),
+        score1=match_scores(is_sets, points1, points2, sets1, sets2),
+        points1=points1,
+        points2=points2,
+        sets1=sets1,
+        sets2=sets2,
+    )
+
+
+def _generations(slot1: np.ndarray, slot2: np.ndarray, n_slots: int) -> np.ndarray:
+    """Номер поколения для каждого матча (единственный последовательный проход)."""
+    last = [0] * n_slots
+    gens = [0] * len(slot1)
+    for i, (a, b) in enumerate(zip(slot1.tolist(), slot2.tolist())):
+        g = (last[a] if last[a] > last[b] else last[b]) + 1
+        gens[i] = g
+        last[a] = g
+        last[b] = g
+    return np.asarray(gens, dtype=np.int64)
+
+
+def slot_counters(matches: MatchArrays, slot1: np.ndarray, slot2: np.ndarray, n_slots: int) -> dict[str, np.ndarray]:
+    """Счётчики STAT_COLUMNS по слотам — суммы дельт stats.py по всем матчам слота."""
+    slots = np.concatenate([slot1, slot2])
+    score = np.concatenate([matches.score1, 1.0 - matches.score1])
+    points_for = np.concatenate([matches.points1, matches.points2])
+    points_against = np.concatenate([matches.points2, matches.points1])
+    sets_for = np.concatenate([matches.sets1, matches.sets2])
+    sets_against = np.concatenate([matches.sets2, matches.sets1])
+
+    def total(weights: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.bincount(slots, weights=weights, minlength=n_slots).astype(np.int64)
+
+    return {
+        "games_played": total(),
+        "wins_games": total(score == 1.0),
+        "draws_games": total(score == 0.5),
+        "losses_games": total(score == 0.0),
+        "wins_sets": total(sets_for),
+        "losses_sets": total(sets_against),
+        "points_scored": total(points_for),
+        "points_conceded": total(points_against),
+        "delta_points": total(points_for - points_against),
+        "delta_sets": total(sets_for - sets_against),
+    }
+
+
+def rating_letters(ratings: np.ndarray) -> list[str]:
+    thresholds = np.array([t for t, _ in RATING_LETTERS])
+    letters = [LOWEST_LETTER] + [letter for _, letter in RATING_LETTERS]
+    idx = np.searchsorted(thresholds, ratings, side="right")
+    return [letters[i] for i in idx.tolist()]
+
+
+def replay(matches: MatchArrays, params: RatingParams = RatingParams()) -> RatingResult:
+    """Проигрывает матчи и возвращает рейтинги по слотам и по игрокам."""
+    n = len(matches.player1)
+    n_modes = len(MODE_CODES)
+
+    # Плотные id слотов: ключ = ((chat + 1) * n_modes + mode) * stride + player
+    stride = int(max(matches.player1.max(initial=0), matches.player2.max(initial=0))) + 1
+    group = (matches.chat + 1) * n_modes + matches.mode
+    keys = np.concatenate([group * stride + matches.player1, group * stride + matches.player2])
+    slot_keys, inverse = np.unique(keys, return_inverse=True)
+    slot1, slot2 = inverse[:n], inverse[n:]
+    n_slots = len(slot_keys)
+
+    rating = np.full(n_slots, params.initial)
+    rd = np.full(n_slots, params.rd_initial)
+    games = np.zeros(n_slots, dtype=np.int64)
+
+    gens = _generations(slot1, slot2, n_slots)
+    order = np.argsort(gens, kind="stable")
+    bounds = np.flatnonzero(np.diff(gens[order])) + 1
+    n_generations = len(bounds) + 1 if n else 0
+
+    for batch in np.split(order, bounds) if n else ():
+        a = slot1[batch]
+        b = slot2[batch]
+        s = matches.score1[batch]
+        ra = rating[a]
+        rb = rating[b]
+        expected = 1.0 / (1.0 + 10.0 ** ((rb - ra) / params.scale))
+        rating[a] = ra + params.k * (rd[a] / params.rd_min) ** 0.5 * (s - expected)
+        rating[b] = rb + params.k * (rd[b] / params.rd_min) ** 0.5 * (expected - s)
+        games[a] += 1
+        games[b] += 1
+        rd[a] = np.maximum(params.rd_min, params.rd_initial / np.sqrt(1.0 + params.rd_decay * games[a]))
+        rd[b] = np.maximum(params.rd_min, params.rd_initial / np.sqrt(1.0 + params.rd_decay * games[b]))
+
+    slot_player = slot_keys % stride
+    slot_group = slot_keys // stride
+    slot_mode = slot_group % n_modes
+    slot_chat = slot_group // n_modes - 1
+
+    player_ids, player_idx = np.unique(slot_player, return_inverse=True)
+    weighted = np.bincount(player_idx, weights=rating * games)
+    played = np.bincount(player_idx, weights=games)
+    player_rating = weighted / np.maximum(played, 1)
+
+    return RatingResult(
+        slot_player=slot_player,
+        slot_mode=slot_mode,
+        slot_chat=slot_chat,
+        rating=rating,
+        rd=rd,
+        games=games,
+        player_ids=player_ids,
+        player_rating=player_rating,
+        player_letter=rating_letters(player_rating),
+        generations=n_generations,
+        counters=slot_counters(matches, slot1, slot2, n_slots) if matches.points1 is not None else None,
+    )
+
+
+def _upsert_slots(db: Session, stats, chat_scoped: bool, rows: list[dict]) -> None:
+    """
+    INSERT ... ON CONFLICT по частичному unique-индексу (как в stats.py): новая строка
+    получает счётчики из истории, у существующей меняются только extra1 и extra2.
+    """
+    if not rows:
+        return
+    if chat_scoped:
+        target = {
+            "index_elements": [stats.c.player_id, stats.c.mode, stats.c.chat_id],
+            "index_where": stats.c.chat_id.is_not(None),
+        }
+    else:
+        target = {"index_elements": [stats.c.player_id, stats.c.mode], "index_where": stats.c.chat_id.is_(None)}
+    stmt = dialect_insert(db, stats)
+    stmt = stmt.on_conflict_do_update(
+        **target, set_={"extra1": stmt.excluded.extra1, "extra2": stmt.excluded.extra2},
+    )
+    db.connection().execute(stmt, rows)
+
+
+def store(db: Session, result: RatingResult) -> None:
+    """Пишет результат пакетными INSERT ... ON CONFLICT и UPDATE (executemany). Не коммитит."""
+    mark_leaderboard_dirty(db)
+    # пишем через Connection — мимо отслеживания DML в Session, помечаем сами
+    mark_changed(db, "player_mode_stats")
+    mark_changed(db, "players")
+    conn = db.connection()
+    stats = PlayerModeStats.__table__
+    players = Player.__table__
+
+    n_slots = len(result.slot_player)
+    if n_slots:
+        counters = result.counters or {name: np.zeros(n_slots, dtype=np.int64) for name in STAT_COLUMNS}
+        columns = {name: counters[name].tolist() for name in STAT_COLUMNS}
+        chat_rows, global_rows = [], []
+        for i, (player_id, mode, chat_id, rating, rd) in enumerate(zip(
+            result.slot_player.tolist(),
+            result.slot_mode.tolist(),
+            result.slot_chat.tolist(),
+            result.rating.tolist(),
+            result.rd.tolist(),
+        )):
+            row = {
+                "player_id": player_id,
+                "mode": MODE_CODES[mode],
+                "chat_id": None if chat_id < 0 else chat_id,
+                "extra1": rating,
+                "extra2": rd,
+                **{name: values[i] for name, values in columns.items()},
+            }
+            (global_rows if chat_id < 0 else chat_rows).append(row)
+        _upsert_slots(db, stats, True, chat_rows)
+        _upsert_slots(db, stats, False, global_rows)
+
+    if len(result.player_ids):
+        conn.execute(
+            update(players)
+            .where(players.c.id == bindparam("b_id"))
+            .values(current_rating=bindparam("b_rating"), rating_letter=bindparam("b_letter")),
+            [
+                {"b_id": player_id, "b_rating": rating, "b_letter": letter}
+                for player_id, rating, letter in zip(
+                    result.player_ids.tolist(),
+                    result.player_rating.tolist(),
+                    result.player_letter,
+                )
+            ],
+        )
+
+
+def recompute(db: Session, params: RatingParams = RatingParams(), dry_run: bool = False) -> RatingResult:
+    """Полный пересчёт: загрузка, проигрывание, запись и коммит."""
+    result = replay(load_matches(db), params)
+    if not dry_run:
+        store(db, result)
+        db.commit()
+    return result
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    defaults = RatingParams()
+    parser = argparse.ArgumentParser(description="Пересчёт рейтинга по всей истории матчей")
+    parser.add_argument("--initial", type=float, default=defaults.initial)
+    parser.add_argument("--k", type=float, default=defaults.k)
+    parser.add_argument("--scale", type=float, default=defaults.scale)
+    parser.add_argument("--rd-initial", type=float, default=defaults.rd_initial)
+    parser.add_argument("--rd-min", type=float, default=defaults.rd_min)
+    parser.add_argument("--rd-decay", type=float, default=defaults.rd_decay)
+    parser.add_argument("--dry-run", action="store_true", help="Посчитать, но не записывать в БД")
+    args = parser.parse_args(argv)
+
+    params = RatingParams(
+        initial=args.initial,
+        k=args.k,
+        scale=args.scale,
+        rd_initial=args.rd_initial,
+        rd_min=args.rd_min,
+        rd_decay=args.rd_decay,
+    )
+
+    from .db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        matches = load_matches(db)
+        loaded = time.perf_counter()
+        result = replay(matches, params)
+        replayed = time.perf_counter()
+        if not args.dry_run:
+            store(db, result)
+            db.commit()
+        finished = time.perf_counter()
+    finally:
+        db.close()
+
+    print(
+        f"matches={len(matches.player1)} slots={len(result.slot_player)} "
+        f"players={len(result.player_ids)} generations={result.generations}\n"
+        f"load={loaded - started:.2f}s replay={replayed - loaded:.2f}s "
+        f"store={finished - replayed:.2f}s{' (dry run)' if args.dry_run else ''}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Статистика HTTP-запросов: SQL, длительность, метрики по маршрутам, трассы.
+
+RequestStatsMiddleware (чистый ASGI, без буферизации тела ответа) на каждый
+запрос заводит db.QueryStats, куда хуки движка складывают число выражений,
+суммарное время в БД и самое медленное выражение, и продолжает трассу из
+заголовка traceparent (см. observability/tracing.py): корневой спан запроса, дочерние —
+SQL и сериализация. По итогам запроса:
+
+- одна строка JSON в логгер backend.requests (метод, шаблон маршрута, статус,
+  длительность, SQL, trace id); trace id уходит и в заголовке X-Trace-Id;
+- наблюдения в гистограммы по шаблону маршрута (GET /metrics,
+  GET /admin/sql/stats), число запросов по статусам и запросы в работе;
+- при DEBUG_HEADERS=1 — заголовки X-DB-Statements, X-DB-Time-Ms,
+  X-DB-Slowest-Ms и Server-Timing (видны в DevTools браузера).
+
+Заголовки уходят вместе с началом ответа, поэтому у потоковых ответов
+(NDJSON, SSE) они отражают только SQL до первого байта; в лог и гистограммы
+попадает весь запрос целиком.
+"""
+import json
+import logging
+import os
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from observability.metrics import COUNT_BUCKETS, LATENCY_BUCKETS, Counter, Gauge, HistogramFamily
+
+from .db import track_queries
+from .profiler import profiler
+from .tracing import current_trace_id, tracer
+
+logger = logging.getLogger("backend.requests")
+
+DEBUG_HEADERS = os.getenv("DEBUG_HEADERS", "false").lower() in ("1", "true", "yes")
+# Сколько символов самого медленного выражения писать в лог
+SLOWEST_SQL_CHARS = 500
+
+ROUTE_LABELS = ("method", "route")
+request_duration = HistogramFamily(
+    "padel_http_request_duration_seconds", "Длительность HTTP-запроса", ROUTE_LABELS, LATENCY_BUCKETS,
+)
+db_time = HistogramFamily(
+    "padel_http_request_db_seconds", "Время в БД за HTTP-запрос", ROUTE_LABELS, LATENCY_BUCKETS,
+)
+db_statements = HistogramFamily(
+    "padel_http_request_db_statements", "SQL-выражений за HTTP-запрос", ROUTE_LABELS, COUNT_BUCKETS,
+)
+requests_total = Counter(
+    "padel_http_requests_total", "HTTP-запросы по статусу ответа", ROUTE_LABELS + ("status",),
+)
+in_flight = Gauge("padel_http_requests_in_flight", "HTTP-запросы в работе")
+
+
+def route_name(scope: Scope) -> str:
+    """Шаблон маршрута (/tournaments/{tournament_id}), а не путь: иначе ключей без счёта."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class RequestStatsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stats = track_queries()
+        status = 500
+        in_flight.inc()
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        span = tracer.start_trace(scope["path"], traceparent, attributes={
+            "http.method": scope["method"], "http.target": scope["path"],
+        })
+        if span is not None:
+            span.__enter__()
+        trace_id = current_trace_id()
+        # профилирование маршрута (POST /admin/profile/requests); без него — одна проверка
+        capture = profiler.capture
+        captured = capture is not None and capture.begin(scope)
+
+        async def send_with_stats(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Trace-Id"] = trace_id
+                if DEBUG_HEADERS:
+                    headers["X-DB-Statements"] = str(stats.statements)
+                    headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+                    headers["X-DB-Slowest-Ms"] = f"{stats.slowest_time * 1000:.2f}"
+                    headers["Server-Timing"] = (
+                        f'db;dur={stats.db_time * 1000:.2f};desc="{stats.statements} statements"'
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            if captured:
+                capture.end()
+            in_flight.dec()
+            duration = time.perf_counter() - started
+            route = (scope["method"], route_name(scope))
+            if span is not None:
+                span.name = " ".join(route)
+                span.set_attribute("http.route", route[1])
+                span.set_attribute("http.status_code", status)
+                span.set_attribute("db.statements", stats.statements)
+                if status >= 500:
+                    span.error = f"HTTP {status}"
+                span.__exit__(None, None, None)
+            request_duration.labels(*route).observe(duration)
+            db_time.labels(*route).observe(stats.db_time)
+            db_statements.labels(*route).observe(stats.statements)
+            requests_total.labels(*route, str(status)).inc()
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": route[1],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": _ms(duration),
+                    "db_statements": stats.statements,
+                    "db_time_ms": _ms(stats.db_time),
+                    "db_slowest_ms": _ms(stats.slowest_time),
+                    "db_slowest_sql": (stats.slowest_statement or "")[:SLOWEST_SQL_CHARS] or None,
+                    "trace_id": trace_id,
+                }, ensure_ascii=False))
+
+
+def sql_stats() -> dict:
+    """Гистограммы по маршрутам для GET /admin/sql/stats."""
+    return {
+        "request_duration_seconds": request_duration.stats(),
+        "db_time_seconds": db_time.stats(),
+        "db_statements": db_statements.stats(),
+    }
@@ -0,0 +1,340 @@
+"""
+Генератор расписания Americano (AM_CLASSIC, AM_TEAM, AM_MIX).
+
+Каждый раунд — корты по четыре игрока (пара против пары), лишние игроки
+отдыхают. Цель — как можно реже повторять партнёров и соперников.
+
+Счётчики партнёрства и соперничества хранятся в матрицах NumPy n×n
+(индексы — позиции игроков), и стоимость любой пары или встречи берётся из
+них за O(1). Раунд строится так:
+
+1. играют те, кто чаще отдыхал, отдыхают остальные (в AM_MIX — так,
+   чтобы на кортах осталось поровну мужчин и женщин);
+2. игроки разбиваются на пары: случайное начальное разбиение улучшается
+   2-opt обменами партнёров по матрице "стоимости пары" (повторы партнёров,
+   в AM_MIX — большой штраф за однополую пару);
+3. пары разводятся по кортам тем же 2-opt по матрице "стоимости встречи"
+   (повторы соперников);
+4. внутри каждого корта выбирается лучшее из трёх разбиений четвёрки на пары.
+
+Шаги 2–4 повторяются с нескольких случайных стартов (restarts), лучший
+вариант фиксируется и прибавляется к матрицам. 2-opt считается векторно,
+поэтому 32 игрока на 8 кортах (31 раунд) строятся за доли секунды.
+
+В AM_TEAM пары фиксированы: переставляются только встречи команд.
+
+Бенчмарк качества и времени: python -m benchmarks.bench_schedule
+"""
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .models import GenderEnum, RatingModeEnum
+
+AMERICANO_MODES = (RatingModeEnum.AM_CLASSIC, RatingModeEnum.AM_TEAM, RatingModeEnum.AM_MIX)
+
+
+@dataclass(frozen=True)
+class ScheduleParams:
+    partner_weight: float = 10.0
+    opponent_weight: float = 1.0
+    gender_weight: float = 1000.0  # штраф за однополую пару в AM_MIX
+    restarts: int = 8  # случайных стартов на раунд
+    seed: Optional[int] = None
+
+
+@dataclass
+class ScheduledCourt:
+    court_number: int
+    team1: tuple[int, int]
+    team2: tuple[int, int]
+
+
+@dataclass
+class ScheduledRound:
+    round_number: int
+    courts: list[ScheduledCourt]
+    byes: list[int]
+
+
+@dataclass
+class Schedule:
+    players: list[int]
+    rounds: list[ScheduledRound] = field(default_factory=list)
+    partner_counts: Optional[np.ndarray] = None
+    opponent_counts: Optional[np.ndarray] = None
+    bye_counts: Optional[np.ndarray] = None
+    same_gender_pairs: int = 0
+
+    def quality(self) -> dict:
+        """Сводка качества: повторы партнёров и соперников, разброс отдыхов."""
+        n = len(self.players)
+        iu = np.triu_indices(n, 1)
+        partners = self.partner_counts[iu]
+        opponents = self.opponent_counts[iu]
+        return {
+            "rounds": len(self.rounds),
+            "partner_repeats": int(np.maximum(partners - 1, 0).sum()),
+            "max_partner_count": int(partners.max()) if n > 1 else 0,
+            "opponent_repeats": int(np.maximum(opponents - 1, 0).sum()),
+            "max_opponent_count": int(opponents.max()) if n > 1 else 0,
+            "opponent_count_std": round(float(opponents.std()), 3) if n > 1 else 0.0,
+            "byes_min": int(self.bye_counts.min()) if n else 0,
+            "byes_max": int(self.bye_counts.max()) if n else 0,
+            "same_gender_pairs": self.same_gender_pairs,
+        }
+
+
+def default_rounds(mode: RatingModeEnum, n_players: int, genders: Optional[Sequence] = None) -> int:
+    """Число раундов, при котором каждый может сыграть в паре с каждым (один раз)."""
+    if mode == RatingModeEnum.AM_TEAM:
+        return max(n_players // 2 - 1, 1)
+    if mode == RatingModeEnum.AM_MIX and genders is not None:
+        men = sum(1 for g in genders if g == GenderEnum.MALE)
+        women = sum(1 for g in genders if g == GenderEnum.FEMALE)
+        if men and women:
+            return max(men, women)
+    return max(n_players - 1, 1)
+
+
+def _improve_matching(units: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """
+    2-opt для разбиения на пары: units (m, 2) — пары индексов, cost — симметричная
+    матрица стоимости пары. Каждый шаг векторно оценивает все обмены между двумя
+    парами и применяет лучший, пока есть улучшение.
+    """
+    units = units.copy()
+    m = len(units)
+    if m < 2:
+        return units
+    iu, ju = np.triu_indices(m, 1)
+    while True:
+        a, b = units[:, 0], units[:, 1]
+        current = cost[a, b]
+        base = current[iu] + current[ju]
+        # (a_i, a_j) + (b_i, b_j)  и  (a_i, b_j) + (b_i, a_j)
+        swap1 = cost[a[iu], a[ju]] + cost[b[iu], b[ju]]
+        swap2 = cost[a[iu], b[ju]] + cost[b[iu], a[ju]]
+        gain1 = base - swap1
+        gain2 = base - swap2
+        best1 = int(gain1.argmax())
+        best2 = int(gain2.argmax())
+        if max(gain1[best1], gain2[best2]) <= 1e-9:
+            return units
+        if gain1[best1] >= gain2[best2]:
+            i, j = iu[best1], ju[best1]
+            units[i, 1], units[j, 0] = units[j, 0], units[i, 1]  # (a_i, a_j), (b_i, b_j)
+        else:
+            i, j = iu[best2], ju[best2]
+            units[i, 1], units[j, 1] = units[j, 1], units[i, 1]  # (a_i, b_j), (a_j, b_i)
+
+
+class AmericanoScheduler:
+    def __init__(
+        self,
+        players: Sequence[int],
+        courts: int,
+        mode: RatingModeEnum = RatingModeEnum.AM_CLASSIC,
+        genders: Optional[Sequence[Optional[GenderEnum]]] = None,
+        teams: Optional[Sequence[tuple[int, int]]] = None,
+        params: ScheduleParams = ScheduleParams(),
+    ):
+        if courts < 1:
+            raise ValueError("Нужен хотя бы один корт")
+        self.players = list(players)
+        self.index = {player_id: i for i, player_id in enumerate(self.players)}
+        if len(self.index) != len(self.players):
+            raise ValueError("Игроки в расписании повторяются")
+        self.courts = courts
+        self.mode = mode
+        self.params = params
+        self.rng = np.random.default_rng(params.seed)
+
+        n = len(self.players)
+        self.partner = np.zeros((n, n), dtype=np.int32)
+        self.opponent = np.zeros((n, n), dtype=np.int32)
+        self.byes = np.zeros(n, dtype=np.int32)
+
+        # Пол: +1 мужчина, -1 женщина, 0 неизвестно (без штрафа)
+        self.gender = np.zeros(n, dtype=np.int8)
+        if mode == RatingModeEnum.AM_MIX and genders is not None:
+            for i, g in enumerate(genders):
+                self.gender[i] = 1 if g == GenderEnum.MALE else -1 if g == GenderEnum.FEMALE else 0
+        same = (self.gender[:, None] == self.gender[None, :]) & (self.gender[:, None] != 0)
+        self.gender_penalty = same.astype(np.float64) * params.gender_weight
+
+        self.teams: Optional[np.ndarray] = None
+        if mode == RatingModeEnum.AM_TEAM:
+            if teams is None:
+                # без явных команд пары составляются по порядку участников
+                if n % 2:
+                    raise ValueError("Для AM_TEAM нужно чётное число игроков или явные команды")
+                teams = [(self.players[i], self.players[i + 1]) for i in range(0, n, 2)]
+            try:
+                self.teams = np.array([[self.index[a], self.index[b]] for a, b in teams], dtype=np.int64)
+            except KeyError as e:
+                raise ValueError(f"Игрок {e.args[0]} из команды не участвует в турнире")
+            if len(np.unique(self.teams)) != self.teams.size:
+                raise ValueError("Игрок состоит в нескольких командах")
+            if self.teams.size != n:
+                without_team = sorted(set(self.players) - {self.players[i] for i in self.teams.ravel()})
+                raise ValueError(f"Игроки без команды: {without_team}")
+            if len(self.teams) < 2:
+                raise ValueError("Для расписания нужно хотя бы две команды")
+        elif n < 4:
+            raise ValueError("Для расписания нужно хотя бы четыре игрока")
+
+    # ---- выбор отдыхающих ----
+
+    def _most_rested(self, candidates: np.ndarray, count: int) -> np.ndarray:
+        """count кандидатов, отдыхавших чаще всех (при равенстве — случайно): они и играют."""
+        if count <= 0:
+            return candidates[:0]
+        order = np.lexsort((self.rng.random(len(candidates)), -self.byes[candidates]))
+        return candidates[order[:count]]
+
+    def _active_players(self, n_courts: int) -> np.ndarray:
+        n = len(self.players)
+        need = 4 * n_courts
+        if self.mode == RatingModeEnum.AM_MIX:
+            men = np.flatnonzero(self.gender == 1)
+            women = np.flatnonzero(self.gender == -1)
+            others = np.flatnonzero(self.gender == 0)
+            half = need // 2
+            if len(men) >= half and len(women) >= half:
+                return np.concatenate([self._most_rested(men, half), self._most_rested(women, half)])
+            # Пол не у всех или перекос: добираем остальными
+            chosen = np.concatenate([
+                self._most_rested(men, min(len(men), half)),
+                self._most_rested(women, min(len(women), half)),
+            ])
+            rest = np.setdiff1d(np.arange(n), chosen)
+            rest = np.concatenate([np.intersect1d(rest, others), np.setdiff1d(rest, others)])
+            return np.concatenate([chosen, self._most_rested(rest, need - len(chosen))])
+        return self._most_rested(np.arange(n), need)
+
+    # ---- один раунд ----
+
+    def _split_courts(self, quads: np.ndarray, pair_cost: np.ndarray, opp_cost: np.ndarray) -> np.ndarray:
+        """Для каждой четвёрки (k, 4) выбирает лучшее из трёх разбиений на пары."""
+        a, b, c, d = quads.T
+        splits = (
+            np.stack([a, b, c, d], axis=1),
+            np.stack([a, c, b, d], axis=1),
+            np.stack([a, d, b, c], axis=1),
+        )
+        costs = []
+        for s in splits:
+            p, q, r, t = s.T
+            costs.append(
+                pair_cost[p, q] + pair_cost[r, t]
+                + opp_cost[p, r] + opp_cost[p, t] + opp_cost[q, r] + opp_cost[q, t]
+            )
+        best = np.argmin(np.stack(costs), axis=0)
+        return np.stack(splits)[best, np.arange(len(quads))]
+
+    def _round_cost(self, courts: np.ndarray, pair_cost: np.ndarray, opp_cost: np.ndarray) -> float:
+        p, q, r, t = courts.T
+        return float(
+            (pair_cost[p, q] + pair_cost[r, t]
+             + opp_cost[p, r] + opp_cost[p, t] + opp_cost[q, r] + opp_cost[q, t]).sum()
+        )
+
+    def _pairs_to_courts(self, pairs: np.ndarray, opp_cost: np.ndarray) -> np.ndarray:
+        """Разводит пары (2k, 2) по кортам 2-opt'ом по матрице стоимости встреч пар."""
+        a, b = pairs[:, 0], pairs[:, 1]
+        meet = (
+            opp_cost[a[:, None], a[None, :]] + opp_cost[a[:, None], b[None, :]]
+            + opp_cost[b[:, None], a[None, :]] + opp_cost[b[:, None], b[None, :]]
+        )
+        order = self.rng.permutation(len(pairs)).reshape(-1, 2)
+        order = _improve_matching(order, meet)
+        return np.concatenate([pairs[order[:, 0]], pairs[order[:, 1]]], axis=1)
+
+    def _build_round(self) -> tuple[np.ndarray, np.ndarray]:
+        """Возвращает (корты (k, 4): пара team1 + пара team2, отдыхающие)."""
+        n = len(self.players)
+        params = self.params
+        opp_cost = self.opponent * params.opponent_weight
+
+        if self.teams is not None:
+            n_courts = min(self.courts, len(self.teams) // 2)
+            playing = self._most_rested_teams(2 * n_courts)
+            pairs = self.teams[playing]
+            pair_cost = np.zeros((n, n))
+            best, best_cost = None, np.inf
+            for _ in range(max(params.restarts, 1)):
+                courts = self._pairs_to_courts(pairs, opp_cost)
+                cost = self._round_cost(courts, pair_cost, opp_cost)
+                if cost < best_cost:
+                    best, best_cost = courts, cost
+            active = pairs.ravel()
+        else:
+            n_courts = min(self.courts, n // 4)
+            active = self._active_players(n_courts)
+            pair_cost = self.partner * params.partner_weight + self.gender_penalty
+            best, best_cost = None, np.inf
+            for _ in range(max(params.restarts, 1)):
+                perm = self.rng.permutation(active)
+                if self.mode == RatingModeEnum.AM_MIX:
+                    # старт со смешанных пар: мужчины и женщины чередуются
+                    perm = perm[np.argsort(-self.gender[perm], kind="stable")]
+                    half = len(perm) // 2
+                    pairs = np.stack([perm[:half], perm[half:][::-1]], axis=1)
+                else:
+                    pairs = perm.reshape(-1, 2)
+                pairs = _improve_matching(pairs, pair_cost)
+                courts = self._pairs_to_courts(pairs, opp_cost)
+                courts = self._split_courts(courts, pair_cost, opp_cost)
+                cost = self._round_cost(courts, pair_cost, opp_cost)
+                if cost < best_cost:
+                    best, best_cost = courts, cost
+
+        byes = np.setdiff1d(np.arange(n), active)
+        return best, byes
+
+    def _most_rested_teams(self, count: int) -> np.ndarray:
+        team_byes = self.byes[self.teams[:, 0]]
+        order = np.lexsort((self.rng.random(len(self.teams)), -team_byes))
+        return order[:count]
+
+    def _commit(self, courts: np.ndarray, byes: np.ndarray) -> None:
+        p, q, r, t = courts.T
+        for x, y in ((p, q), (r, t)):
+            np.add.at(self.partner, (x, y), 1)
+            np.add.at(self.partner, (y, x), 1)
+        for x in (p, q):
+            for y in (r, t):
+                np.add.at(self.opponent, (x, y), 1)
+                np.add.at(self.opponent, (y, x), 1)
+        self.byes[byes] += 1
+
+    def build(self, rounds: int) -> Schedule:
+        schedule = Schedule(players=self.players)
+        same_gender = 0
+        for round_number in range(1, rounds + 1):
+            courts, byes = self._build_round()
+            self._commit(courts, byes)
+            same_gender += int((self.gender_penalty[courts[:, 0], courts[:, 1]] > 0).sum())
+            same_gender += int((self.gender_penalty[courts[:, 2], courts[:, 3]] > 0).sum())
+            ids = self.players
+            schedule.rounds.append(
+                ScheduledRound(
+                    round_number=round_number,
+                    courts=[
+                        ScheduledCourt(
+                            court_number=c + 1,
+                            team1=(ids[row[0]], ids[row[1]]),
+                            team2=(ids[row[2]], ids[row[3]]),
+                        )
+                        for c, row in enumerate(courts.tolist())
+                    ],
+                    byes=[ids[i] for i in byes.tolist()],
+                )
+            )
+        schedule.partner_counts = self.partner.copy()
+        schedule.opponent_counts = self.opponent.copy()
+        schedule.bye_counts = self.byes.copy()
+        schedule.same_gender_pairs = same_gender
+        return schedule
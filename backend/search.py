@@ -0,0 +1,499 @@
+"""
+Ранжированный поиск игроков для /players/search.
+
+Имя, username и tg_id приводятся к поисковому ключу (search_key): нижний
+регистр, кириллица транслитерируется в латиницу, всё, кроме [a-z0-9],
+становится пробелом. Запрос приводится к ключу так же, поэтому «саша»
+находит «Sasha», а «sasha» — «Саша». Совпадение — по префиксу:
+
+0. ключ имени целиком равен запросу;
+1. имя начинается с запроса (в том числе «ivan pe» для «Ivan Petrov»);
+2. username начинается с запроса;
+3. какое-то слово имени начинается с запроса;
+4. tg_id начинается с запроса.
+
+Внутри уровня — выше рейтинг, затем меньше id.
+
+Два способа поиска:
+- PostgreSQL: функция player_search_key() в БД (миграция 004) повторяет
+  search_key, по её значениям построены триграммные GIN-индексы (pg_trgm) и
+  btree text_pattern_ops для коротких запросов;
+- остальные БД: индекс в памяти процесса (PlayerSearchIndex) — отсортированный
+  массив ключей имён, слов, username и tg_id; префикс ищется бинарным
+  поиском, лучшие результаты — argpartition по уровню и рейтингу.
+  Индекс строится в фоне при первом поиске (до готовности работает старый
+  ILIKE), обновляется после commit путями записи (регистрация, синхронизация
+  участников) и раз в SEARCH_INDEX_TTL секунд перестраивается из БД — так
+  видны записи других воркеров и свежие рейтинги.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import String, cast, event, func, literal, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import ChatMember, Player
+
+logger = logging.getLogger(__name__)
+
+# Транслитерация; порядок важен и повторён в SQL-функции player_search_key (миграция 004)
+TRANSLIT_STEPS = (
+    ("щ", "sch"), ("ш", "sh"), ("ч", "ch"), ("ж", "zh"), ("ц", "ts"),
+    ("ю", "yu"), ("я", "ya"), ("ї", "yi"), ("є", "ye"),
+)
+TRANSLIT_FROM = "абвгдеёзийклмнопрстуфхыэіґъь"
+TRANSLIT_TO = "abvgdeeziyklmnoprstufhyeig"
+# Варианты латинского написания одних и тех же звуков
+LATIN_STEPS = (("kh", "h"), ("x", "ks"), ("w", "v"), ("q", "k"))
+
+_TRANSLATE = str.maketrans(TRANSLIT_FROM[: len(TRANSLIT_TO)], TRANSLIT_TO, TRANSLIT_FROM[len(TRANSLIT_TO):])
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+TIER_EXACT, TIER_NAME, TIER_USERNAME, TIER_WORD, TIER_TG_ID = range(5)
+
+# Ключи в индексе обрезаются до KEY_BYTES байт (в запросе учитываются первые KEY_BYTES - 1)
+KEY_BYTES = 24
+
+# Ключ в Session.info: игроки, изменённые в транзакции
+_CHANGED_KEY = "search_players_changed"
+
+
+def search_key(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    text = text.lower()
+    for src, dst in TRANSLIT_STEPS:
+        text = text.replace(src, dst)
+    text = text.translate(_TRANSLATE)
+    for src, dst in LATIN_STEPS:
+        text = text.replace(src, dst)
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def player_entries(tg_id: int, username: Optional[str], display_name: Optional[str]) -> list[tuple[str, int]]:
+    """Ключи игрока в индексе с уровнем совпадения: [(ключ, уровень)]."""
+    entries = []
+    name = search_key(display_name)
+    if name:
+        entries.append((name, TIER_NAME))
+        entries += [(word, TIER_WORD) for word in name.split()[1:]]
+    user = search_key(username)
+    if user:
+        entries.append((user, TIER_USERNAME))
+    entries.append((str(tg_id), TIER_TG_ID))
+    return entries
+
+
+def _encode(key: str) -> bytes:
+    return key.encode()[:KEY_BYTES]
+
+
+class PlayerSearchIndex:
+    """
+    Индекс префиксов в памяти процесса.
+
+    Основной сегмент — параллельные numpy-массивы, отсортированные по ключу:
+    ключ, id игрока, уровень и заранее посчитанная оценка
+    уровень * 1e9 - рейтинг (меньше — лучше). Префикс — непрерывный диапазон,
+    его находит searchsorted. Для широких префиксов (больше BROAD_RANGE
+    ключей, обычно 1–3 буквы) лучшие кандидаты считаются при построении и
+    кешируются до следующего.
+
+    Изменения после построения попадают в отсортированный список delta, а
+    старые ключи изменённого игрока в основном сегменте помечаются оценкой
+    inf и пропускаются.
+    """
+
+    BROAD_RANGE = 20_000
+    MAX_CHANGED = 50_000
+
+    def __init__(self, ttl: float = 600.0, default_rating: float = 1500.0):
+        self.ttl = ttl
+        self.default_rating = default_rating
+        self._lock = threading.Lock()
+        self._keys = np.zeros(0, dtype=f"S{KEY_BYTES}")
+        self._ids = np.zeros(0, dtype=np.int32)
+        self._tiers = np.zeros(0, dtype=np.int8)
+        self._scores = np.zeros(0, dtype=np.float64)
+        self._ratings = np.zeros(0, dtype=np.float64)
+        # позиции ключей по игрокам: _ids_sorted[i] — id игрока ключа _by_id[i]
+        self._by_id = np.zeros(0, dtype=np.int64)
+        self._ids_sorted = np.zeros(0, dtype=np.int32)
+        # (префикс, limit) -> позиции лучших ключей основного сегмента
+        self._broad: dict[tuple[bytes, int], np.ndarray] = {}
+        # изменения после построения: отсортированный список (ключ, оценка, id, уровень)
+        self._delta: list[tuple[bytes, float, int, int]] = []
+        # id -> (seq последнего изменения, его записи в _delta)
+        self._changed: dict[int, tuple[int, list]] = {}
+        self._seq = 0
+        self._built_at: Optional[float] = None
+        self._building = False
+        self.builds = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._built_at is not None
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "entries": int(len(self._keys)),
+            "broad_prefixes": len(self._broad),
+            "delta": len(self._delta),
+            "changed_players": len(self._changed),
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if self.ready else None,
+            "builds": self.builds,
+        }
+
+    # ---- построение ----
+
+    def build(self, rows: Iterable[Sequence], since_seq: int = 0, limit: int = 20) -> None:
+        """Строит индекс из строк (id, tg_id, username, display_name, current_rating)."""
+        keys: list[bytes] = []
+        ids: list[int] = []
+        tiers: list[int] = []
+        rating_ids: list[int] = []
+        ratings: list[float] = []
+        for player_id, tg_id, username, display_name, rating in rows:
+            for key, tier in player_entries(tg_id, username, display_name):
+                keys.append(_encode(key))
+                ids.append(player_id)
+                tiers.append(tier)
+            rating_ids.append(player_id)
+            ratings.append(rating if rating is not None else self.default_rating)
+
+        key_array = np.array(keys, dtype=f"S{KEY_BYTES}")
+        order = np.argsort(key_array, kind="stable")
+        key_array = key_array[order]
+        id_array = np.array(ids, dtype=np.int32)[order]
+        tier_array = np.array(tiers, dtype=np.int8)[order]
+        rating_by_id = np.full(max(rating_ids, default=0) + 1, self.default_rating)
+        rating_by_id[rating_ids] = ratings
+        scores = tier_array * 1e9 - rating_by_id[id_array]
+        by_id = np.argsort(id_array, kind="stable")
+        broad = self._broad_candidates(key_array, tier_array, scores, limit)
+
+        with self._lock:
+            self._keys, self._ids, self._tiers, self._scores = key_array, id_array, tier_array, scores
+            self._ratings = rating_by_id
+            self._by_id, self._ids_sorted = by_id, id_array[by_id]
+            self._broad = broad
+            # изменения, закоммиченные до начала чтения из БД, уже в снимке
+            self._changed = {pid: v for pid, v in self._changed.items() if v[0] > since_seq}
+            self._delta = sorted(entry for _, entries in self._changed.values() for entry in entries)
+            for player_id in self._changed:
+                self._scores[self._positions_of(np.array([player_id]))] = np.inf
+            self._built_at = time.monotonic()
+            self.builds += 1
+
+    def _broad_candidates(self, keys, tiers, scores, limit: int) -> dict:
+        """Лучшие кандидаты для всех префиксов шире BROAD_RANGE ключей."""
+        broad = {}
+        for length in range(1, KEY_BYTES):
+            prefixes = keys.astype(f"S{length}")
+            if not len(prefixes):
+                break
+            starts = np.flatnonzero(np.concatenate(([True], prefixes[1:] != prefixes[:-1])))
+            ends = np.append(starts[1:], len(prefixes))
+            wide = np.flatnonzero(ends - starts > self.BROAD_RANGE)
+            if not len(wide):
+                break
+            for i in wide:
+                prefix = bytes(prefixes[starts[i]])
+                broad[(prefix, limit)] = self._top(keys, tiers, scores, prefix, starts[i], ends[i], limit)
+        return broad
+
+    @staticmethod
+    def _top(keys, tiers, scores, prefix: bytes, lo: int, hi: int, limit: int) -> np.ndarray:
+        """Позиции лучших ключей диапазона [lo, hi) по возрастанию оценки."""
+        window = scores[lo:hi].copy()
+        # точное совпадение имени — в начале диапазона
+        exact_hi = lo + int(np.searchsorted(keys[lo:hi], prefix, side="right"))
+        if exact_hi > lo:
+            window[: exact_hi - lo][tiers[lo:exact_hi] == TIER_NAME] -= 1e9
+        take = limit * 8
+        if len(window) > take:
+            best = np.argpartition(window, take)[:take]
+        else:
+            best = np.arange(len(window))
+        return lo + best[np.argsort(window[best], kind="stable")]
+
+    def _positions_of(self, player_ids: np.ndarray) -> np.ndarray:
+        """Позиции всех ключей игроков player_ids в основном сегменте."""
+        starts = np.searchsorted(self._ids_sorted, player_ids, side="left")
+        counts = np.searchsorted(self._ids_sorted, player_ids, side="right") - starts
+        total = int(counts.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return self._by_id[offsets]
+
+    def refresh_from(self, session_factory) -> None:
+        """Перестраивает индекс из БД (в фоне, один построитель одновременно)."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            since_seq = self._seq
+        try:
+            started = time.perf_counter()
+            with session_factory() as db:
+                rows = db.execute(
+                    select(Player.id, Player.tg_id, Player.username, Player.display_name, Player.current_rating)
+                ).all()
+            self.build(rows, since_seq)
+            logger.info("player search index: %d players in %.1fs", len(rows), time.perf_counter() - started)
+        except Exception:
+            logger.exception("player search index build failed")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def maybe_refresh(self, session_factory) -> None:
+        """Запускает фоновое построение, если индекса нет, он старше ttl или накопилось много изменений."""
+        if self._building:
+            return
+        if self.ready and time.monotonic() - self._built_at < self.ttl and len(self._changed) < self.MAX_CHANGED:
+            return
+        threading.Thread(target=self.refresh_from, args=(session_factory,), daemon=True).start()
+
+    # ---- обновления ----
+
+    def upsert(self, players: Iterable[Sequence]) -> None:
+        """Новые и переименованные игроки: [(id, tg_id, username, display_name)]."""
+        with self._lock:
+            for player_id, tg_id, username, display_name in players:
+                self._seq += 1
+                _, previous = self._changed.get(player_id, (0, []))
+                for entry in previous:
+                    del self._delta[bisect.bisect_left(self._delta, entry)]
+                self._scores[self._positions_of(np.array([player_id]))] = np.inf
+                rating = self._ratings[player_id] if player_id < len(self._ratings) else self.default_rating
+                entries = [
+                    (_encode(key), tier * 1e9 - rating, player_id, tier)
+                    for key, tier in player_entries(tg_id, username, display_name)
+                ]
+                for entry in entries:
+                    bisect.insort(self._delta, entry)
+                self._changed[player_id] = (self._seq, entries)
+
+    # ---- поиск ----
+
+    def search(self, query_key: str, limit: int = 20, members: Optional[np.ndarray] = None) -> list[int]:
+        """
+        id лучших игроков по префиксу query_key (уже search_key).
+        members — отсортированный массив id, среди которых искать (участники чата).
+        """
+        prefix = query_key.encode()[: KEY_BYTES - 1]
+        upper = prefix + b"\xff"
+        with self._lock:
+            keys, ids, tiers, scores = self._keys, self._ids, self._tiers, self._scores
+            delta = self._delta[bisect.bisect_left(self._delta, (prefix,)): bisect.bisect_left(self._delta, (upper,))]
+            lo, hi = (int(i) for i in np.searchsorted(keys, [prefix, upper]))
+            if members is not None and len(members) * 4 < hi - lo:
+                # чат меньше диапазона: проверяем ключи его участников
+                positions = self._positions_of(members)
+                positions = positions[keys[positions].astype(f"S{len(prefix)}") == prefix]
+                complete = True
+            elif members is None and (prefix, limit) in self._broad:
+                positions = self._broad[(prefix, limit)]
+                complete = False
+            else:
+                positions = self._top(keys, tiers, scores, prefix, lo, hi, limit)
+                complete = len(positions) == hi - lo
+
+        result = self._collect(prefix, positions, ids, keys, tiers, scores, delta, members, limit)
+        if len(result) < limit and not complete:
+            # у кандидатов много изменённых игроков — полный проход по диапазону
+            positions = self._top(keys, tiers, scores, prefix, lo, hi, hi - lo)
+            result = self._collect(prefix, positions, ids, keys, tiers, scores, delta, members, limit)
+            if members is None and hi - lo > self.BROAD_RANGE:
+                with self._lock:
+                    if self._keys is keys:
+                        self._broad[(prefix, limit)] = positions[: limit * 8]
+        return result
+
+    @staticmethod
+    def _collect(prefix, positions, ids, keys, tiers, scores, delta, members, limit) -> list[int]:
+        found_ids = ids[positions]
+        found_scores = scores[positions].copy()
+        found_scores[(keys[positions] == prefix) & (tiers[positions] == TIER_NAME)] -= 1e9
+        if delta:
+            found_ids = np.concatenate([found_ids, np.array([e[2] for e in delta], dtype=np.int32)])
+            found_scores = np.concatenate([
+                found_scores,
+                np.array([score - (1e9 if key == prefix and tier == TIER_NAME else 0) for key, score, _, tier in delta]),
+            ])
+        keep = np.isfinite(found_scores)
+        if members is not None:
+            if len(members):
+                position = np.searchsorted(members, found_ids)
+                position[position >= len(members)] = 0
+                keep &= members[position] == found_ids
+            else:
+                keep[:] = False
+        found_ids, found_scores = found_ids[keep], found_scores[keep]
+
+        result: list[int] = []
+        seen: set[int] = set()
+        for player_id in found_ids[np.lexsort((found_ids, found_scores))].tolist():
+            if player_id not in seen:
+                seen.add(player_id)
+                result.append(player_id)
+                if len(result) == limit:
+                    break
+        return result
+
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")  # auto | sql | memory
+player_search_index = PlayerSearchIndex(ttl=float(os.getenv("SEARCH_INDEX_TTL", "600")))
+
+
+def uses_sql_search(db) -> bool:
+    if SEARCH_BACKEND != "auto":
+        return SEARCH_BACKEND == "sql"
+    return db.bind.dialect.name == "postgresql"
+
+
+def mark_players_changed(db: Session, players: Iterable[Sequence]) -> None:
+    """Игроки (id, tg_id, username, display_name), которых нужно обновить в индексе после commit."""
+    db.info.setdefault(_CHANGED_KEY, {}).update({p[0]: tuple(p) for p in players})
+
+
+@event.listens_for(Session, "after_flush")
+def _track_players(session: Session, flush_context) -> None:
+    changed = [obj for obj in (*session.new, *session.dirty) if isinstance(obj, Player)]
+    if changed:
+        mark_players_changed(session, [(p.id, p.tg_id, p.username, p.display_name) for p in changed])
+
+
+@event.listens_for(Session, "after_commit")
+def _update_index(session: Session) -> None:
+    changed = session.info.pop(_CHANGED_KEY, None)
+    # до первого построения обновлять нечего: индекс прочитает их из БД
+    if changed and player_search_index.ready:
+        player_search_index.upsert(changed.values())
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_players(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+
+
+# ---- запросы ----
+
+def _sql_ranked(columns: Sequence, key: str, chat_id: Optional[int], limit: int):
+    """
+    Ранжированный поиск по индексам player_search_key (PostgreSQL).
+
+    Каждый уровень — отдельный подзапрос с ORDER BY рейтинг и LIMIT limit: для
+    короткого префикса («a») совпадений десятки тысяч, и общий OR с сортировкой
+    по уровню читал бы их все, а так каждый уровень останавливается на limit
+    строках (узкий префикс — по индексу ключа, широкий — проходом по
+    ix_players_rating_id). Игрок, попавший в несколько уровней, берётся с лучшим.
+    Этого достаточно: выше игрока из уровня t стоит каждый, кто опередил его
+    в подзапросе уровня t.
+    """
+    name_key = func.player_search_key(Player.display_name)
+    user_key = func.player_search_key(Player.username)
+    prefix = f"{key}%"
+    tiers = [
+        (TIER_EXACT, name_key == key),
+        (TIER_NAME, name_key.like(prefix)),
+        (TIER_USERNAME, user_key.like(prefix)),
+    ]
+    # слово внутри имени: триграммный индекс работает с 3 символов
+    if len(key) >= 3:
+        tiers.append((TIER_WORD, name_key.like(f"% {prefix}")))
+    if key.isdigit():
+        tiers.append((TIER_TG_ID, cast(Player.tg_id, String).like(prefix)))
+
+    candidates = []
+    for tier, condition in tiers:
+        query = select(Player.id.label("player_id"), literal(tier).label("tier")).where(condition)
+        if chat_id is not None:
+            query = query.join(ChatMember, ChatMember.player_id == Player.id).where(
+                ChatMember.chat_id == chat_id,
+                ChatMember.status == "active",
+            )
+        ranked = query.order_by(Player.current_rating.desc(), Player.id).limit(limit).subquery()
+        candidates.append(select(ranked.c.player_id, ranked.c.tier))
+    found = union_all(*candidates).subquery()
+    best = (
+        select(found.c.player_id, func.min(found.c.tier).label("tier"))
+        .group_by(found.c.player_id)
+        .subquery()
+    )
+    return (
+        select(*columns)
+        .join(best, best.c.player_id == Player.id)
+        .order_by(best.c.tier, Player.current_rating.desc(), Player.id)
+        .limit(limit)
+    )
+
+
+def _ilike_fallback(columns: Sequence, q: str, chat_id: Optional[int], limit: int):
+    """Поиск без индекса — пока индекс в памяти строится."""
+    pattern = f"%{q}%"
+    query = select(*columns).where(
+        or_(
+            Player.display_name.ilike(pattern),
+            Player.username.ilike(pattern),
+            cast(Player.tg_id, String).ilike(pattern),
+        )
+    )
+    if chat_id is not None:
+        query = query.join(ChatMember, ChatMember.player_id == Player.id).where(
+            ChatMember.chat_id == chat_id,
+            ChatMember.status == "active",
+        )
+    return query.order_by(Player.display_name.asc()).limit(limit)
+
+
+async def find_players(
+    db: AsyncSession,
+    q: str,
+    chat_id: Optional[int],
+    columns: Sequence,
+    session_factory,
+    limit: int = 20,
+) -> list:
+    """Строки columns (первая колонка — Player.id) лучших совпадений по порядку ранжирования."""
+    key = search_key(q)
+    if not key:
+        return []
+    if uses_sql_search(db):
+        return (await db.execute(_sql_ranked(columns, key, chat_id, limit))).all()
+
+    index = player_search_index
+    index.maybe_refresh(session_factory)
+    if not index.ready:
+        return (await db.execute(_ilike_fallback(columns, q, chat_id, limit))).all()
+
+    members = None
+    if chat_id is not None:
+        members = np.array(
+            sorted(
+                (
+                    await db.scalars(
+                        select(ChatMember.player_id).where(
+                            ChatMember.chat_id == chat_id,
+                            ChatMember.status == "active",
+                        )
+                    )
+                ).all()
+            ),
+            dtype=np.int32,
+        )
+    ids = index.search(key, limit, members)
+    if not ids:
+        return []
+    rows = {row[0]: row for row in await db.execute(select(*columns).where(Player.id.in_(ids)))}
+    return [rows[player_id] for player_id in ids if player_id in rows]
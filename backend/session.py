@@ -0,0 +1,180 @@
+"""
+Подписанные сессионные токены для WebApp.
+
+WebApp один раз обменивает Telegram initData на короткоживущий токен
+(POST /auth/session). В токене лежат id игрока и его роли в чатах, подпись —
+HMAC-SHA256, поэтому проверка токена не ходит в БД.
+
+Формат: base64url(json payload) + "." + base64url(hmac).
+
+Отзыв: при смене ролей (события бота) игрок попадает в _revoked_before, и все
+его токены, выпущенные раньше, отклоняются с 401 — WebApp заново обменивает
+initData и получает токен с актуальными ролями. Отзыв хранится в памяти
+процесса, поэтому у остальных воркеров устаревший токен живёт не дольше SESSION_TTL.
+
+Билет потока (issue_stream_ticket) — тот же формат с aud="stream" и id турнира:
+EventSource не умеет слать заголовки, и билет уходит в URL (?ticket=), а значит
+и в логи прокси. Поэтому он живёт STREAM_TICKET_TTL секунд, открывает только
+поток своего турнира и не принимается как сессионный токен.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Iterable, Optional
+from urllib.parse import parse_qsl
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "900"))
+STREAM_TICKET_TTL = int(os.getenv("STREAM_TICKET_TTL", "60"))
+STREAM_AUDIENCE = "stream"
+# Максимальный возраст initData (auth_date) в секундах
+INIT_DATA_MAX_AGE = int(os.getenv("INIT_DATA_MAX_AGE", "86400"))
+
+
+def _session_secret() -> Optional[bytes]:
+    secret = os.getenv("SESSION_SECRET")
+    if secret:
+        return secret.encode()
+    if BOT_TOKEN:
+        return hmac.new(b"PadelSession", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    return None
+
+
+SESSION_SECRET = _session_secret()
+
+_revoked_lock = threading.Lock()
+_revoked_before: dict[int, float] = {}
+
+
+class SessionError(Exception):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def validate_init_data(init_data: str) -> dict:
+    """
+    Проверяет подпись Telegram WebApp initData и возвращает данные пользователя.
+    https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    """
+    if not BOT_TOKEN:
+        raise SessionError("BOT_TOKEN не задан на backend")
+
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        raise SessionError("В initData нет hash")
+
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise SessionError("Неверная подпись initData")
+
+    auth_date = int(fields.get("auth_date", 0))
+    if time.time() - auth_date > INIT_DATA_MAX_AGE:
+        raise SessionError("initData устарели")
+
+    try:
+        return json.loads(fields["user"])
+    except (KeyError, ValueError):
+        raise SessionError("В initData нет пользователя")
+
+
+def _sign(payload: dict) -> str:
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    signature = hmac.new(SESSION_SECRET, body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64encode(signature)}"
+
+
+def issue_token(player_id: int, tg_id: int, roles: dict[int, str]) -> tuple[str, int]:
+    """Выпускает токен; возвращает (token, expires_at unix)."""
+    if SESSION_SECRET is None:
+        raise SessionError("Не задан SESSION_SECRET или BOT_TOKEN")
+    now = time.time()
+    expires_at = int(now) + SESSION_TTL
+    payload = {
+        "pid": player_id,
+        "tg": tg_id,
+        "roles": {str(chat_id): role for chat_id, role in roles.items()},
+        "iat": now,
+        "exp": expires_at,
+    }
+    return _sign(payload), expires_at
+
+
+def issue_stream_ticket(player_id: int, tg_id: int, roles: dict[int, str], tournament_id: int) -> tuple[str, int]:
+    """Билет на поток одного турнира (?ticket=); возвращает (ticket, expires_at unix)."""
+    if SESSION_SECRET is None:
+        raise SessionError("Не задан SESSION_SECRET или BOT_TOKEN")
+    now = time.time()
+    expires_at = int(now) + STREAM_TICKET_TTL
+    payload = {
+        "pid": player_id,
+        "tg": tg_id,
+        "roles": {str(chat_id): role for chat_id, role in roles.items()},
+        "aud": STREAM_AUDIENCE,
+        "tid": tournament_id,
+        "iat": now,
+        "exp": expires_at,
+    }
+    return _sign(payload), expires_at
+
+
+def _verify(token: str, audience: Optional[str]) -> dict:
+    if SESSION_SECRET is None:
+        raise SessionError("Сессионные токены не настроены")
+    try:
+        body, signature = token.split(".", 1)
+        expected = hmac.new(SESSION_SECRET, body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            raise SessionError("Неверная подпись токена")
+        payload = json.loads(_b64decode(body))
+    except (ValueError, TypeError):
+        raise SessionError("Неверный формат токена")
+
+    if payload.get("aud") != audience:
+        raise SessionError("Токен выпущен для другой цели")
+    if payload["exp"] < time.time():
+        raise SessionError("Срок действия токена истёк")
+    revoked_before = _revoked_before.get(payload["pid"])
+    if revoked_before is not None and payload["iat"] <= revoked_before:
+        raise SessionError("Токен отозван, получите новый")
+
+    payload["roles"] = {int(chat_id): role for chat_id, role in payload["roles"].items()}
+    return payload
+
+
+def verify_token(token: str) -> dict:
+    """Проверяет подпись, срок действия и отзыв; возвращает payload с roles: {int: str}."""
+    return _verify(token, None)
+
+
+def verify_stream_ticket(ticket: str, tournament_id: int) -> dict:
+    """verify_token для билета потока: только aud="stream" и только для своего турнира."""
+    payload = _verify(ticket, STREAM_AUDIENCE)
+    if payload["tid"] != tournament_id:
+        raise SessionError("Билет выпущен для другого турнира")
+    return payload
+
+
+def revoke_sessions(player_ids: Iterable[int]) -> None:
+    """Отзывает все выпущенные ранее токены игроков (после смены ролей)."""
+    now = time.time()
+    with _revoked_lock:
+        for player_id in player_ids:
+            _revoked_before[player_id] = now
+        # записи старше SESSION_TTL больше ничего не отзывают
+        stale = [pid for pid, ts in _revoked_before.items() if now - ts > SESSION_TTL]
+        for player_id in stale:
+            del _revoked_before[player_id]
@@ -0,0 +1,392 @@
+"""
+Живая турнирная таблица и пары следующего раунда (Mexicano и King of the Court).
+
+Таблица турнира строится из его матчей один раз и дальше только
+дополняется: каждый новый матч применяется как дельта к строкам двух
+игроков (apply). Таблицы живут в памяти процесса (live_standings):
+
+- путь записи (POST /matches, /tournaments/{id}/rounds) после commit
+  передаёт новые матчи в push — таблица обновляется сразу;
+- перед ответом таблица сверяется с БД по списку id матчей турнира
+  (один лёгкий запрос) и дочитывает только недостающие — так же видны
+  записи, сделанные другими воркерами.
+
+В памяти не больше STANDINGS_CACHE_SIZE таблиц: давно не запрошенные
+вытесняются (LRU) и при следующем запросе строятся из БД заново. Таблицы
+турниров с открытыми потоками событий (pinned) не вытесняются.
+
+Пары следующего раунда:
+- MX_CLASSIC: места 1–4 на первом корте (1+4 против 2+3), 5–8 на втором и т.д.;
+- MX_MIX: мужчины и женщины ранжируются отдельно, на корт — два мужчины и две
+  женщины соседних мест, сильный мужчина в паре со слабой женщиной;
+- MX_TEAM: команды (пары участников по порядку) по местам: 1 против 2, 3 против 4;
+- KING: победители прошлого раунда поднимаются на корт выше, проигравшие
+  опускаются; на первом корте победители остаются, на последнем — проигравшие.
+
+Если игроков не кратно четырём, отдыхают те, кто отдыхал реже всех, при
+равенстве — стоящие ниже в таблице. Одинаковые показатели дают одно место.
+
+Пары строятся парными (две команды на корт), а TournamentMatch хранит
+одиночный матч (player1 против player2): таблица, last_court и last_result
+считаются по записанным одиночным матчам, и раунд из next_round нельзя
+записать через /rounds без изменения схемы матча.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import (
+    GenderEnum,
+    Player,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    Tournament,
+    TournamentMatch,
+    TournamentPlayer,
+)
+
+LIVE_PAIRING_MODES = (
+    RatingModeEnum.MX_CLASSIC,
+    RatingModeEnum.MX_TEAM,
+    RatingModeEnum.MX_MIX,
+    RatingModeEnum.KING,
+)
+
+# Колонки матча, нужные таблице
+MATCH_COLUMNS = (
+    TournamentMatch.id,
+    TournamentMatch.round_number,
+    TournamentMatch.court_number,
+    TournamentMatch.player1_id,
+    TournamentMatch.player2_id,
+    TournamentMatch.score_type,
+    TournamentMatch.points1,
+    TournamentMatch.points2,
+    TournamentMatch.sets1,
+    TournamentMatch.sets2,
+)
+
+
+@dataclass
+class StandingLine:
+    player_id: int
+    rating: float = 1500.0
+    gender: Optional[GenderEnum] = None
+    games: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    score_for: int = 0
+    score_against: int = 0
+    rounds: set[int] = field(default_factory=set)
+    last_round: Optional[int] = None
+    last_court: Optional[int] = None
+    last_result: int = 0  # 1 — победа, 0 — ничья, -1 — поражение в последнем раунде
+
+    @property
+    def delta(self) -> int:
+        return self.score_for - self.score_against
+
+
+class TournamentStandings:
+    def __init__(self, tournament_id: int, mode: RatingModeEnum, lines: dict[int, StandingLine]):
+        self.tournament_id = tournament_id
+        self.mode = mode
+        self.lines = lines
+        # Порядок участников (для команд MX_TEAM — пары по порядку)
+        self.order = list(lines)
+        self.applied: set[int] = set()
+        self.rounds: set[int] = set()
+        self.version = 0
+        self.lock = threading.Lock()
+
+    # ---- инкрементальное обновление ----
+
+    def _line(self, player_id: int) -> StandingLine:
+        line = self.lines.get(player_id)
+        if line is None:
+            # игрок сыграл, но не записан в участники
+            line = self.lines[player_id] = StandingLine(player_id)
+            self.order.append(player_id)
+        return line
+
+    def apply(self, matches: Iterable) -> list[int]:
+        """
+        Применяет новые матчи (уже применённые пропускаются).
+        Возвращает id игроков, чьи строки изменились. Вызывать под self.lock.
+        """
+        changed: list[int] = []
+        for m in matches:
+            if m.id in self.applied:
+                continue
+            self.applied.add(m.id)
+            if m.score_type == ScoringTypeEnum.SETS:
+                s1, s2 = m.sets1 or 0, m.sets2 or 0
+            else:
+                s1, s2 = m.points1 or 0, m.points2 or 0
+            result = (s1 > s2) - (s1 < s2)
+            if m.round_number is not None:
+                self.rounds.add(m.round_number)
+
+            for player_id, mine, theirs, res in (
+                (m.player1_id, s1, s2, result),
+                (m.player2_id, s2, s1, -result),
+            ):
+                line = self._line(player_id)
+                line.games += 1
+                line.wins += res > 0
+                line.draws += res == 0
+                line.losses += res < 0
+                line.score_for += mine
+                line.score_against += theirs
+                if m.round_number is not None:
+                    line.rounds.add(m.round_number)
+                    if line.last_round is None or m.round_number >= line.last_round:
+                        line.last_round = m.round_number
+                        line.last_court = m.court_number
+                        line.last_result = res
+                changed.append(player_id)
+        if changed:
+            self.version += 1
+        return changed
+
+    # ---- таблица ----
+
+    def byes(self, line: StandingLine) -> int:
+        return len(self.rounds) - len(line.rounds)
+
+    def _sort_key(self, line: StandingLine) -> tuple:
+        if self.mode == RatingModeEnum.KING:
+            return (-line.wins, -line.delta, -line.score_for)
+        return (-line.score_for, -line.delta, -line.wins)
+
+    def ranking(self) -> list[tuple[int, StandingLine]]:
+        """[(место, строка)] — одинаковые показатели делят место (1, 2, 2, 4)."""
+        ordered = sorted(self.lines.values(), key=lambda line: (self._sort_key(line), -line.rating, line.player_id))
+        ranked: list[tuple[int, StandingLine]] = []
+        for position, line in enumerate(ordered, start=1):
+            if ranked and self._sort_key(ranked[-1][1]) == self._sort_key(line):
+                ranked.append((ranked[-1][0], line))
+            else:
+                ranked.append((position, line))
+        return ranked
+
+    def table(self) -> list[dict]:
+        return [
+            {
+                "rank": rank,
+                "player_id": line.player_id,
+                "games": line.games,
+                "wins": line.wins,
+                "draws": line.draws,
+                "losses": line.losses,
+                "score_for": line.score_for,
+                "score_against": line.score_against,
+                "delta": line.delta,
+                "byes": self.byes(line),
+            }
+            for rank, line in self.ranking()
+        ]
+
+    # ---- следующий раунд ----
+
+    def _pick_byes(self, units: list[list[StandingLine]], playing: int) -> tuple[list, list]:
+        """Делит единицы (игроков или команды) в порядке таблицы на играющих и отдыхающих."""
+        resting = len(units) - playing
+        if resting <= 0:
+            return units, []
+        # отдыхают те, кто отдыхал реже всех; при равенстве — стоящие ниже
+        by_priority = sorted(
+            range(len(units)),
+            key=lambda i: (min(self.byes(line) for line in units[i]), -i),
+        )
+        sit = set(by_priority[:resting])
+        return (
+            [u for i, u in enumerate(units) if i not in sit],
+            [u for i, u in enumerate(units) if i in sit],
+        )
+
+    def next_round(self, courts: Optional[int] = None) -> dict:
+        """Пары следующего раунда по текущей таблице. Вызывать под self.lock."""
+        ranked = [line for _, line in self.ranking()]
+        if self.mode == RatingModeEnum.MX_TEAM:
+            lines = self.lines
+            teams = [
+                [lines[self.order[i]], lines[self.order[i + 1]]]
+                for i in range(0, len(self.order) - 1, 2)
+            ]
+            position = {line.player_id: i for i, line in enumerate(ranked)}
+            teams.sort(key=lambda team: min(position[line.player_id] for line in team))
+            n_courts = min(courts or len(teams) // 2, len(teams) // 2)
+            playing, resting = self._pick_byes(teams, 2 * n_courts)
+            court_lines = [playing[2 * c] + playing[2 * c + 1] for c in range(n_courts)]
+        else:
+            n_courts = min(courts or len(ranked) // 4, len(ranked) // 4)
+            if self.mode == RatingModeEnum.MX_MIX:
+                court_lines, resting = self._mix_courts(ranked, n_courts)
+            else:
+                playing, resting = self._pick_byes([[line] for line in ranked], 4 * n_courts)
+                playing = [unit[0] for unit in playing]
+                if self.mode == RatingModeEnum.KING:
+                    playing = self._king_order(playing, n_courts)
+                court_lines = [
+                    # 1+4 против 2+3
+                    [playing[4 * c], playing[4 * c + 3], playing[4 * c + 1], playing[4 * c + 2]]
+                    for c in range(n_courts)
+                ]
+
+        return {
+            "round_number": max(self.rounds, default=0) + 1,
+            "courts": [
+                {
+                    "court_number": c + 1,
+                    "team1": [group[0].player_id, group[1].player_id],
+                    "team2": [group[2].player_id, group[3].player_id],
+                }
+                for c, group in enumerate(court_lines)
+            ],
+            "byes": sorted(line.player_id for unit in resting for line in unit),
+        }
+
+    def _mix_courts(self, ranked: list[StandingLine], n_courts: int) -> tuple[list, list]:
+        men = [[line] for line in ranked if line.gender == GenderEnum.MALE]
+        women = [[line] for line in ranked if line.gender == GenderEnum.FEMALE]
+        n_courts = min(n_courts, len(men) // 2, len(women) // 2)
+        if n_courts == 0:
+            # нет пола или одного из полов — как MX_CLASSIC
+            n_courts = len(ranked) // 4
+            playing, resting = self._pick_byes([[line] for line in ranked], 4 * n_courts)
+            playing = [unit[0] for unit in playing]
+            return [
+                [playing[4 * c], playing[4 * c + 3], playing[4 * c + 1], playing[4 * c + 2]]
+                for c in range(n_courts)
+            ], resting
+        men_playing, men_resting = self._pick_byes(men, 2 * n_courts)
+        women_playing, women_resting = self._pick_byes(women, 2 * n_courts)
+        others = [[line] for line in ranked if line.gender not in (GenderEnum.MALE, GenderEnum.FEMALE)]
+        courts = []
+        for c in range(n_courts):
+            m1, m2 = men_playing[2 * c][0], men_playing[2 * c + 1][0]
+            w1, w2 = women_playing[2 * c][0], women_playing[2 * c + 1][0]
+            courts.append([m1, w2, m2, w1])
+        return courts, men_resting + women_resting + others
+
+    def _king_order(self, playing: list[StandingLine], n_courts: int) -> list[StandingLine]:
+        """
+        Порядок игроков по кортам для King of the Court: победитель поднимается
+        на корт выше, проигравший опускается, ничья — остаётся. Отдыхавшие и
+        новые возвращаются на свой прошлый корт (новые — на последний).
+        """
+        if not self.rounds:
+            # первый раунд: посев по рейтингу игроков
+            return sorted(playing, key=lambda line: (-line.rating, line.player_id))
+        rank_of = {line.player_id: i for i, line in enumerate(playing)}
+        last_round = max(self.rounds)
+
+        def target(line: StandingLine) -> tuple:
+            court = line.last_court if line.last_court is not None else n_courts
+            if line.last_round == last_round:
+                court -= line.last_result
+            court = min(max(court, 1), n_courts)
+            return (court, -line.last_result if line.last_round == last_round else 0, rank_of[line.player_id])
+
+        return sorted(playing, key=target)
+
+
+class LiveStandings:
+    """Таблицы турниров в памяти процесса, не больше max_tables (LRU)."""
+
+    def __init__(self, max_tables: int):
+        self.max_tables = max_tables
+        self._lock = threading.Lock()
+        self._tables: OrderedDict[int, TournamentStandings] = OrderedDict()
+        # None — вытеснять любые; иначе таблицы, для которых pinned(id) истинно, не вытесняются
+        self.pinned: Optional[Callable[[int], bool]] = None
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "LiveStandings":
+        return cls(max_tables=int(os.getenv("STANDINGS_CACHE_SIZE", "256")))
+
+    def _load(self, db: Session, tournament: Tournament) -> TournamentStandings:
+        lines = {
+            player_id: StandingLine(player_id, rating=rating or 1500.0, gender=gender)
+            for player_id, rating, gender in db.execute(
+                select(TournamentPlayer.player_id, Player.current_rating, Player.gender)
+                .join(Player, Player.id == TournamentPlayer.player_id)
+                .where(TournamentPlayer.tournament_id == tournament.id)
+                .order_by(TournamentPlayer.joined_at, TournamentPlayer.player_id)
+            )
+        }
+        standings = TournamentStandings(tournament.id, tournament.mode, lines)
+        standings.apply(
+            db.execute(
+                select(*MATCH_COLUMNS)
+                .where(TournamentMatch.tournament_id == tournament.id)
+                .order_by(TournamentMatch.id)
+            )
+        )
+        return standings
+
+    def get(self, db: Session, tournament: Tournament) -> TournamentStandings:
+        """Таблица турнира, сверенная с БД: дочитываются только ещё не применённые матчи."""
+        standings = self.loaded(tournament.id)
+        if standings is None:
+            standings = self._load(db, tournament)
+            with self._lock:
+                standings = self._tables.setdefault(tournament.id, standings)
+                self._evict()
+            return standings
+
+        ids = db.scalars(select(TournamentMatch.id).where(TournamentMatch.tournament_id == tournament.id)).all()
+        missing = [match_id for match_id in ids if match_id not in standings.applied]
+        if missing:
+            rows = db.execute(select(*MATCH_COLUMNS).where(TournamentMatch.id.in_(missing)).order_by(TournamentMatch.id))
+            with standings.lock:
+                standings.apply(rows)
+        return standings
+
+    def push(self, tournament_id: int, matches: Iterable) -> Optional[list[int]]:
+        """
+        Применяет только что записанные матчи (после commit), если таблица турнира
+        загружена. Возвращает id игроков с изменившимися строками или None.
+        """
+        standings = self.loaded(tournament_id)
+        if standings is None:
+            return None
+        with standings.lock:
+            return standings.apply(matches)
+
+    def loaded(self, tournament_id: int) -> Optional[TournamentStandings]:
+        """Таблица турнира, если она уже в памяти (без обращения к БД)."""
+        with self._lock:
+            standings = self._tables.get(tournament_id)
+            if standings is not None:
+                self._tables.move_to_end(tournament_id)
+            return standings
+
+    def _evict(self) -> None:
+        """Вытесняет самые давние таблицы сверх max_tables, кроме закреплённых. Под self._lock."""
+        excess = len(self._tables) - self.max_tables
+        if excess <= 0:
+            return
+        for tournament_id in list(self._tables):
+            if excess <= 0:
+                break
+            if self.pinned is not None and self.pinned(tournament_id):
+                continue
+            del self._tables[tournament_id]
+            self.evictions += 1
+            excess -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tables": len(self._tables), "max_tables": self.max_tables, "evictions": self.evictions}
+
+
+live_standings = LiveStandings.from_env()
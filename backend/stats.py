@@ -0,0 +1,171 @@
+"""
+Инкрементальная агрегация статистики игроков (PlayerModeStats).
+
+Каждый записанный матч применяется как дельта к строкам статистики обоих
+игроков по ключу (player_id, mode, chat_id) в той же транзакции, что и
+вставка матча. История матчей никогда не перечитывается, поэтому стоимость
+записи матча не зависит от того, сколько матчей уже сыграно в чате.
+"""
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .cache import mark_leaderboard_dirty
+from .db import dialect_insert
+from .versions import mark_changed
+from .models import PlayerModeStats, RatingModeEnum, ScoringTypeEnum
+
+
+# Колонки PlayerModeStats, которые изменяются дельтами
+STAT_COLUMNS = (
+    "games_played",
+    "wins_games",
+    "draws_games",
+    "losses_games",
+    "wins_sets",
+    "losses_sets",
+    "points_scored",
+    "points_conceded",
+    "delta_points",
+    "delta_sets",
+)
+
+
+def _side_delta(
+    score_type: ScoringTypeEnum,
+    points_for: Optional[int],
+    points_against: Optional[int],
+    sets_for: Optional[int],
+    sets_against: Optional[int],
+) -> dict[str, int]:
+    """
+    Считает дельту статистики для одной стороны матча.
+    Исход (победа/ничья/поражение) определяется по типу счёта матча.
+    """
+    pf = points_for or 0
+    pa = points_against or 0
+    sf = sets_for or 0
+    sa = sets_against or 0
+
+    if score_type == ScoringTypeEnum.SETS:
+        mine, theirs = sf, sa
+    else:
+        mine, theirs = pf, pa
+
+    return {
+        "games_played": 1,
+        "wins_games": int(mine > theirs),
+        "draws_games": int(mine == theirs),
+        "losses_games": int(mine < theirs),
+        "wins_sets": sf,
+        "losses_sets": sa,
+        "points_scored": pf,
+        "points_conceded": pa,
+        "delta_points": pf - pa,
+        "delta_sets": sf - sa,
+    }
+
+
+def match_deltas(match) -> dict[int, dict[str, int]]:
+    """
+    Возвращает дельты статистики для обоих игроков матча: {player_id: {колонка: дельта}}.
+    Принимает TournamentMatch или любой объект с теми же атрибутами (например, MatchCreate).
+    """
+    return {
+        match.player1_id: _side_delta(
+            match.score_type, match.points1, match.points2, match.sets1, match.sets2
+        ),
+        match.player2_id: _side_delta(
+            match.score_type, match.points2, match.points1, match.sets2, match.sets1
+        ),
+    }
+
+
+def _upsert_stats(db: Session, mode: RatingModeEnum, chat_id: Optional[int], deltas: dict[int, dict[str, int]]) -> None:
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x для строк одного (mode, chat_id):
+    отсутствующие строки создаются с дельтой как начальными значениями, существующие
+    увеличиваются атомарно. Цель конфликта — частичные unique-индексы модели.
+    """
+    mark_leaderboard_dirty(db, mode, chat_id)
+    mark_changed(db, "player_mode_stats", chat_id)
+    table = PlayerModeStats.__table__
+    stmt = dialect_insert(db, table)
+    if chat_id is None:
+        target = {"index_elements": [table.c.player_id, table.c.mode], "index_where": table.c.chat_id.is_(None)}
+    else:
+        target = {
+            "index_elements": [table.c.player_id, table.c.mode, table.c.chat_id],
+            "index_where": table.c.chat_id.is_not(None),
+        }
+    stmt = stmt.on_conflict_do_update(
+        **target,
+        set_={name: func.coalesce(table.c[name], 0) + stmt.excluded[name] for name in STAT_COLUMNS},
+    )
+    db.execute(
+        stmt,
+        [
+            {
+                "player_id": player_id,
+                "mode": mode,
+                "chat_id": chat_id,
+                "extra1": 0.0,
+                "extra2": 0.0,
+                **{name: delta[name] for name in STAT_COLUMNS},
+            }
+            for player_id, delta in deltas.items()
+        ],
+    )
+
+
+def apply_stats_delta(
+    db: Session,
+    player_id: int,
+    mode: RatingModeEnum,
+    chat_id: Optional[int],
+    delta: dict[str, int],
+) -> None:
+    """Атомарно прибавляет дельту к строке (player_id, mode, chat_id), создавая её при необходимости."""
+    _upsert_stats(db, mode, chat_id, {player_id: delta})
+
+
+def apply_match_stats(
+    db: Session,
+    match,
+    mode: RatingModeEnum,
+    chat_id: Optional[int],
+) -> None:
+    """
+    Применяет результат матча к статистике обоих игроков.
+    Не коммитит — вызывающий код коммитит вместе со вставкой матча.
+    """
+    _upsert_stats(db, mode, chat_id, match_deltas(match))
+
+
+def round_deltas(matches) -> dict[int, dict[str, int]]:
+    """Суммарные дельты по всем матчам (например, раунда): {player_id: {колонка: дельта}}."""
+    totals: dict[int, dict[str, int]] = {}
+    for match in matches:
+        for player_id, delta in match_deltas(match).items():
+            total = totals.get(player_id)
+            if total is None:
+                totals[player_id] = dict(delta)
+            else:
+                for name in STAT_COLUMNS:
+                    total[name] += delta[name]
+    return totals
+
+
+def apply_stats_deltas(
+    db: Session,
+    mode: RatingModeEnum,
+    chat_id: Optional[int],
+    deltas: dict[int, dict[str, int]],
+) -> None:
+    """
+    Пакетная версия apply_stats_delta для многих игроков одного (mode, chat_id):
+    один upsert (executemany) вместо пары запросов на игрока.
+    """
+    if deltas:
+        _upsert_stats(db, mode, chat_id, deltas)
@@ -0,0 +1,4 @@
+"""Трассировщик backend; реализация — observability/tracing.py."""
+from observability.tracing import TRACEPARENT, Span, Tracer, current_span, current_trace_id  # noqa: F401
+
+tracer = Tracer.from_env("backend")
@@ -0,0 +1,174 @@
+"""
+Версии данных для ETag и условных GET (If-None-Match -> 304).
+
+Для каждой пары (таблица, чат) ведётся счётчик, который растёт после commit
+транзакции, изменившей эту таблицу в этом чате. ETag ответа собирается из
+счётчиков таблиц, от которых он зависит, поэтому проверить If-None-Match
+можно до основного запроса к БД.
+
+Откуда берутся изменения:
+- ORM-объекты (add/изменение/delete) отслеживаются автоматически после flush;
+  чат берётся из поля chat_id объекта, для самих чатов — из id;
+- Core DML через Session.execute (insert/update/delete) тоже отслеживается,
+  но без чата — такая запись сбрасывает все чаты таблицы;
+- пути записи, которые знают чат, помечают его сами (mark_changed) — тогда
+  общий сброс для этой таблицы в транзакции не нужен.
+
+ETag считается до основного запроса: если запись успела закоммититься между
+ними, клиент получит свежие данные со старым ETag и просто перечитает их
+в следующий раз — обратная ситуация (новый ETag со старыми данными) исключена.
+
+Счётчики живут в памяти процесса. В ETag входят случайная эпоха процесса
+(после рестарта все ETag меняются) и номер окна ETAG_TTL секунд — при
+нескольких воркерах чужие записи будут видны не позже чем через это окно,
+как и в кеше рейтинга (cache.py).
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+from typing import Iterable, Optional, Union
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+# Кеш рейтинга должен сбрасываться раньше роста версий (after_commit-обработчики
+# вызываются в порядке регистрации): иначе новый ETag мог бы уйти со старым телом
+from . import cache  # noqa: F401
+
+# Таблицы, для которых ведутся версии
+TRACKED_TABLES = frozenset({"players", "player_mode_stats", "tg_chats", "chat_members", "chat_admins"})
+
+# Сброс всех чатов таблицы
+ALL_CHATS = "*"
+
+# Ключи в Session.info: явно помеченные области и таблицы, изменённые Core DML
+_CHANGED_KEY = "versions_changed"
+_DML_KEY = "versions_dml"
+
+ETAG_TTL = float(os.getenv("ETAG_TTL", "300"))
+# Сколько секунд nginx может отдавать публичный ответ из своего кеша (X-Accel-Expires)
+ETAG_MICROCACHE = int(os.getenv("ETAG_MICROCACHE", "2"))
+
+# Клиент всегда переспрашивает (If-None-Match), но сам ответ можно хранить
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+# Ответы, зависящие от пользователя: только в браузере, не в прокси
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+class TableVersions:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Union[int, str, None]], int] = {}
+        self.epoch = secrets.token_hex(4)
+
+    def bump(self, table: str, chat_id: Union[int, str, None] = None) -> None:
+        """
+        Запись в таблицу в чате chat_id. Меняет версию чата и общих (chat_id=None)
+        представлений таблицы; ALL_CHATS меняет версии всех чатов.
+        """
+        with self._lock:
+            for key in {(table, chat_id), (table, None)}:
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def get(self, table: str, chat_id: Optional[int] = None) -> tuple[int, int]:
+        counters = self._counters
+        return counters.get((table, ALL_CHATS), 0), counters.get((table, chat_id), 0)
+
+    def etag(self, tables: Iterable[str], chat_id: Optional[int] = None, *extra) -> str:
+        """Слабый ETag из версий таблиц (и доп. частей, например пользователя)."""
+        window = int(time.time() // ETAG_TTL) if ETAG_TTL > 0 else 0
+        parts = [self.epoch, window, *(self.get(table, chat_id) for table in tables), *extra]
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+        return f'W/"{digest}"'
+
+
+table_versions = TableVersions()
+
+
+def mark_changed(db: Session, table: str, chat_id: Union[int, str, None] = ALL_CHATS) -> None:
+    """Помечает таблицу (в чате) изменённой; версия растёт после commit."""
+    db.info.setdefault(_CHANGED_KEY, set()).add((table, chat_id))
+
+
+def _object_scope(obj) -> Optional[tuple[str, Union[int, str, None]]]:
+    table = getattr(obj, "__tablename__", None)
+    if table not in TRACKED_TABLES:
+        return None
+    if table == "tg_chats":
+        return table, obj.id
+    if hasattr(obj, "chat_id"):
+        return table, obj.chat_id
+    return table, ALL_CHATS
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        scope = _object_scope(obj)
+        if scope is not None:
+            mark_changed(session, *scope)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_dml(state: ORMExecuteState) -> None:
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    table = getattr(state.statement, "table", None)
+    name = getattr(table, "name", None)
+    if name in TRACKED_TABLES:
+        state.session.info.setdefault(_DML_KEY, set()).add(name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session) -> None:
+    changed = session.info.pop(_CHANGED_KEY, set())
+    dml = session.info.pop(_DML_KEY, set())
+    # DML без явной пометки: чат неизвестен — сбрасываем всю таблицу
+    explicit = {table for table, _ in changed}
+    changed |= {(table, ALL_CHATS) for table in dml - explicit}
+    for table, chat_id in changed:
+        table_versions.bump(table, chat_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+    session.info.pop(_DML_KEY, None)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли If-None-Match с etag (слабое сравнение, как требует RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def cache_headers(etag: str, public: bool) -> dict[str, str]:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": PUBLIC_CACHE_CONTROL if public else PRIVATE_CACHE_CONTROL,
+    }
+    if not public:
+        headers["Vary"] = "Authorization, X-User-Tg-Id"
+    elif ETAG_MICROCACHE > 0:
+        # nginx: X-Accel-Expires важнее Cache-Control и не уходит клиенту
+        headers["X-Accel-Expires"] = str(ETAG_MICROCACHE)
+    return headers
+
+
+def not_modified(request: Request, etag: str, public: bool = True) -> Optional[Response]:
+    """Ответ 304, если у клиента актуальная версия, иначе None."""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag, public))
+    return None
+
+
+def set_cache_headers(response: Response, etag: str, public: bool = True) -> None:
+    response.headers.update(cache_headers(etag, public))
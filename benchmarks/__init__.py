@@ -0,0 +1,11 @@
+"""
+Бенчмарки и проверки (python -m benchmarks.<скрипт>).
+
+Скрипты поднимают backend в своём процессе; строка JSON на каждый запрос
+(логгер backend.requests) и строка на каждый вызов TestClient (логгер httpx)
+заглушили бы их отчёты, поэтому здесь они выключены.
+"""
+import logging
+
+for name in ("backend.requests", "httpx"):
+    logging.getLogger(name).setLevel(logging.WARNING)
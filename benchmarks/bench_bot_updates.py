@@ -0,0 +1,348 @@
+"""
+Пропускная способность бота: апдейты в секунду при разной параллельности.
+
+Поднимает в этом же процессе заглушку Telegram Bot API и backend (uvicorn,
+настраиваемые задержки ответов), собирает приложение бота через
+bot.build_application и прогоняет через него записанные апдейты:
+
+- polling: заглушка отдаёт апдейты из getUpdates пачками по 100;
+- webhook: бот слушает webhook, драйвер шлёт апдейты POST-запросами
+  (параллельно по чатам, внутри чата — по порядку, как Telegram).
+
+Для каждого значения --concurrency печатает updates/s, время апдейта в системе
+(от выдачи заглушкой до конца обработки) и число нарушений порядка внутри чата.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_bot_updates --chats 50 --updates-count 2000 --concurrency 1,4,16,64
+    # свои записанные апдейты (JSON Update на строку) и режим webhook
+    python -m benchmarks.bench_bot_updates --updates recorded.jsonl --mode webhook
+    # сохранить сгенерированные апдейты
+    python -m benchmarks.bench_bot_updates --record updates.jsonl
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+TOKEN = "123456:BENCH"
+os.environ["BOT_TOKEN"] = TOKEN
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.sqlite3"))
+os.environ.setdefault("BOT_METRICS_PORT", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot"))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, TypeHandler  # noqa: E402
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+# ---------- записанные апдейты ----------
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def _command(text: str) -> dict:
+    return {"text": text, "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+
+
+def generate_updates(n: int, chats: int, sync_share: float, seed: int) -> list[dict]:
+    """Смесь команд и событий участников в `chats` группах."""
+    rng = random.Random(seed)
+    members: dict[int, set[int]] = defaultdict(set)
+    updates = []
+    for update_id in range(1, n + 1):
+        chat_id = -1000 - rng.randrange(chats)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"Chat {chat_id}"},
+        }
+        roll = rng.random()
+        if roll < sync_share:
+            message.update(_command("/sync"), **{"from": _user(1000 + abs(chat_id))})
+        elif roll < 0.45:
+            user_id = rng.randrange(1, 5000)
+            members[chat_id].add(user_id)
+            message.update({"from": _user(user_id), "new_chat_members": [_user(user_id)]})
+        elif roll < 0.6 and members[chat_id]:
+            user_id = rng.choice(sorted(members[chat_id]))
+            members[chat_id].discard(user_id)
+            message.update({"from": _user(user_id), "left_chat_member": _user(user_id)})
+        else:
+            user_id = rng.randrange(1, 5000)
+            message.update(_command("/me"), **{"from": _user(user_id)})
+        updates.append({"update_id": update_id, "message": message})
+    return updates
+
+
+def chat_of(update: dict) -> int:
+    return update["message"]["chat"]["id"] if "message" in update else 0
+
+
+# ---------- заглушка Telegram Bot API и backend ----------
+
+class StandIn:
+    def __init__(self, updates: list[dict], tg_latency: float, backend_latency: float, sync_latency: float):
+        self.updates = sorted(updates, key=lambda u: u["update_id"])
+        self.update_ids = [u["update_id"] for u in self.updates]
+        self.tg_latency = tg_latency
+        self.backend_latency = backend_latency
+        self.sync_latency = sync_latency
+        self.served_at: dict[int, float] = {}
+        self.offset = 0
+        self.api_calls: dict[str, int] = defaultdict(int)
+        self.app = self._build()
+
+    def reset(self) -> None:
+        self.served_at.clear()
+        self.offset = 0
+        self.api_calls.clear()
+
+    def _build(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def bot_api(method: str, request: Request):
+            params = {k: _maybe_json(v) for k, v in parse_qsl((await request.body()).decode())}
+            self.api_calls[method] += 1
+            if method == "getUpdates":
+                return {"ok": True, "result": await self._get_updates(params)}
+            await asyncio.sleep(self.tg_latency)
+            return {"ok": True, "result": _api_result(method, params)}
+
+        @app.post("/bot/chats/members/sync")
+        async def sync(request: Request):
+            data = await request.json()
+            await asyncio.sleep(self.sync_latency)
+            n = len(data["members"])
+            return {"members_processed": n, "players_created": 0, "players_updated": n}
+
+        @app.api_route("/{path:path}", methods=["GET", "POST"])
+        async def backend(path: str):
+            await asyncio.sleep(self.backend_latency)
+            if path.startswith("players/by_tg/"):
+                return {"display_name": "Bench", "username": "bench", "current_rating": 1500.0}
+            if path == "players/register":
+                return {"display_name": "Bench", "current_rating": 1500.0}
+            return JSONResponse({"status": "success", "skipped_chats": []})
+
+        return app
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        if offset:
+            # подтверждены все апдейты с update_id < offset
+            self.offset = max(self.offset, bisect.bisect_left(self.update_ids, offset))
+        batch = self.updates[self.offset:self.offset + 100]
+        if not batch:
+            await asyncio.sleep(min(float(params.get("timeout") or 0), 0.05))
+            return []
+        now = time.perf_counter()
+        for update in batch:
+            self.served_at.setdefault(update["update_id"], now)
+        return batch
+
+
+def _maybe_json(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _api_result(method: str, params: dict):
+    chat_id = params.get("chat_id", 0)
+    if method == "getMe":
+        return BOT_USER
+    if method == "sendMessage":
+        return {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+    if method == "getChatMember":
+        return {"status": "creator", "user": _user(int(params.get("user_id", 0))), "is_anonymous": False}
+    if method == "getChatAdministrators":
+        return [
+            {"status": "creator", "user": _user(1000 + abs(int(chat_id))), "is_anonymous": False},
+            {"status": "creator", "user": BOT_USER, "is_anonymous": False},
+        ]
+    return True
+
+
+# ---------- прогон ----------
+
+async def run_once(
+    stand_in: StandIn,
+    base_url: str,
+    concurrency: int,
+    mode: str,
+    webhook_port: int,
+) -> dict:
+    import bot as bot_module
+
+    stand_in.reset()
+    updates = stand_in.updates
+    application: Application = bot_module.build_application(concurrency, base_url=f"{base_url}/bot")
+
+    started_at: dict[int, float] = {}
+    finished_at: dict[int, float] = {}
+    order: dict[int, list[int]] = defaultdict(list)
+    done = asyncio.Event()
+
+    async def on_begin(update: Update, context) -> None:
+        started_at[update.update_id] = time.perf_counter()
+        order[update.effective_chat.id if update.effective_chat else 0].append(update.update_id)
+
+    async def on_end(update: Update, context) -> None:
+        finished_at[update.update_id] = time.perf_counter()
+        if len(finished_at) == len(updates):
+            done.set()
+
+    application.add_handler(TypeHandler(Update, on_begin), group=-1)
+    application.add_handler(TypeHandler(Update, on_end), group=1)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    t0 = time.perf_counter()
+    try:
+        if mode == "polling":
+            await application.updater.start_polling(poll_interval=0, timeout=0)
+            await done.wait()
+        else:
+            await application.updater.start_webhook(
+                listen="127.0.0.1",
+                port=webhook_port,
+                url_path="webhook",
+                webhook_url=f"http://127.0.0.1:{webhook_port}/webhook",
+            )
+            t0 = time.perf_counter()
+            await _post_webhook(updates, stand_in, f"http://127.0.0.1:{webhook_port}/webhook")
+            await done.wait()
+        elapsed = time.perf_counter() - t0
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+
+    in_system = sorted(finished_at[uid] - stand_in.served_at.get(uid, started_at[uid]) for uid in finished_at)
+    q = statistics.quantiles(in_system, n=100) if len(in_system) > 1 else [0.0] * 99
+    violations = sum(
+        1
+        for ids in order.values()
+        for prev, cur in zip(ids, ids[1:])
+        if cur < prev
+    )
+    return {
+        "updates": len(finished_at),
+        "elapsed_s": elapsed,
+        "updates_per_s": len(finished_at) / elapsed,
+        "p50_ms": q[49] * 1000,
+        "p95_ms": q[94] * 1000,
+        "p99_ms": q[98] * 1000,
+        "order_violations": violations,
+        "api_calls": dict(stand_in.api_calls),
+    }
+
+
+async def _post_webhook(updates: list[dict], stand_in: StandIn, url: str, workers: int = 40) -> None:
+    """Как Telegram: до `workers` соединений, апдейты одного чата — строго по очереди."""
+    shards: dict[int, list[dict]] = defaultdict(list)
+    for update in updates:
+        shards[hash(chat_of(update)) % workers].append(update)
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=workers)) as client:
+        async def send(shard: list[dict]) -> None:
+            for update in shard:
+                stand_in.served_at[update["update_id"]] = time.perf_counter()
+                resp = await client.post(url, json=update)
+                resp.raise_for_status()
+
+        await asyncio.gather(*(send(shard) for shard in shards.values()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пропускная способность бота (updates/s)")
+    parser.add_argument("--updates", help="Файл с записанными апдейтами (JSON Update на строку)")
+    parser.add_argument("--record", help="Сохранить сгенерированные апдейты в файл и выйти")
+    parser.add_argument("--updates-count", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--sync-share", type=float, default=0.02, help="Доля команд /sync")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Значения BOT_CONCURRENCY через запятую")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--tg-latency-ms", type=float, default=30.0, help="Задержка ответа Bot API")
+    parser.add_argument("--backend-latency-ms", type=float, default=10.0)
+    parser.add_argument("--sync-latency-ms", type=float, default=500.0, help="Задержка /bot/chats/members/sync")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--webhook-port", type=int, default=8767)
+    args = parser.parse_args()
+
+    if args.updates:
+        with open(args.updates) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = generate_updates(args.updates_count, args.chats, args.sync_share, args.seed)
+    if args.record:
+        with open(args.record, "w") as f:
+            for update in updates:
+                f.write(json.dumps(update, ensure_ascii=False) + "\n")
+        print(f"{len(updates)} updates written to {args.record}")
+        return
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    os.environ["BACKEND_URL"] = base_url
+    logging.disable(logging.WARNING)
+
+    stand_in = StandIn(
+        updates,
+        tg_latency=args.tg_latency_ms / 1000,
+        backend_latency=args.backend_latency_ms / 1000,
+        sync_latency=args.sync_latency_ms / 1000,
+    )
+    server = uvicorn.Server(uvicorn.Config(stand_in.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    print(
+        f"mode={args.mode} updates={len(updates)} chats={len({chat_of(u) for u in updates})} "
+        f"tg_latency={args.tg_latency_ms}ms backend_latency={args.backend_latency_ms}ms "
+        f"sync_latency={args.sync_latency_ms}ms"
+    )
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            r = asyncio.run(run_once(stand_in, base_url, concurrency, args.mode, args.webhook_port))
+            print(
+                f"concurrency={concurrency:<4} {r['updates_per_s']:8.1f} updates/s  "
+                f"({r['updates']} in {r['elapsed_s']:.2f}s)  "
+                f"in-system p50={r['p50_ms']:7.1f}ms p95={r['p95_ms']:7.1f}ms p99={r['p99_ms']:7.1f}ms  "
+                f"order_violations={r['order_violations']}"
+            )
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Нагрузочное сравнение sync (threadpool + Session) и async (AsyncSession) стеков.
+
+Поднимает backend в uvicorn в этом же процессе и добавляет к нему sync-двойников
+горячих read-эндпоинтов (/_bench/sync/...), повторяющих старую реализацию.
+Затем гоняет одинаковую нагрузку на обе версии и печатает req/s и задержки.
+
+Запуск из корня репозитория:
+    # SQLite во временном файле (по умолчанию)
+    python -m benchmarks.bench_db_stack --players 2000 --concurrency 200 --duration 10
+    # реальный Postgres: нагрузочная разница видна именно на сетевой БД
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_db_stack --no-seed
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_db_stack.db')}"
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import Depends, Query  # noqa: E402
+from sqlalchemy import String, cast, or_  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from typing import List  # noqa: E402
+
+from backend.db import Base, SessionLocal, engine, get_db  # noqa: E402
+from backend.main import PlayerListOut, PlayerOut, app  # noqa: E402
+from backend.models import Player  # noqa: E402
+
+
+def sync_list_players(db: Session = Depends(get_db)):
+    return (
+        db.query(Player)
+        .order_by(Player.current_rating.desc(), Player.id.asc())
+        .all()
+    )
+
+
+def sync_search_players(q: str = Query(...), db: Session = Depends(get_db)):
+    pattern = f"%{q}%"
+    return (
+        db.query(Player)
+        .filter(
+            or_(
+                Player.display_name.ilike(pattern),
+                Player.username.ilike(pattern),
+                cast(Player.tg_id, String).ilike(pattern),
+            )
+        )
+        .order_by(Player.display_name.asc())
+        .limit(20)
+        .all()
+    )
+
+
+app.add_api_route("/_bench/sync/players", sync_list_players, response_model=List[PlayerListOut])
+app.add_api_route("/_bench/sync/players/search", sync_search_players, response_model=List[PlayerOut])
+
+SCENARIOS = {
+    "players/search": ("/_bench/sync/players/search?q=ab", "/players/search?q=ab"),
+    "players": ("/_bench/sync/players", "/players"),
+}
+
+
+def seed(n_players: int) -> None:
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        if db.query(Player.id).first() is not None:
+            return
+        db.bulk_insert_mappings(
+            Player,
+            [
+                {
+                    "tg_id": 10_000_000 + i,
+                    "username": f"user{i:06x}",
+                    "display_name": f"Player {i:06x}",
+                    "current_rating": 1200.0 + (i * 7919) % 800,
+                }
+                for i in range(n_players)
+            ],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def drive(client: httpx.AsyncClient, url: str, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                resp = await client.get(url)
+                if resp.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": q[49] * 1000,
+        "p95_ms": q[94] * 1000,
+        "p99_ms": q[98] * 1000,
+    }
+
+
+async def run(base_url: str, concurrency: int, duration: float) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        for name, (sync_url, async_url) in SCENARIOS.items():
+            for stack, url in (("sync", sync_url), ("async", async_url)):
+                await client.get(url)  # прогрев
+                r = await drive(client, url, concurrency, duration)
+                print(
+                    f"{name:16} {stack:5}  {r['rps']:8.1f} req/s  "
+                    f"p50={r['p50_ms']:7.1f}ms p95={r['p95_ms']:7.1f}ms p99={r['p99_ms']:7.1f}ms  "
+                    f"errors={r['errors']}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение sync и async стеков БД")
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-seed", action="store_true", help="Не создавать таблицы и данные")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(args.players)
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        print(
+            f"concurrency={args.concurrency} duration={args.duration}s "
+            f"pool_size={os.getenv('DB_POOL_SIZE', '5')} max_overflow={os.getenv('DB_MAX_OVERFLOW', '10')}"
+        )
+        asyncio.run(run(f"http://127.0.0.1:{args.port}", args.concurrency, args.duration))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
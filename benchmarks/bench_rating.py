@@ -0,0 +1,206 @@
+"""
+Бенчмарк движка рейтинга (backend/rating.py) на синтетическом сезоне.
+
+Сначала замеряется replay() в памяти, затем весь пересчёт так, как его делает
+python -m backend.rating: сезон записывается в пустую БД (игроки, чаты,
+турниры по чату и режиму, матчи с очками), и каждый прогон печатает время
+load_matches, replay и store с коммитом по отдельности. Первый прогон вставляет
+строки статистики, следующие обновляют уже существующие.
+
+Запуск из корня репозитория:
+    # SQLite во временном файле (по умолчанию)
+    python -m benchmarks.bench_rating --matches 1000000 --players 20000 --chats 200
+    # пустая БД Postgres
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_rating
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_rating.db')}"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from backend.db import Base, SessionLocal, engine  # noqa: E402
+from backend.models import (  # noqa: E402
+    Player,
+    PlayerModeStats,
+    ScoringTypeEnum,
+    TelegramChat,
+    Tournament,
+    TournamentMatch,
+)
+from backend.rating import MODE_CODES, MatchArrays, RatingParams, load_matches, replay, store  # noqa: E402
+
+TG_BASE = 50_000_000
+TG_CHAT_BASE = -1_000_000_000_000
+BATCH = 50_000
+
+
+def synthetic_season(n_matches: int, n_players: int, n_chats: int, seed: int) -> MatchArrays:
+    """Игроки распределены по чатам, матчи только внутри чата, исход зависит от скрытой силы."""
+    rng = np.random.default_rng(seed)
+    strength = rng.normal(0.0, 1.0, n_players + 1)
+    chat_of_player = rng.integers(0, n_chats, n_players + 1)
+
+    # для каждого чата — его игроки, чтобы пары были внутри чата
+    order = np.argsort(chat_of_player[1:], kind="stable") + 1
+    counts = np.bincount(chat_of_player[1:], minlength=n_chats)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    chat = rng.integers(0, n_chats, n_matches)
+    chat = chat[counts[chat] >= 2]
+    size = counts[chat]
+    i = rng.integers(0, size)
+    j = (i + rng.integers(1, size)) % size
+    p1 = order[starts[chat] + i]
+    p2 = order[starts[chat] + j]
+
+    win_p = 1.0 / (1.0 + np.exp(strength[p2] - strength[p1]))
+    roll = rng.random(len(chat))
+    score1 = np.where(roll < win_p * 0.95, 1.0, np.where(roll < win_p * 0.95 + 0.05, 0.5, 0.0))
+
+    # счёт по очкам, согласованный с исходом: победитель набирает 21, в ничьей поровну
+    loser = rng.integers(0, 20, len(chat))
+    points1 = np.where(score1 == 1.0, 21, loser).astype(np.int64)
+    points2 = np.where(score1 == 0.0, 21, loser).astype(np.int64)
+    no_sets = np.zeros(len(chat), dtype=np.int64)
+
+    return MatchArrays(
+        player1=p1.astype(np.int64),
+        player2=p2.astype(np.int64),
+        mode=rng.integers(0, len(MODE_CODES), len(chat)),
+        chat=chat.astype(np.int64),
+        score1=score1,
+        points1=points1,
+        points2=points2,
+        sets1=no_sets,
+        sets2=no_sets,
+    )
+
+
+def seed(matches: MatchArrays, n_players: int, n_chats: int) -> None:
+    """
+    Пишет сезон в пустую БД. Id игроков совпадают с номерами в MatchArrays,
+    чат i получает id i + 1, турнир — по одному на пару (чат, режим).
+    """
+    n_modes = len(MODE_CODES)
+    with engine.begin() as conn:
+        conn.execute(insert(Player), [
+            {"id": i, "tg_id": TG_BASE + i, "display_name": f"Player {i}", "current_rating": 1500.0}
+            for i in range(1, n_players + 1)
+        ])
+        conn.execute(insert(TelegramChat), [
+            {"id": c + 1, "tg_chat_id": TG_CHAT_BASE - c, "title": f"Chat {c}", "type": "supergroup"}
+            for c in range(n_chats)
+        ])
+        conn.execute(insert(Tournament), [
+            {
+                "id": c * n_modes + m + 1,
+                "name": f"Chat {c} {mode.value}",
+                "mode": mode,
+                "status": "finished",
+                "scoring_type": ScoringTypeEnum.POINTS,
+                "points_limit": 21,
+                "chat_id": c + 1,
+            }
+            for c in range(n_chats)
+            for m, mode in enumerate(MODE_CODES)
+        ])
+        tournament = (matches.chat * n_modes + matches.mode + 1).tolist()
+        p1, p2 = matches.player1.tolist(), matches.player2.tolist()
+        pts1, pts2 = matches.points1.tolist(), matches.points2.tolist()
+        for start in range(0, len(p1), BATCH):
+            conn.execute(insert(TournamentMatch), [
+                {
+                    "id": i + 1,
+                    "tournament_id": tournament[i],
+                    "player1_id": p1[i],
+                    "player2_id": p2[i],
+                    "score_type": ScoringTypeEnum.POINTS,
+                    "points1": pts1[i],
+                    "points2": pts2[i],
+                }
+                for i in range(start, min(start + BATCH, len(p1)))
+            ])
+
+
+def end_to_end(params: RatingParams) -> tuple[dict[str, float], int]:
+    """Один пересчёт как в python -m backend.rating: время фаз и число матчей."""
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        matches = load_matches(db)
+        loaded = time.perf_counter()
+        result = replay(matches, params)
+        replayed = time.perf_counter()
+        store(db, result)
+        db.commit()
+        stored = time.perf_counter()
+    finally:
+        db.close()
+    return {"load": loaded - started, "replay": replayed - loaded, "store": stored - replayed}, len(matches.player1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк пересчёта рейтинга")
+    parser.add_argument("--matches", type=int, default=1_000_000)
+    parser.add_argument("--players", type=int, default=20_000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    matches = synthetic_season(args.matches, args.players, args.chats, args.seed)
+    print(f"generated {len(matches.player1)} matches in {time.perf_counter() - started:.2f}s")
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = replay(matches, RatingParams())
+        timings.append(time.perf_counter() - started)
+
+    print(
+        f"replay: best={min(timings):.2f}s median={sorted(timings)[len(timings) // 2]:.2f}s "
+        f"slots={len(result.slot_player)} players={len(result.player_ids)} "
+        f"generations={result.generations}"
+    )
+    print(
+        f"rating range: {result.player_rating.min():.0f}..{result.player_rating.max():.0f}, "
+        f"matches/s={len(matches.player1) / min(timings):,.0f}"
+    )
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        if db.scalar(select(func.count()).select_from(TournamentMatch)):
+            print(f"{engine.url.render_as_string()}: в БД уже есть матчи, нужна пустая БД")
+            return 1
+    started = time.perf_counter()
+    seed(matches, args.players, args.chats)
+    print(f"seeded {engine.url.drivername} in {time.perf_counter() - started:.2f}s")
+
+    for run in range(1, args.repeat + 1):
+        phases, n_loaded = end_to_end(RatingParams())
+        print(
+            f"run {run}: load={phases['load']:.2f}s replay={phases['replay']:.2f}s "
+            f"store={phases['store']:.2f}s total={sum(phases.values()):.2f}s "
+            f"matches/s={n_loaded / sum(phases.values()):,.0f}"
+        )
+
+    with SessionLocal() as db:
+        rows = db.scalar(select(func.count()).select_from(PlayerModeStats))
+    if n_loaded != len(matches.player1) or rows != len(result.slot_player):
+        print(f"FAIL loaded {n_loaded}/{len(matches.player1)} matches, stored {rows}/{len(result.slot_player)} slots")
+        return 1
+    print(f"stored {rows} slots")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
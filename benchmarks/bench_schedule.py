@@ -0,0 +1,82 @@
+"""
+Бенчмарк генератора расписания Americano (backend/schedule.py): качество против времени.
+
+Для нескольких составов строит полное расписание с разным числом случайных
+стартов на раунд (--restarts) и печатает время и метрики качества:
+повторы партнёров и соперников, максимум встреч, разброс отдыхов.
+Строка "random" — случайные пары и корты без оптимизации (точка отсчёта).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_schedule
+    python -m benchmarks.bench_schedule --restarts 1,4,16,64 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import time
+
+# backend.db требует DATABASE_URL при импорте; генератору БД не нужна
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.models import GenderEnum, RatingModeEnum  # noqa: E402
+from backend.schedule import AmericanoScheduler, ScheduleParams, default_rounds  # noqa: E402
+
+SCENARIOS = {
+    # имя: (режим, игроков, кортов, мужчин — для AM_MIX)
+    "classic 32p/8c": (RatingModeEnum.AM_CLASSIC, 32, 8, None),
+    "classic 13p/3c": (RatingModeEnum.AM_CLASSIC, 13, 3, None),
+    "mix 24p/6c": (RatingModeEnum.AM_MIX, 24, 6, 12),
+    "mix 18p/4c": (RatingModeEnum.AM_MIX, 18, 4, 10),
+    "team 20p/4c": (RatingModeEnum.AM_TEAM, 20, 4, None),
+}
+
+
+def genders_for(n_players: int, men):
+    if men is None:
+        return None
+    return [GenderEnum.MALE] * men + [GenderEnum.FEMALE] * (n_players - men)
+
+
+def run(mode, n_players, courts, men, params: ScheduleParams) -> tuple[float, dict]:
+    players = list(range(1, n_players + 1))
+    genders = genders_for(n_players, men)
+    rounds = default_rounds(mode, n_players, genders)
+    started = time.perf_counter()
+    schedule = AmericanoScheduler(players, courts, mode=mode, genders=genders, params=params).build(rounds)
+    return time.perf_counter() - started, schedule.quality()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Качество и время генератора расписания Americano")
+    parser.add_argument("--restarts", default="1,2,4,8,16,32")
+    parser.add_argument("--repeat", type=int, default=3, help="Прогонов с разным seed на точку")
+    args = parser.parse_args()
+
+    variants = [("random", dict(partner_weight=0.0, opponent_weight=0.0, restarts=1))]
+    variants += [(f"restarts={r}", dict(restarts=int(r))) for r in args.restarts.split(",")]
+
+    for name, (mode, n_players, courts, men) in SCENARIOS.items():
+        rounds = default_rounds(mode, n_players, genders_for(n_players, men))
+        print(f"\n{name} ({mode.value}, {rounds} rounds)")
+        for label, kwargs in variants:
+            times, results = [], []
+            for seed in range(args.repeat):
+                elapsed, quality = run(mode, n_players, courts, men, ScheduleParams(seed=seed, **kwargs))
+                times.append(elapsed)
+                results.append(quality)
+
+            def mean(key: str) -> float:
+                return statistics.mean(r[key] for r in results)
+
+            print(
+                f"  {label:12} {statistics.median(times) * 1000:8.1f} ms  "
+                f"partner_repeats={mean('partner_repeats'):6.1f} max_partner={mean('max_partner_count'):4.1f}  "
+                f"opponent_repeats={mean('opponent_repeats'):6.1f} max_opponent={mean('max_opponent_count'):4.1f} "
+                f"opp_std={mean('opponent_count_std'):5.3f}  "
+                f"byes={min(r['byes_min'] for r in results)}..{max(r['byes_max'] for r in results)}  "
+                f"same_gender={mean('same_gender_pairs'):4.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
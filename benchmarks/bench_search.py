@@ -0,0 +1,101 @@
+"""
+Бенчмарк поиска игроков (/players/search) по индексу в памяти на 1M игроков.
+
+Генерирует детерминированные имена на кириллице и латинице, строит
+PlayerSearchIndex напрямую (без БД) и замеряет время запроса индекса для
+префиксов разной длины, с фильтром по участникам чата и после
+инкрементальных обновлений (регистрация, переименование). Цель — p99 < 5 ms.
+
+PostgreSQL-путь (триграммные индексы по player_search_key, миграция 004)
+проверяется планами в benchmarks.check_query_plans, включая короткие
+префиксы с пределом прочитанных строк (--search-rows).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_search --players 1000000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_search.db')}"
+
+import numpy as np  # noqa: E402
+
+from backend.search import PlayerSearchIndex, search_key  # noqa: E402
+
+FIRST_NAMES = (
+    "Александр", "Алексей", "Мария", "Анна", "Дмитрий", "Екатерина", "Сергей", "Юлия",
+    "Щукин", "Жанна", "Ксения", "Борис", "Alexander", "Maria", "Dmitry", "Kate",
+    "Sergey", "Julia", "Xenia", "Boris", "Ivan", "Olga", "Nikita", "Sasha",
+)
+LAST_NAMES = (
+    "Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Соколова", "Лебедев", "Хабибуллин",
+    "Ivanov", "Petrova", "Smirnov", "Kuznetsova", "Popov", "Sokolova", "Lebedev", "Khabibullin",
+)
+
+
+def generate(n_players: int, seed: int = 1):
+    rnd = random.Random(seed)
+    for player_id in range(1, n_players + 1):
+        name = f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+        if player_id % 4 == 0:
+            name += f" {player_id % 997}"
+        username = f"{search_key(name).replace(' ', '_')}{player_id}" if player_id % 3 else None
+        yield player_id, 100_000_000 + player_id, username, name, 1000.0 + rnd.random() * 1000
+
+
+def measure(index: PlayerSearchIndex, queries: list[str], members=None) -> dict:
+    timings = []
+    found = 0
+    for query in queries:
+        started = time.perf_counter()
+        found += len(index.search(search_key(query), 20, members))
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings) * 1000,
+        "p99": timings[int(len(timings) * 0.99) - 1] * 1000,
+        "max": timings[-1] * 1000,
+        "avg_found": found / len(queries),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Поиск игроков по индексу в памяти")
+    parser.add_argument("--players", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=5000, help="обновлений после построения")
+    args = parser.parse_args()
+
+    rnd = random.Random(2)
+    index = PlayerSearchIndex()
+    started = time.perf_counter()
+    index.build(generate(args.players))
+    print(f"build: {args.players} players, {index.stats()['entries']} keys in {time.perf_counter() - started:.1f}s")
+
+    words = [w for w in FIRST_NAMES + LAST_NAMES]
+    cases = {
+        "prefix 1-2": [rnd.choice(words)[: rnd.randint(1, 2)] for _ in range(args.queries)],
+        "prefix 3-5": [rnd.choice(words)[: rnd.randint(3, 5)] for _ in range(args.queries)],
+        "full name": [f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)[:3]}" for _ in range(args.queries)],
+        "tg_id": [str(100_000_000 + rnd.randint(1, args.players))[: rnd.randint(4, 9)] for _ in range(args.queries)],
+    }
+    members = np.array(sorted(rnd.sample(range(1, args.players + 1), 300)), dtype=np.int32)
+
+    for name, queries in cases.items():
+        print(f"{name:12} " + "  ".join(f"{k}={v:.2f}" for k, v in measure(index, queries).items()))
+    print(f"{'chat 300':12} " + "  ".join(f"{k}={v:.2f}" for k, v in measure(index, cases['prefix 3-5'], members).items()))
+
+    index.upsert(
+        (player_id, 200_000_000 + player_id, None, f"{rnd.choice(FIRST_NAMES)} Обновлённый")
+        for player_id in rnd.sample(range(1, args.players + 1), args.updates)
+    )
+    print(f"{'+' + str(args.updates) + ' upd':12} " + "  ".join(f"{k}={v:.2f}" for k, v in measure(index, cases['prefix 3-5']).items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Микробенчмарк сериализации таблицы рейтинга (GET /rating/{mode}) на 10k строк.
+
+Сравнивает три пути построения JSON из одной и той же БД:
+- orm+response_model — исходный: ORM-сущности Player и PlayerModeStats,
+  копирование в PlayerRatingRow и повторная валидация списка по
+  response_model, как это делает FastAPI, затем json.dumps;
+- orm+adapter — те же сущности и PlayerRatingRow, но сразу dump_json;
+- columns+encoder — текущий: выборка только нужных колонок кортежами и
+  RowEncoder (TypeAdapter над TypedDict) прямо в bytes.
+
+Проверяет, что все пути дают одинаковый JSON, и печатает время на запрос.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_serialization --rows 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')}"
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from typing import List  # noqa: E402
+
+from backend.db import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from backend.main import PlayerRatingRow, _build_rating_table  # noqa: E402
+from backend.models import GenderEnum, Player, PlayerModeStats, RatingModeEnum  # noqa: E402
+
+MODE = RatingModeEnum.AM_CLASSIC
+response_adapter = TypeAdapter(List[PlayerRatingRow])
+
+
+def seed(n_rows: int) -> None:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        if db.query(Player.id).first() is not None:
+            return
+        genders = [GenderEnum.MALE, GenderEnum.FEMALE, None]
+        db.bulk_insert_mappings(
+            Player,
+            [
+                {
+                    "id": i + 1,
+                    "tg_id": 30_000_000 + i,
+                    "username": f"user{i:06x}",
+                    "display_name": f"Игрок {i:06x}",
+                    "gender": genders[i % 3],
+                    "current_rating": 1200.0 + (i * 7919) % 800,
+                    "rating_letter": "CDE"[i % 3],
+                }
+                for i in range(n_rows)
+            ],
+        )
+        db.bulk_insert_mappings(
+            PlayerModeStats,
+            [
+                {
+                    "player_id": i + 1,
+                    "mode": MODE,
+                    "chat_id": None,
+                    "games_played": i % 50,
+                    "wins_games": i % 20,
+                    "draws_games": i % 3,
+                    "losses_games": i % 17,
+                    "wins_sets": i % 30,
+                    "losses_sets": i % 25,
+                    "points_scored": i % 500,
+                    "points_conceded": i % 450,
+                    "delta_points": i % 500 - i % 450,
+                    "delta_sets": i % 30 - i % 25,
+                }
+                for i in range(n_rows)
+            ],
+        )
+        db.commit()
+
+
+def _orm_query():
+    return (
+        select(Player, PlayerModeStats)
+        .join(PlayerModeStats, PlayerModeStats.player_id == Player.id)
+        .where(PlayerModeStats.mode == MODE)
+        .order_by(Player.current_rating.desc(), PlayerModeStats.delta_points.desc())
+    )
+
+
+def _orm_rows(pairs) -> list[PlayerRatingRow]:
+    return [
+        PlayerRatingRow(
+            player_id=player.id,
+            display_name=player.display_name,
+            username=player.username,
+            gender=player.gender,
+            current_rating=player.current_rating,
+            rating_letter=player.rating_letter,
+            games_played=stats.games_played,
+            wins_games=stats.wins_games,
+            draws_games=stats.draws_games,
+            losses_games=stats.losses_games,
+            wins_sets=stats.wins_sets,
+            losses_sets=stats.losses_sets,
+            points_scored=stats.points_scored,
+            points_conceded=stats.points_conceded,
+            delta_points=stats.delta_points,
+            delta_sets=stats.delta_sets,
+        )
+        for player, stats in pairs
+    ]
+
+
+async def orm_response_model() -> bytes:
+    async with AsyncSessionLocal() as db:
+        rows = _orm_rows((await db.execute(_orm_query())).all())
+    # FastAPI: валидация по response_model, dump в python-json и json.dumps (JSONResponse)
+    validated = response_adapter.validate_python(rows, from_attributes=True)
+    content = response_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+async def orm_adapter() -> bytes:
+    async with AsyncSessionLocal() as db:
+        rows = _orm_rows((await db.execute(_orm_query())).all())
+    return response_adapter.dump_json(rows)
+
+
+async def columns_encoder() -> bytes:
+    async with AsyncSessionLocal() as db:
+        return await _build_rating_table(db, MODE, None)
+
+
+PATHS = {
+    "orm+response_model": orm_response_model,
+    "orm+adapter": orm_adapter,
+    "columns+encoder": columns_encoder,
+}
+
+
+async def run(repeat: int) -> None:
+    reference = None
+    results = {}
+    for name, build in PATHS.items():
+        body = await build()  # прогрев
+        parsed = json.loads(body)
+        if reference is None:
+            reference = parsed
+        elif parsed != reference:
+            raise SystemExit(f"{name}: JSON отличается от исходного пути")
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await build()
+            timings.append(time.perf_counter() - started)
+        results[name] = (statistics.median(timings), min(timings), len(body))
+
+    base = results["orm+response_model"][0]
+    print(f"rows={len(reference)} repeat={repeat}")
+    for name, (median, best, size) in results.items():
+        print(f"{name:20} median={median * 1000:8.1f}ms  best={best * 1000:8.1f}ms  x{base / median:4.1f}  {size} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сериализация таблицы рейтинга: ORM против колонок")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    seed(args.rows)
+    asyncio.run(run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Нагрузочная проверка потоков турнира (GET /tournaments/{id}/stream).
+
+Поднимает backend в uvicorn в этом же процессе, открывает N SSE-подписчиков
+и несколько «медленных» (читают поток с паузами), затем отправляет раунды
+через POST /tournaments/{id}/rounds. Печатает задержку доставки событий
+(от отправки раунда до получения match-события подписчиком), число
+полученных событий и resync медленных подписчиков.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_stream --subscribers 500 --rounds 50
+    # маленькая очередь, чтобы увидеть resync медленных клиентов
+    STREAM_QUEUE_SIZE=8 python -m benchmarks.bench_stream --slow 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_stream.db')}"
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from backend.db import Base, SessionLocal, engine  # noqa: E402
+from backend.events import tournament_events  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.models import (  # noqa: E402
+    Player,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    Tournament,
+    TournamentPlayer,
+)
+
+TG_ID = 20_000_000
+
+
+def seed(n_players: int) -> tuple[int, list[int]]:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        players = [
+            Player(tg_id=TG_ID + i, display_name=f"Player {i}", current_rating=1200.0 + (i * 7919) % 800)
+            for i in range(n_players)
+        ]
+        db.add_all(players)
+        tournament = Tournament(
+            name="stream bench",
+            mode=RatingModeEnum.MX_CLASSIC,
+            scoring_type=ScoringTypeEnum.POINTS,
+            points_limit=21,
+        )
+        db.add(tournament)
+        db.flush()
+        db.add_all(TournamentPlayer(tournament_id=tournament.id, player_id=p.id) for p in players)
+        db.commit()
+        return tournament.id, [p.id for p in players]
+
+
+async def subscribe(
+    client: httpx.AsyncClient,
+    url: str,
+    sent_at: dict[int, float],
+    latencies: list[float],
+    counts: dict,
+    ready: asyncio.Event,
+    done: asyncio.Event,
+    pause: float = 0.0,
+) -> None:
+    async with client.stream("GET", url, headers={"X-User-Tg-Id": str(TG_ID)}) as resp:
+        event = None
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                counts[event] = counts.get(event, 0) + 1
+                if event == "snapshot" and not ready.is_set():
+                    ready.set()
+                elif event == "match" and not pause:
+                    round_number = json.loads(line[6:])["round_number"]
+                    latencies.append(time.perf_counter() - sent_at[round_number])
+                if pause:
+                    await asyncio.sleep(pause)
+            if done.is_set():
+                return
+
+
+async def run(base_url: str, tournament_id: int, player_ids: list[int], args) -> None:
+    limits = httpx.Limits(max_connections=args.subscribers + args.slow + 10)
+    timeout = httpx.Timeout(60.0)
+    url = f"/tournaments/{tournament_id}/stream"
+    sent_at: dict[int, float] = {}
+    latencies: list[float] = []
+    counts: dict = {}
+    slow_counts: dict = {}
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        readies = [asyncio.Event() for _ in range(args.subscribers + args.slow)]
+        tasks = [
+            asyncio.create_task(subscribe(client, url, sent_at, latencies, counts, readies[i], done))
+            for i in range(args.subscribers)
+        ] + [
+            asyncio.create_task(
+                subscribe(client, url, sent_at, [], slow_counts, readies[args.subscribers + i], done, pause=args.pause)
+            )
+            for i in range(args.slow)
+        ]
+        await asyncio.wait_for(asyncio.gather(*(r.wait() for r in readies)), timeout=60)
+
+        courts = len(player_ids) // 2
+        started = time.perf_counter()
+        for round_number in range(1, args.rounds + 1):
+            shift = round_number % len(player_ids)
+            order = player_ids[shift:] + player_ids[:shift]
+            payload = {
+                "round_number": round_number,
+                "matches": [
+                    {
+                        "court_number": c + 1,
+                        "player1_id": order[2 * c],
+                        "player2_id": order[2 * c + 1],
+                        "points1": (round_number * 7 + c) % 22,
+                        "points2": 21,
+                    }
+                    for c in range(courts)
+                ],
+            }
+            sent_at[round_number] = time.perf_counter()
+            resp = await client.post(
+                f"/tournaments/{tournament_id}/rounds", json=payload, headers={"X-User-Tg-Id": str(TG_ID)}
+            )
+            resp.raise_for_status()
+        elapsed = time.perf_counter() - started
+
+        expected = args.subscribers * args.rounds * courts
+        deadline = time.perf_counter() + 10
+        while counts.get("match", 0) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        stats = tournament_events.stats()
+        done.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    print(
+        f"subscribers={args.subscribers} slow={args.slow} rounds={args.rounds} courts={courts} "
+        f"queue={tournament_events.queue_size}"
+    )
+    print(f"rounds posted in {elapsed:.2f}s ({args.rounds / elapsed:.1f} rounds/s)")
+    print(f"match events delivered: {counts.get('match', 0)}/{expected}, standings diffs: {counts.get('standings', 0)}")
+    print(f"delivery latency p50={q[49] * 1000:.1f}ms p95={q[94] * 1000:.1f}ms p99={q[98] * 1000:.1f}ms")
+    print(f"slow subscribers: events={slow_counts} hub={stats}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузка на SSE-потоки турнира")
+    parser.add_argument("--players", type=int, default=16)
+    parser.add_argument("--subscribers", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=2, help="Подписчиков, читающих поток с паузами")
+    parser.add_argument("--pause", type=float, default=0.5, help="Пауза медленного подписчика на событие, с")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    tournament_id, player_ids = seed(args.players)
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        asyncio.run(run(f"http://127.0.0.1:{args.port}", tournament_id, player_ids, args))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Регрессионная проверка: число SQL-запросов в GET /chats и GET /chats/{id}
+не зависит от того, во скольких чатах состоит пользователь.
+
+Запуск из корня репозитория (нужна только SQLite):
+    python -m benchmarks.check_chat_queries
+Проверяются обе схемы аутентификации: заголовок X-User-Tg-Id и сессионный
+токен (подписывается тестовым SESSION_SECRET, BOT_TOKEN не нужен).
+Код выхода 1, если число запросов растёт с числом чатов или какую-то схему
+не удалось проверить.
+"""
+import os
+import sys
+import tempfile
+
+_db_file = os.path.join(tempfile.mkdtemp(), "check_chat_queries.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+# session.py читает секрет при импорте; без него путь с токеном не проверить
+os.environ.setdefault("SESSION_SECRET", "check-chat-queries")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from backend.db import Base, SessionLocal, async_engine, engine  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.models import ChatAdmin, ChatMember, Player, TelegramChat  # noqa: E402
+from backend.session import SESSION_SECRET, issue_token  # noqa: E402
+from backend.auth import get_player_roles  # noqa: E402
+
+statements = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count(*args):
+    global statements
+    statements += 1
+
+
+def seed_user(tg_id: int, n_chats: int) -> int:
+    """Игрок, состоящий в n_chats чатах; в каждом третьем — админ."""
+    db = SessionLocal()
+    player = Player(tg_id=tg_id, display_name=f"User {tg_id}")
+    db.add(player)
+    db.flush()
+    for i in range(n_chats):
+        chat = TelegramChat(tg_chat_id=tg_id * 1000 + i, title=f"Chat {tg_id}-{i}", type="supergroup")
+        db.add(chat)
+        db.flush()
+        db.add(ChatMember(chat_id=chat.id, player_id=player.id, status="active"))
+        if i % 3 == 0:
+            db.add(ChatAdmin(chat_id=chat.id, admin_player_id=player.id, role="admin"))
+    db.commit()
+    player_id = player.id
+    db.close()
+    return player_id
+
+
+def count(client: TestClient, url: str, headers: dict) -> int:
+    global statements
+    statements = 0
+    resp = client.get(url, headers=headers)
+    resp.raise_for_status()
+    return statements
+
+
+AUTH_MODES = ("header", "token")
+
+
+def main() -> int:
+    if SESSION_SECRET is None:
+        print("FAIL token  SESSION_SECRET не задан — путь с токеном не проверить")
+        return 1
+    Base.metadata.create_all(engine)
+    client = TestClient(app)
+
+    results = {}
+    for tg_id, n_chats in ((1, 1), (2, 200)):
+        player_id = seed_user(tg_id, n_chats)
+        db = SessionLocal()
+        roles = get_player_roles(player_id, db)
+        db.close()
+        first_chat = min(roles)
+
+        token, _ = issue_token(player_id, tg_id, roles)
+        auth_modes = {
+            "header": {"X-User-Tg-Id": str(tg_id)},
+            "token": {"Authorization": f"Bearer {token}"},
+        }
+
+        for mode, headers in auth_modes.items():
+            results[(mode, "/chats", n_chats)] = count(client, "/chats", headers)
+            results[(mode, "/chats?admin_only=true", n_chats)] = count(client, "/chats?admin_only=true", headers)
+            results[(mode, "/chats/{id}", n_chats)] = count(client, f"/chats/{first_chat}", headers)
+
+    failed = False
+    for mode in AUTH_MODES:
+        if not any(key[0] == mode for key in results):
+            failed = True
+            print(f"FAIL {mode:6} не проверено")
+    for (mode, url, n_chats), n in sorted(results.items()):
+        if n_chats != 200:
+            continue
+        baseline = results[(mode, url, 1)]
+        ok = n == baseline
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {mode:6} {url:24} 1 chat: {baseline} stmts, 200 chats: {n} stmts")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+Регрессионная проверка планов запросов: ни один запрос горячих эндпоинтов не
+должен читать большую таблицу последовательным сканированием.
+
+Заполняет БД синтетическими данными, вызывает эндпоинты через TestClient и для
+каждого выполненного ими SELECT тут же строит план на том же соединении:
+- PostgreSQL: EXPLAIN (ANALYZE, FORMAT JSON); нарушение — узел Seq Scan,
+  прочитавший (строки + отброшенные фильтром) × loops больше --threshold строк;
+- SQLite: EXPLAIN QUERY PLAN; нарушение — SCAN таблицы без индекса, если
+  в таблице больше --threshold строк.
+
+Эндпоинты, которые по смыслу отдают таблицу целиком (выгрузка GET /players
+в NDJSON, общий рейтинг), перечисляют такие таблицы в allow_scan.
+
+Поиск с коротким префиксом («u», «p», «pl» — совпадает почти каждый игрок) в
+PostgreSQL проверяется строже (max_rows): ни один узел плана, в том числе
+индексный, не должен читать больше --search-rows строк — иначе запрос
+перебирает все совпадения ради первых 20. В SQLite поиск идёт по индексу
+в памяти, и эти пробы SQL не выполняют.
+
+Запуск из корня репозитория:
+    # SQLite во временном файле
+    python -m benchmarks.check_query_plans
+    # PostgreSQL: пустая БД, таблицы и индексы (включая pg_trgm) создаёт сам скрипт
+    DATABASE_URL=postgresql://... python -m benchmarks.check_query_plans --players 50000
+Код выхода 1, если найдено хоть одно нарушение.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'check_query_plans.db')}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert, text  # noqa: E402
+
+from backend.db import Base, SessionLocal, async_engine, engine  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.pagination import encode_cursor  # noqa: E402
+from backend.search import player_search_index, uses_sql_search  # noqa: E402
+from benchmarks.seed_data import create_schema  # noqa: E402
+from backend.models import (  # noqa: E402
+    ChatAdmin,
+    ChatMember,
+    GenderEnum,
+    Player,
+    PlayerModeStats,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    TelegramChat,
+    Tournament,
+    TournamentMatch,
+    TournamentPlayer,
+)
+
+IS_POSTGRES = engine.dialect.name == "postgresql"
+TG_BASE = 40_000_000
+STAT_COLUMNS = (
+    "games_played", "wins_games", "draws_games", "losses_games", "wins_sets",
+    "losses_sets", "points_scored", "points_conceded", "delta_points", "delta_sets",
+)
+
+
+@dataclass
+class Probe:
+    name: str
+    method: str
+    url: str
+    json: Optional[dict] = None
+    allow_scan: frozenset = frozenset()
+    postgres_only: bool = False
+    # PostgreSQL: предел строк, прочитанных любым узлом плана; None — без предела
+    max_rows: Optional[int] = None
+    plans: list = field(default_factory=list)
+
+
+current: Optional[Probe] = None
+
+
+def _explain(conn, statement: str, parameters):
+    cursor = conn.connection.cursor()
+    try:
+        if IS_POSTGRES:
+            cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if current is None or executemany:
+        return
+    head = statement.lstrip()[:6].upper()
+    if head not in ("SELECT", "WITH"):
+        return
+    current.plans.append((statement, _explain(conn, statement, parameters)))
+
+
+def _pg_violations(node: dict, threshold: int, allow: frozenset) -> list[str]:
+    found = []
+    if node.get("Node Type") == "Seq Scan":
+        loops = node.get("Actual Loops", 1) or 1
+        examined = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+        relation = node.get("Relation Name")
+        if examined > threshold and relation not in allow:
+            found.append(f"Seq Scan on {relation}: {examined} rows")
+    for child in node.get("Plans", ()):
+        found += _pg_violations(child, threshold, allow)
+    return found
+
+
+def _pg_rows_violations(node: dict, max_rows: int) -> list[str]:
+    found = []
+    loops = node.get("Actual Loops", 1) or 1
+    examined = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+    if examined > max_rows:
+        target = node.get("Index Name") or node.get("Relation Name") or ""
+        found.append(f"{node.get('Node Type')} {target}".rstrip() + f": {examined} rows > {max_rows}")
+    for child in node.get("Plans", ()):
+        found += _pg_rows_violations(child, max_rows)
+    return found
+
+
+def _sqlite_violations(statement: str, details: list[str], threshold: int, allow: frozenset, sizes: dict) -> list[str]:
+    # SQLite называет в плане псевдонимы таблиц; подзапросы (anon_1 и т.п.) — не таблицы
+    aliases = {alias: table for table, alias in re.findall(r"\b(\w+) AS (\w+)\b", statement) if table in sizes}
+    found = []
+    for detail in details:
+        if not detail.startswith("SCAN ") or " USING " in detail or "CONSTANT ROW" in detail:
+            continue
+        name = detail.split()[1]
+        table = aliases.get(name, name)
+        if table not in sizes or table in allow:
+            continue
+        if sizes[table] > threshold:
+            found.append(f"{detail} ({sizes[table]} rows)")
+    return found
+
+
+def seed(n_players: int, n_chats: int, n_tournaments: int, matches_per_tournament: int) -> dict:
+    """Синтетические данные; возвращает идентификаторы для запросов."""
+    create_schema()
+    modes = list(RatingModeEnum)
+    genders = [GenderEnum.MALE, GenderEnum.FEMALE]
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Player),
+            [
+                {
+                    "id": i + 1,
+                    "tg_id": TG_BASE + i,
+                    "username": f"user{i:06x}",
+                    "display_name": f"Player {i:06x}",
+                    "gender": genders[i % 2],
+                    "current_rating": 1200.0 + (i * 7919) % 800,
+                }
+                for i in range(n_players)
+            ],
+        )
+        conn.execute(
+            insert(TelegramChat),
+            [{"id": c + 1, "tg_chat_id": -1000 - c, "title": f"Chat {c}", "type": "supergroup"} for c in range(n_chats)],
+        )
+        # каждый игрок — участник двух чатов, первые игроки чата — админы
+        members = {}
+        for i in range(n_players):
+            for chat_id in (i % n_chats + 1, (i * 7) % n_chats + 1):
+                members[(chat_id, i + 1)] = {"chat_id": chat_id, "player_id": i + 1, "status": "active" if i % 10 else "left"}
+        conn.execute(insert(ChatMember), list(members.values()))
+        conn.execute(
+            insert(ChatAdmin),
+            [{"chat_id": c + 1, "admin_player_id": c + 1, "role": "admin"} for c in range(n_chats)],
+        )
+        conn.execute(
+            insert(PlayerModeStats),
+            [
+                {
+                    "player_id": player_id,
+                    "mode": modes[(player_id + k) % len(modes)],
+                    "chat_id": chat_id,
+                    **{name: (player_id * (k + 3)) % 40 for name in STAT_COLUMNS},
+                }
+                for (chat_id, player_id) in members
+                for k in range(2)
+            ]
+            + [
+                {"player_id": i + 1, "mode": modes[i % len(modes)], "chat_id": None, **{name: i % 40 for name in STAT_COLUMNS}}
+                for i in range(n_players)
+            ],
+        )
+
+        players_per_tournament = 16
+        tournament_rows, participant_rows, match_rows = [], [], []
+        for t in range(n_tournaments):
+            chat_id = t % n_chats + 1
+            tournament_rows.append({
+                "id": t + 1,
+                "name": f"Tournament {t}",
+                "mode": RatingModeEnum.MX_CLASSIC,
+                "scoring_type": ScoringTypeEnum.POINTS,
+                "points_limit": 21,
+                "chat_id": chat_id,
+            })
+            roster = [(chat_id - 1 + n_chats * k) % n_players + 1 for k in range(players_per_tournament)]
+            participant_rows += [{"tournament_id": t + 1, "player_id": p} for p in roster]
+            for m in range(matches_per_tournament):
+                round_number, court = divmod(m, players_per_tournament // 2)
+                match_rows.append({
+                    "tournament_id": t + 1,
+                    "round_number": round_number + 1,
+                    "court_number": court + 1,
+                    "player1_id": roster[(2 * court + round_number) % players_per_tournament],
+                    "player2_id": roster[(2 * court + 1 + round_number) % players_per_tournament],
+                    "score_type": ScoringTypeEnum.POINTS,
+                    "points1": 21,
+                    "points2": (m * 7) % 21,
+                })
+        conn.execute(insert(Tournament), tournament_rows)
+        conn.execute(insert(TournamentPlayer), participant_rows)
+        conn.execute(insert(TournamentMatch), match_rows)
+
+    with engine.begin() as conn:
+        if IS_POSTGRES:
+            # последовательности после вставки с явными id
+            for table in ("players", "tg_chats", "tournaments"):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"))
+        conn.execute(text("ANALYZE"))
+        sizes = {
+            table.name: conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+            for table in Base.metadata.sorted_tables
+        }
+
+    # игрок 1: админ чата 1 и участник турнира 1
+    return {"sizes": sizes, "tournament_id": 1, "chat_id": 1, "tg_id": TG_BASE}
+
+
+def probes(ids: dict, search_rows: int) -> list[Probe]:
+    chat_id, tournament_id, tg_id = ids["chat_id"], ids["tournament_id"], ids["tg_id"]
+    mode = RatingModeEnum.AM_CLASSIC.value
+    return [
+        Probe("players", "GET", "/players"),
+        Probe("players page", "GET", f"/players?limit=50&cursor={encode_cursor(1500.0, 100)}"),
+        Probe("players chat", "GET", f"/players?chat_id={chat_id}"),
+        Probe("players ndjson", "GET", "/players?format=ndjson", allow_scan=frozenset({"players"})),
+        Probe("players/search", "GET", "/players/search?q=player 000a"),
+        # username user…, имя Player …: префикс совпадает у всех игроков
+        Probe("players/search short", "GET", "/players/search?q=u", max_rows=search_rows),
+        Probe("players/search short name", "GET", "/players/search?q=p", max_rows=search_rows),
+        Probe("players/search 2 chars", "GET", "/players/search?q=pl", max_rows=search_rows),
+        Probe("players/search short chat", "GET", f"/players/search?q=u&chat_id={chat_id}", max_rows=search_rows),
+        Probe("players/search chat", "GET", f"/players/search?q=user0&chat_id={chat_id}"),
+        Probe("players/by_tg", "GET", f"/players/by_tg/{tg_id + 5}"),
+        Probe("rating", "GET", f"/rating/{mode}", allow_scan=frozenset({"players", "player_mode_stats"})),
+        Probe("rating chat", "GET", f"/rating/{mode}?chat_id={chat_id}"),
+        Probe("chats", "GET", "/chats"),
+        Probe("chats/{id}", "GET", f"/chats/{chat_id}"),
+        Probe("standings", "GET", f"/tournaments/{tournament_id}/standings"),
+        Probe("next-round", "GET", f"/tournaments/{tournament_id}/next-round"),
+        Probe(
+            "matches",
+            "POST",
+            "/matches",
+            json={
+                "tournament_id": tournament_id,
+                "player1_id": 1,
+                "player2_id": 2,
+                "score_type": "points",
+                "points1": 21,
+                "points2": 15,
+            },
+        ),
+        Probe(
+            "bot sync",
+            "POST",
+            "/bot/chats/members/sync",
+            json={
+                "tg_chat_id": -1000 - (chat_id - 1),
+                "members": [
+                    {"tg_id": tg_id + k, "display_name": f"Player {k:06x}", "is_admin": k == 0} for k in range(50)
+                ],
+            },
+        ),
+        Probe(
+            "bot batch",
+            "POST",
+            "/bot/chats/members/batch",
+            json={
+                "updates": [
+                    {"tg_chat_id": -1000 - (chat_id - 1), "tg_user_id": tg_id + k, "status": "left" if k % 2 else "active"}
+                    for k in range(50)
+                ]
+            },
+        ),
+    ]
+
+
+def main() -> int:
+    global current
+    parser = argparse.ArgumentParser(description="Проверка планов запросов горячих эндпоинтов")
+    parser.add_argument("--players", type=int, default=20_000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--tournaments", type=int, default=500)
+    parser.add_argument("--matches", type=int, default=40, help="Матчей на турнир")
+    parser.add_argument("--threshold", type=int, default=1000, help="Сколько строк можно читать Seq Scan")
+    parser.add_argument(
+        "--search-rows", type=int, default=2000,
+        help="PostgreSQL: сколько строк может прочитать узел плана поиска с коротким префиксом",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Печатать планы всех запросов")
+    args = parser.parse_args()
+
+    ids = seed(args.players, args.chats, args.tournaments, args.matches)
+    sizes = ids["sizes"]
+    print(f"{engine.dialect.name}: " + ", ".join(f"{name}={n}" for name, n in sizes.items()))
+
+    if not uses_sql_search(SessionLocal()):
+        # индекс поиска в памяти строится в фоне при первом запросе; для проверки — заранее
+        player_search_index.refresh_from(SessionLocal)
+
+    client = TestClient(app)
+    headers = {"X-User-Tg-Id": str(ids["tg_id"])}
+    failed = False
+    for probe in probes(ids, args.search_rows):
+        if probe.postgres_only and not IS_POSTGRES:
+            print(f"SKIP {probe.name:26} (индекс только для PostgreSQL)")
+            continue
+        current = probe
+        try:
+            resp = client.request(probe.method, probe.url, json=probe.json, headers=headers)
+        finally:
+            current = None
+        if resp.status_code >= 400:
+            failed = True
+            print(f"FAIL {probe.name:26} HTTP {resp.status_code}: {resp.text[:200]}")
+            continue
+
+        violations = []
+        for statement, plan in probe.plans:
+            if IS_POSTGRES:
+                found = _pg_violations(plan[0]["Plan"], args.threshold, probe.allow_scan)
+                if probe.max_rows is not None:
+                    found += _pg_rows_violations(plan[0]["Plan"], probe.max_rows)
+            else:
+                found = _sqlite_violations(statement, plan, args.threshold, probe.allow_scan, sizes)
+            violations += [(statement, v) for v in found]
+            if args.verbose:
+                print(f"  {' '.join(statement.split())[:160]}")
+                print(f"    {plan if not IS_POSTGRES else json.dumps(plan[0]['Plan'])[:400]}")
+
+        failed |= bool(violations)
+        print(f"{'FAIL' if violations else 'OK  '} {probe.name:26} {len(probe.plans)} SELECT")
+        for statement, violation in violations:
+            print(f"     {violation}\n       {' '.join(statement.split())[:200]}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Проверка живых турнирных таблиц (backend/standings.py): таблица, вытесненная
+из памяти (LRU, STANDINGS_CACHE_SIZE), при следующем запросе строится из БД
+заново и совпадает с таблицей, которая всё время жила в памяти и получала
+матчи через push; закреплённая таблица (открытый поток событий) не вытесняется.
+
+Запуск из корня репозитория (нужна только SQLite):
+    python -m benchmarks.check_standings
+Код выхода 1 при расхождении.
+"""
+import os
+import random
+import sys
+import tempfile
+
+_db_file = os.path.join(tempfile.mkdtemp(), "check_standings.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+
+from backend.db import Base, SessionLocal, engine  # noqa: E402
+from backend.models import (  # noqa: E402
+    Player,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    Tournament,
+    TournamentMatch,
+    TournamentPlayer,
+)
+from backend.standings import LiveStandings  # noqa: E402
+
+MODES = (RatingModeEnum.MX_CLASSIC, RatingModeEnum.KING, RatingModeEnum.MX_TEAM)
+
+
+def seed(db, n_players: int) -> list[Tournament]:
+    players = [Player(tg_id=i, display_name=f"Player {i}", current_rating=1400 + i) for i in range(1, n_players + 1)]
+    db.add_all(players)
+    db.flush()
+    tournaments = []
+    for mode in MODES:
+        tournament = Tournament(name=mode.value, mode=mode, scoring_type=ScoringTypeEnum.POINTS)
+        db.add(tournament)
+        db.flush()
+        db.add_all(TournamentPlayer(tournament_id=tournament.id, player_id=p.id) for p in players)
+        tournaments.append(tournament)
+    db.commit()
+    return tournaments
+
+
+def play_round(db, rng: random.Random, tournament: Tournament, round_number: int, n_players: int) -> list:
+    ids = list(range(1, n_players + 1))
+    rng.shuffle(ids)
+    matches = [
+        TournamentMatch(
+            tournament_id=tournament.id,
+            round_number=round_number,
+            court_number=court + 1,
+            player1_id=ids[2 * court],
+            player2_id=ids[2 * court + 1],
+            score_type=ScoringTypeEnum.POINTS,
+            points1=rng.randint(0, 21),
+            points2=rng.randint(0, 21),
+        )
+        for court in range(n_players // 2)
+    ]
+    db.add_all(matches)
+    db.commit()
+    return matches
+
+
+def snapshot(live: LiveStandings, db, tournament: Tournament) -> tuple:
+    standings = live.get(db, tournament)
+    with standings.lock:
+        return standings.table(), standings.next_round()
+
+
+def main() -> int:
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    n_players = 10
+    db = SessionLocal()
+    tournaments = seed(db, n_players)
+
+    resident = LiveStandings(max_tables=len(tournaments))  # ничего не вытесняет
+    bounded = LiveStandings(max_tables=1)                  # каждый запрос другого турнира вытесняет
+    for tournament in tournaments:
+        resident.get(db, tournament)
+
+    failures = 0
+    for round_number in range(1, 6):
+        for tournament in tournaments:
+            matches = play_round(db, rng, tournament, round_number, n_players)
+            resident.push(tournament.id, matches)
+            bounded.push(tournament.id, matches)
+            bounded.get(db, tournament)
+        for tournament in tournaments:
+            expected = snapshot(resident, db, tournament)
+            actual = snapshot(bounded, db, tournament)
+            ok = actual == expected
+            failures += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} round {round_number} {tournament.mode.value:<18} rebuilt after eviction")
+
+    pinned_id = tournaments[0].id
+    bounded.pinned = lambda tournament_id: tournament_id == pinned_id
+    pinned = bounded.get(db, tournaments[0])
+    for tournament in tournaments[1:]:
+        bounded.get(db, tournament)
+    ok = bounded.loaded(pinned_id) is pinned
+    failures += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} pinned table kept: {bounded.stats()}")
+
+    ok = resident.stats()["evictions"] == 0 and bounded.stats()["tables"] <= 2
+    failures += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} bounded size: resident={resident.stats()} bounded={bounded.stats()}")
+    db.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
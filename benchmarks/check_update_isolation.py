@@ -0,0 +1,84 @@
+"""
+Проверка ChatOrderedUpdateProcessor (bot/update_processor.py): медленный чат
+не задерживает другие чаты, а апдейты одного чата идут строго по порядку.
+
+Апдейты подаются так же, как их подаёт Application в режиме параллельной
+обработки: задача process_update на каждый апдейт в порядке получения.
+Сначала в очередь встают --slow медленных апдейтов одного чата (каждый по
+--delay секунд, их больше, чем слотов параллельности), затем по одному
+быстрому апдейту из других чатов. Быстрые чаты должны закончиться сразу,
+не дожидаясь очереди медленного.
+
+Запуск из корня репозитория:
+    python -m benchmarks.check_update_isolation
+Код выхода 1, если быстрый чат ждал медленный или порядок внутри чата нарушен.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot"))
+
+from telegram import Chat, Message, Update  # noqa: E402
+
+from update_processor import ChatOrderedUpdateProcessor  # noqa: E402
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(chat_id, Chat.SUPERGROUP)
+    return Update(update_id, message=Message(update_id, datetime.now(timezone.utc), chat, text=str(update_id)))
+
+
+async def run(concurrency: int, slow: int, fast_chats: int, delay: float) -> dict:
+    processor = ChatOrderedUpdateProcessor(concurrency)
+    started = time.perf_counter()
+    finished: dict[int, float] = {}
+    order: dict[int, list[int]] = {}
+
+    async def handle(update: Update, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+        order.setdefault(update.effective_chat.id, []).append(update.update_id)
+        finished[update.update_id] = time.perf_counter() - started
+
+    updates = [(make_update(i, 1), delay) for i in range(slow)]
+    updates += [(make_update(slow + i, 2 + i), 0.0) for i in range(fast_chats)]
+    tasks = [asyncio.create_task(processor.process_update(u, handle(u, seconds))) for u, seconds in updates]
+    await asyncio.gather(*tasks)
+
+    fast_ids = [u.update_id for u, seconds in updates if seconds == 0.0]
+    return {
+        "fast_max": max(finished[i] for i in fast_ids),
+        "slow_total": max(finished[i] for i in range(slow)),
+        "in_order": all(ids == sorted(ids) for ids in order.values()),
+        "semaphore": processor._semaphore._value,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Медленный чат не задерживает другие")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--slow", type=int, default=8, help="Медленных апдейтов одного чата")
+    parser.add_argument("--fast-chats", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.25)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.concurrency, args.slow, args.fast_chats, args.delay))
+    # быстрым чатам нельзя ждать даже один медленный апдейт
+    checks = {
+        f"fast chats done in {result['fast_max']:.3f}s (< {args.delay / 2:.3f}s)": result["fast_max"] < args.delay / 2,
+        f"slow chat sequential: {result['slow_total']:.2f}s (>= {args.slow * args.delay:.2f}s)":
+            result["slow_total"] >= args.slow * args.delay * 0.95,
+        "order within chat kept": result["in_order"],
+        f"pending limit semaphore: {result['semaphore']} (> concurrency {args.concurrency})":
+            result["semaphore"] > args.concurrency,
+    }
+    for name, ok in checks.items():
+        print(f"{'OK  ' if ok else 'FAIL'} {name}")
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Сравнение двух результатов benchmarks.load_api (например, до и после изменения).
+
+Для каждого эндпоинта печатает p50/p95/p99, пропускную способность и SQL на
+запрос в обоих прогонах и изменение в процентах. Регрессия — рост p95 больше
+--threshold процентов (при достаточном числе запросов) или рост числа SQL на
+запрос больше чем на 10%; при регрессиях код выхода 1.
+
+Сравнивать имеет смысл прогоны с одинаковыми БД, --scale, --seed, --mix и
+--concurrency — различия в meta печатаются предупреждением.
+
+Запуск из корня репозитория:
+    python -m benchmarks.compare_load bench-results/load-<old>.json bench-results/load-<new>.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Optional
+
+# Допустимый относительный рост среднего числа SQL на запрос
+SQL_TOLERANCE = 0.1
+COMPARABLE_META = ("database", "scale", "seed", "mix", "concurrency", "duration", "in_process")
+
+
+def _change(old: Optional[float], new: Optional[float]) -> str:
+    if old is None or new is None:
+        return "-"
+    if old == 0:
+        return "=" if new == 0 else "new"
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def _pair(old: float, new: float) -> str:
+    return f"{old:.2f}>{new:.2f}"
+
+
+def compare(baseline: dict, candidate: dict, threshold: float, min_requests: int) -> list[str]:
+    """Печатает таблицу сравнения; возвращает описания регрессий."""
+    for key in COMPARABLE_META:
+        if baseline["meta"].get(key) != candidate["meta"].get(key):
+            print(f"ВНИМАНИЕ: {key} отличается: {baseline['meta'].get(key)} -> {candidate['meta'].get(key)}")
+    print(f"{baseline['meta']['revision']} -> {candidate['meta']['revision']}\n")
+    print(f"{'endpoint':36} {'p50 ms':>17} {'p95 ms':>17} {'Δp95':>6} {'p99 ms':>17} {'Δrps':>6} {'sql':>11}")
+
+    regressions = []
+    endpoints = sorted(set(baseline["endpoints"]) | set(candidate["endpoints"]))
+    for name in [*endpoints, None]:
+        old = baseline["endpoints"].get(name) if name else baseline["total"]
+        new = candidate["endpoints"].get(name) if name else candidate["total"]
+        label = name or "TOTAL"
+        if old is None or new is None:
+            print(f"{label:36} только в {'новом' if old is None else 'старом'} прогоне")
+            continue
+        p95_change = _change(old["p95_ms"], new["p95_ms"])
+        old_sql, new_sql = old.get("sql_per_request"), new.get("sql_per_request")
+        sql = "-" if old_sql is None or new_sql is None else f"{old_sql:g}>{new_sql:g}"
+        print(
+            f"{label:36} {_pair(old['p50_ms'], new['p50_ms']):>17} {_pair(old['p95_ms'], new['p95_ms']):>17}"
+            f" {p95_change:>6} {_pair(old['p99_ms'], new['p99_ms']):>17} {_change(old['rps'], new['rps']):>6} {sql:>11}"
+        )
+        if name is None:
+            continue
+        enough = min(old["requests"], new["requests"]) >= min_requests
+        if enough and old["p95_ms"] > 0 and (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > threshold:
+            regressions.append(f"{name}: p95 {old['p95_ms']:.2f} -> {new['p95_ms']:.2f} ms ({p95_change})")
+        # среднее SQL зависит от выборки запросов (кеши, первые обращения): малые колебания — не регрессия
+        if old_sql is not None and new_sql is not None and new_sql > old_sql * (1 + SQL_TOLERANCE) + 0.2:
+            regressions.append(f"{name}: SQL на запрос {old_sql} -> {new_sql}")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{name}: ошибок {old['errors']} -> {new['errors']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сравнение двух прогонов benchmarks.load_api")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=15.0, help="Допустимый рост p95, %%")
+    parser.add_argument("--min-requests", type=int, default=50, help="Меньше запросов — p95 не сравнивается")
+    args = parser.parse_args()
+
+    regressions = compare(
+        json.loads(args.baseline.read_text()),
+        json.loads(args.candidate.read_text()),
+        args.threshold,
+        args.min_requests,
+    )
+    if regressions:
+        print("\nРегрессии:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nРегрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
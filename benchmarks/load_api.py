@@ -0,0 +1,737 @@
+"""
+Нагрузочный прогон всего API backend со смешанной нагрузкой.
+
+1. Заполняет пустую БД генератором benchmarks.seed_data (--scale, --seed).
+2. Поднимает backend в uvicorn в этом же процессе (или использует
+   --base-url уже запущенного) и берёт из БД выборку пользователей, чатов
+   и турниров.
+3. Пользователи получают сессионные токены через POST /auth/session
+   (initData подписывается тем же BOT_TOKEN); часть ходит со старым
+   X-User-Tg-Id. Бот-эндпоинты вызываются как бот, /admin — с X-Admin-Token.
+4. --concurrency клиентов в течение --duration секунд выбирают сценарии по
+   весам профиля --mix. GET повторяются с If-None-Match, как в браузере.
+5. Для каждого эндпоинта считает p50/p95/p99, пропускную способность,
+   коды ответов и SQL-запросы на запрос. Результат печатается и
+   сохраняется в JSON (--output, по умолчанию bench-results/); два файла
+   сравнивает benchmarks.compare_load.
+
+SQL-запросы считаются только при backend в этом же процессе: обработчик
+событий движков (sync и async) привязывает запросы к HTTP-запросу по
+заголовку X-Bench-Id.
+
+SSE-поток /tournaments/{id}/stream здесь не нагружается — для него
+benchmarks.bench_stream.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load_api --scale small --duration 20
+    # локальный PostgreSQL (пустая БД)
+    DATABASE_URL=postgresql://... python -m benchmarks.load_api --scale medium --concurrency 64
+    python -m benchmarks.compare_load bench-results/load-<old>.json bench-results/load-<new>.json
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_api.db')}"
+# секреты нужны до импорта backend: по BOT_TOKEN подписываются initData и токены
+os.environ.setdefault("BOT_TOKEN", "0:bench-bot-token")
+os.environ.setdefault("ADMIN_TOKEN", "bench-admin-token")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+
+from backend.db import SessionLocal, async_engine, engine  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.models import (  # noqa: E402
+    ChatAdmin,
+    ChatMember,
+    Player,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    TelegramChat,
+    Tournament,
+    TournamentMatch,
+    TournamentPlayer,
+)
+from backend.pagination import encode_cursor  # noqa: E402
+from backend.schedule import AMERICANO_MODES  # noqa: E402
+from backend.standings import LIVE_PAIRING_MODES  # noqa: E402
+from benchmarks.seed_data import (  # noqa: E402
+    FIRST_NAMES,
+    LAST_NAMES,
+    add_scale_arguments,
+    create_schema,
+    is_empty,
+    scale_from_args,
+    seed,
+)
+
+BOT_TOKEN = os.environ["BOT_TOKEN"]
+ADMIN_TOKEN = os.environ["ADMIN_TOKEN"]
+RESULTS_DIR = Path("bench-results")
+# новые игроки и чаты, которые создаёт нагрузка
+NEW_TG_BASE = 900_000_000
+NEW_CHAT_BASE = -2_000_000_000_000
+
+
+# ---- подсчёт SQL на запрос (backend в этом процессе) ----
+
+_statements: ContextVar[Optional[list]] = ContextVar("bench_statements", default=None)
+_finished: dict[str, int] = {}
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class SqlCounter:
+    """ASGI-обёртка: считает SQL запроса и кладёт итог в _finished по X-Bench-Id."""
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = dict(scope["headers"]).get(b"x-bench-id")
+        counter = [0]
+        token = _statements.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _statements.reset(token)
+            if request_id is not None:
+                _finished[request_id.decode()] = counter[0]
+
+
+def install_sql_counter() -> SqlCounter:
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", _count_statement)
+    return SqlCounter(app)
+
+
+# ---- выборка данных для сценариев ----
+
+@dataclass
+class User:
+    player_id: int
+    tg_id: int
+    chat_id: int
+    admin: bool
+    token: Optional[str] = None
+
+
+@dataclass
+class ChatSample:
+    id: int
+    tg_chat_id: int
+    members: list[tuple[int, int]]  # (player_id, tg_id) активных участников
+    admins: list[tuple[int, int]]
+    tournaments: list[int]
+
+
+@dataclass
+class TournamentSample:
+    id: int
+    chat_id: int
+    mode: RatingModeEnum
+    scoring_type: ScoringTypeEnum
+    roster: list[int]
+    next_round: int
+
+
+@dataclass
+class Sample:
+    players: list[tuple[int, int, float]]  # (id, tg_id, rating)
+    chats: dict[int, ChatSample]
+    tournaments: dict[int, TournamentSample]
+    users: list[User] = field(default_factory=list)
+
+
+def load_sample(rnd: random.Random, n_players: int = 2000, n_chats: int = 200) -> Sample:
+    with SessionLocal() as db:
+        players = db.execute(
+            select(Player.id, Player.tg_id, Player.current_rating).order_by(func.random()).limit(n_players)
+        ).all()
+        chat_rows = db.execute(
+            select(TelegramChat.id, TelegramChat.tg_chat_id).order_by(func.random()).limit(n_chats)
+        ).all()
+        chats = {chat_id: ChatSample(chat_id, tg_chat_id, [], [], []) for chat_id, tg_chat_id in chat_rows}
+        for chat_id, player_id, tg_id in db.execute(
+            select(ChatMember.chat_id, Player.id, Player.tg_id)
+            .join(Player, Player.id == ChatMember.player_id)
+            .where(ChatMember.chat_id.in_(chats), ChatMember.status == "active")
+        ):
+            chats[chat_id].members.append((player_id, tg_id))
+        for chat_id, player_id, tg_id in db.execute(
+            select(ChatAdmin.chat_id, Player.id, Player.tg_id)
+            .join(Player, Player.id == ChatAdmin.admin_player_id)
+            .where(ChatAdmin.chat_id.in_(chats))
+        ):
+            chats[chat_id].admins.append((player_id, tg_id))
+
+        tournaments = {
+            t_id: TournamentSample(t_id, chat_id, mode, scoring, [], 1)
+            for t_id, chat_id, mode, scoring in db.execute(
+                select(Tournament.id, Tournament.chat_id, Tournament.mode, Tournament.scoring_type)
+                .where(Tournament.chat_id.in_(chats))
+            )
+        }
+        for t_id, player_id in db.execute(
+            select(TournamentPlayer.tournament_id, TournamentPlayer.player_id)
+            .where(TournamentPlayer.tournament_id.in_(tournaments))
+        ):
+            tournaments[t_id].roster.append(player_id)
+        for t_id, last_round in db.execute(
+            select(TournamentMatch.tournament_id, func.max(TournamentMatch.round_number))
+            .where(TournamentMatch.tournament_id.in_(tournaments))
+            .group_by(TournamentMatch.tournament_id)
+        ):
+            tournaments[t_id].next_round = (last_round or 0) + 1
+
+    tournaments = {t_id: t for t_id, t in tournaments.items() if len(t.roster) >= 4}
+    for t in tournaments.values():
+        chats[t.chat_id].tournaments.append(t.id)
+    sample = Sample([tuple(row) for row in players], chats, tournaments)
+    for chat in chats.values():
+        sample.users += [User(pid, tg, chat.id, True) for pid, tg in chat.admins]
+        admin_ids = {pid for pid, _ in chat.admins}
+        sample.users += [User(pid, tg, chat.id, False) for pid, tg in chat.members[:3] if pid not in admin_ids]
+    rnd.shuffle(sample.users)
+    return sample
+
+
+def init_data(tg_id: int) -> str:
+    """initData Telegram WebApp, подписанные BOT_TOKEN."""
+    fields = {"auth_date": str(int(time.time())), "user": json.dumps({"id": tg_id, "first_name": "Bench"})}
+    check = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+# ---- сценарии ----
+
+@dataclass
+class Call:
+    endpoint: str  # имя в отчёте: метод и шаблон пути
+    method: str
+    url: str
+    json: Optional[dict] = None
+    user: Optional[User] = None
+    headers: dict = field(default_factory=dict)
+
+
+class Scenarios:
+    """Построители запросов; каждый возвращает Call или None, если данных для него нет."""
+
+    def __init__(self, sample: Sample, rnd: random.Random):
+        self.sample = sample
+        self.rnd = rnd
+        self.modes = [m.value for m in RatingModeEnum]
+        self.new_tg = itertools.count(NEW_TG_BASE + rnd.randrange(10**6) * 100)
+        self.new_chat = itertools.count(NEW_CHAT_BASE - rnd.randrange(10**6) * 100, -1)
+        self.admins = [u for u in sample.users if u.admin]
+        self.members = sample.users
+        self.chats = list(sample.chats.values())
+        self.tournaments = list(sample.tournaments.values())
+        self.live = [t for t in self.tournaments if t.mode in LIVE_PAIRING_MODES]
+        self.americano = [t for t in self.tournaments if t.mode in AMERICANO_MODES]
+
+    def _user_chat(self, admin: bool) -> Optional[tuple[User, ChatSample]]:
+        users = self.admins if admin else self.members
+        if not users:
+            return None
+        user = self.rnd.choice(users)
+        return user, self.sample.chats[user.chat_id]
+
+    def _query(self) -> str:
+        word = self.rnd.choice(FIRST_NAMES + LAST_NAMES)
+        return word[: self.rnd.randint(1, min(6, len(word)))]
+
+    def _tournament(self, pool: list[TournamentSample]) -> Optional[tuple[User, TournamentSample]]:
+        if not pool:
+            return None
+        tournament = self.rnd.choice(pool)
+        chat = self.sample.chats[tournament.chat_id]
+        admins = [u for u in self.admins if u.chat_id == chat.id]
+        if not admins:
+            return None
+        return self.rnd.choice(admins), tournament
+
+    # -- чтение --
+
+    def health(self):
+        return Call("GET /health", "GET", "/health")
+
+    def players_first_page(self):
+        return Call("GET /players", "GET", "/players")
+
+    def players_next_page(self):
+        _, player_id, rating = self.rnd.choice(self.sample.players)
+        return Call("GET /players?cursor", "GET", f"/players?limit=100&cursor={encode_cursor(rating, player_id)}")
+
+    def players_chat(self):
+        chat = self.rnd.choice(self.chats)
+        return Call("GET /players?chat_id", "GET", f"/players?chat_id={chat.id}")
+
+    def players_export(self):
+        return Call("GET /players?format=ndjson", "GET", "/players?format=ndjson&limit=1000")
+
+    def search(self):
+        return Call("GET /players/search", "GET", f"/players/search?{urlencode({'q': self._query()})}")
+
+    def search_chat(self):
+        chat = self.rnd.choice(self.chats)
+        return Call(
+            "GET /players/search?chat_id", "GET",
+            f"/players/search?{urlencode({'q': self._query(), 'chat_id': chat.id})}",
+        )
+
+    def player_by_tg(self):
+        _, tg_id, _ = self.rnd.choice(self.sample.players)
+        return Call("GET /players/by_tg/{tg_id}", "GET", f"/players/by_tg/{tg_id}")
+
+    def rating_modes(self):
+        return Call("GET /rating/modes", "GET", "/rating/modes")
+
+    def rating(self):
+        return Call("GET /rating/{mode}", "GET", f"/rating/{self.rnd.choice(self.modes)}")
+
+    def rating_chat(self):
+        chat = self.rnd.choice(self.chats)
+        return Call("GET /rating/{mode}?chat_id", "GET", f"/rating/{self.rnd.choice(self.modes)}?chat_id={chat.id}")
+
+    def chats_list(self):
+        picked = self._user_chat(admin=self.rnd.random() < 0.3)
+        return picked and Call("GET /chats", "GET", "/chats", user=picked[0])
+
+    def chat_detail(self):
+        picked = self._user_chat(admin=False)
+        return picked and Call("GET /chats/{chat_id}", "GET", f"/chats/{picked[1].id}", user=picked[0])
+
+    def standings(self):
+        picked = self._tournament(self.tournaments)
+        return picked and Call(
+            "GET /tournaments/{id}/standings", "GET", f"/tournaments/{picked[1].id}/standings", user=picked[0]
+        )
+
+    def next_round(self):
+        picked = self._tournament(self.live)
+        return picked and Call(
+            "GET /tournaments/{id}/next-round", "GET", f"/tournaments/{picked[1].id}/next-round", user=picked[0]
+        )
+
+    def admin_stats(self):
+        path = self.rnd.choice(("/admin/cache/stats", "/admin/streams/stats"))
+        return Call(f"GET {path}", "GET", path, headers={"X-Admin-Token": ADMIN_TOKEN})
+
+    # -- запись --
+
+    def auth_session(self):
+        picked = self._user_chat(admin=False)
+        return picked and Call("POST /auth/session", "POST", "/auth/session", json={"init_data": init_data(picked[0].tg_id)})
+
+    def register_player(self):
+        if self.rnd.random() < 0.5:
+            tg_id = next(self.new_tg)
+        else:
+            _, tg_id, _ = self.rnd.choice(self.sample.players)
+        name = f"{self.rnd.choice(FIRST_NAMES)} {self.rnd.choice(LAST_NAMES)}"
+        return Call(
+            "POST /players/register", "POST", "/players/register",
+            json={"tg_id": tg_id, "username": f"bench{tg_id}", "display_name": name},
+        )
+
+    def create_match(self):
+        if not self.tournaments:
+            return None
+        t = self.rnd.choice(self.tournaments)
+        p1, p2 = self.rnd.sample(t.roster, 2)
+        body = {"tournament_id": t.id, "player1_id": p1, "player2_id": p2, "score_type": t.scoring_type.value}
+        if t.scoring_type == ScoringTypeEnum.POINTS:
+            body.update(points1=21, points2=self.rnd.randint(0, 19))
+        else:
+            body.update(sets1=2, sets2=self.rnd.randint(0, 1))
+        return Call("POST /matches", "POST", "/matches", json=body)
+
+    def create_tournament(self):
+        picked = self._user_chat(admin=True)
+        if picked is None:
+            return None
+        user, chat = picked
+        roster = [pid for pid, _ in self.rnd.sample(chat.members, min(8, len(chat.members)))]
+        return Call(
+            "POST /tournaments?chat_id", "POST", f"/tournaments?chat_id={chat.id}", user=user,
+            json={"name": "Бенчмарк", "mode": self.rnd.choice(self.modes), "scoring_type": "points",
+                  "points_limit": 21, "participants": roster},
+        )
+
+    def submit_round(self):
+        picked = self._tournament(self.tournaments)
+        if picked is None:
+            return None
+        user, t = picked
+        round_number, t.next_round = t.next_round, t.next_round + 1
+        roster = self.rnd.sample(t.roster, len(t.roster) // 2 * 2)
+        matches = []
+        for court in range(len(roster) // 2):
+            match = {"court_number": court + 1, "player1_id": roster[2 * court], "player2_id": roster[2 * court + 1]}
+            if t.scoring_type == ScoringTypeEnum.POINTS:
+                match.update(points1=21, points2=self.rnd.randint(0, 19))
+            else:
+                match.update(sets1=2, sets2=self.rnd.randint(0, 1))
+            matches.append(match)
+        return Call(
+            "POST /tournaments/{id}/rounds", "POST", f"/tournaments/{t.id}/rounds", user=user,
+            json={"round_number": round_number, "matches": matches},
+        )
+
+    def build_schedule(self):
+        picked = self._tournament(self.americano)
+        return picked and Call(
+            "POST /tournaments/{id}/schedule", "POST", f"/tournaments/{picked[1].id}/schedule", user=picked[0],
+            json={"courts": max(1, len(picked[1].roster) // 4), "restarts": 2, "seed": self.rnd.randrange(1000)},
+        )
+
+    def bot_register_chat(self):
+        if self.rnd.random() < 0.2:
+            tg_chat_id = next(self.new_chat)
+        else:
+            tg_chat_id = self.rnd.choice(self.chats).tg_chat_id
+        return Call(
+            "POST /bot/chats/register", "POST", "/bot/chats/register",
+            json={"tg_chat_id": tg_chat_id, "title": "Падел-чат", "type": "supergroup"},
+        )
+
+    def _member(self, tg_id: int) -> dict:
+        return {"tg_id": tg_id, "username": f"m{tg_id}", "display_name": f"{self.rnd.choice(FIRST_NAMES)} {tg_id % 1000}"}
+
+    def bot_sync(self):
+        chat = self.rnd.choice(self.chats)
+        admins = [{**self._member(tg), "is_admin": True} for _, tg in chat.admins]
+        return Call(
+            "POST /bot/chats/members/sync", "POST", "/bot/chats/members/sync",
+            json={"tg_chat_id": chat.tg_chat_id, "members": admins},
+        )
+
+    def _update(self, chat: ChatSample) -> dict:
+        # роли не меняем: иначе токены пользователей выборки отзывались бы на каждом шаге
+        if self.rnd.random() < 0.3:
+            tg_id, status = next(self.new_tg), "active"
+        else:
+            _, tg_id = self.rnd.choice(chat.members)
+            status = "active"
+        member = self._member(tg_id)
+        return {"tg_chat_id": chat.tg_chat_id, "tg_user_id": tg_id, "username": member["username"],
+                "display_name": member["display_name"], "status": status}
+
+    def bot_member_update(self):
+        chat = self.rnd.choice(self.chats)
+        if not chat.members:
+            return None
+        return Call("POST /bot/chats/members/update", "POST", "/bot/chats/members/update", json=self._update(chat))
+
+    def bot_member_batch(self):
+        chat = self.rnd.choice(self.chats)
+        if not chat.members:
+            return None
+        return Call(
+            "POST /bot/chats/members/batch", "POST", "/bot/chats/members/batch",
+            json={"updates": [self._update(chat) for _ in range(20)]},
+        )
+
+
+READ = {
+    "health": 1, "players_first_page": 6, "players_next_page": 3, "players_chat": 3, "players_export": 0.2,
+    "search": 10, "search_chat": 4, "player_by_tg": 6, "rating_modes": 2, "rating": 8, "rating_chat": 6,
+    "chats_list": 6, "chat_detail": 4, "standings": 6, "next_round": 3, "admin_stats": 0.2,
+}
+WRITE = {
+    "auth_session": 2, "register_player": 2, "create_match": 3, "create_tournament": 0.5, "submit_round": 2,
+    "build_schedule": 0.5, "bot_register_chat": 0.5, "bot_sync": 1, "bot_member_update": 2, "bot_member_batch": 1,
+}
+# доля записи в профиле
+MIXES = {"read": 0.02, "mixed": 0.1, "write": 0.5}
+
+
+def mix_weights(mix: str) -> dict[str, float]:
+    write_share = MIXES[mix]
+    read_total, write_total = sum(READ.values()), sum(WRITE.values())
+    weights = {name: w / read_total * (1 - write_share) for name, w in READ.items()}
+    weights.update({name: w / write_total * write_share for name, w in WRITE.items()})
+    return weights
+
+
+# ---- прогон ----
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+    statements: list[int] = field(default_factory=list)
+    response_bytes: int = 0
+
+
+class LoadRun:
+    def __init__(self, client: httpx.AsyncClient, scenarios: Scenarios, weights: dict[str, float], count_sql: bool):
+        self.client = client
+        self.scenarios = scenarios
+        self.names = list(weights)
+        self.weights = list(weights.values())
+        self.count_sql = count_sql
+        self.stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.request_ids = itertools.count()
+
+    async def authenticate(self, users: list[User], header_auth_share: float, rnd: random.Random) -> int:
+        """Токены для пользователей выборки; часть остаётся на X-User-Tg-Id."""
+        issued = 0
+        for user in users:
+            if rnd.random() < header_auth_share:
+                continue
+            issued += await self._refresh_token(user)
+        return issued
+
+    async def _refresh_token(self, user: User) -> bool:
+        resp = await self.client.post("/auth/session", json={"init_data": init_data(user.tg_id)})
+        user.token = resp.json()["token"] if resp.status_code == 200 else None
+        return user.token is not None
+
+    def _headers(self, call: Call, etags: dict) -> dict:
+        headers = dict(call.headers)
+        if call.user is not None:
+            if call.user.token:
+                headers["Authorization"] = f"Bearer {call.user.token}"
+            else:
+                headers["X-User-Tg-Id"] = str(call.user.tg_id)
+        if call.method == "GET" and call.url in etags:
+            headers["If-None-Match"] = etags[call.url]
+        return headers
+
+    async def _send(self, call: Call, etags: dict, record: bool) -> None:
+        request_id = str(next(self.request_ids))
+        headers = self._headers(call, etags)
+        headers["X-Bench-Id"] = request_id
+        started = time.perf_counter()
+        try:
+            resp = await self.client.request(call.method, call.url, json=call.json, headers=headers)
+            status, size = resp.status_code, len(resp.content)
+        except httpx.HTTPError:
+            status, size, resp = 0, 0, None
+        elapsed = time.perf_counter() - started
+
+        if resp is not None and "etag" in resp.headers and call.method == "GET":
+            etags[call.url] = resp.headers["etag"]
+        if status == 401 and call.user is not None and call.user.token:
+            # токен отозван (сменились роли): WebApp получает новый
+            await self._refresh_token(call.user)
+
+        statements = None
+        if self.count_sql:
+            for _ in range(1000):
+                if request_id in _finished:
+                    statements = _finished.pop(request_id)
+                    break
+                await asyncio.sleep(0.001)
+        if not record:
+            return
+        stats = self.stats[call.endpoint]
+        stats.latencies.append(elapsed)
+        stats.statuses[status] += 1
+        stats.response_bytes += size
+        if statements is not None:
+            stats.statements.append(statements)
+
+    async def worker(self, rnd: random.Random, deadline: float, record_after: float) -> None:
+        etags: dict[str, str] = {}
+        while (now := time.perf_counter()) < deadline:
+            name = rnd.choices(self.names, self.weights)[0]
+            call = getattr(self.scenarios, name)()
+            if call:
+                await self._send(call, etags, record=now >= record_after)
+
+    async def run(self, concurrency: int, duration: float, warmup: float, seed_value: int) -> float:
+        started = time.perf_counter()
+        record_after = started + warmup
+        deadline = record_after + duration
+        await asyncio.gather(
+            *(self.worker(random.Random(seed_value * 1000 + i), deadline, record_after) for i in range(concurrency))
+        )
+        return time.perf_counter() - record_after
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(stats: EndpointStats, elapsed: float) -> dict:
+    latencies = stats.latencies
+    errors = sum(n for status, n in stats.statuses.items() if status == 0 or status >= 500)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "errors": errors,
+        "statuses": {str(status): n for status, n in sorted(stats.statuses.items())},
+        "sql_per_request": round(sum(stats.statements) / len(stats.statements), 2) if stats.statements else None,
+        "sql_max": max(stats.statements) if stats.statements else None,
+        "bytes_per_request": round(stats.response_bytes / len(latencies)) if latencies else 0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict) -> None:
+    meta = report["meta"]
+    print(f"\n{meta['revision']} {meta['database']} scale={meta['scale_name']} mix={meta['mix']} "
+          f"concurrency={meta['concurrency']} duration={meta['duration']}s")
+    print(f"{'endpoint':36} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'sql':>6} {'err':>5}")
+    for name, r in sorted(report["endpoints"].items()):
+        sql = "-" if r["sql_per_request"] is None else f"{r['sql_per_request']:.1f}"
+        print(f"{name:36} {r['requests']:7} {r['rps']:8.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+              f"{r['p99_ms']:8.2f} {sql:>6} {r['errors']:5}")
+    t = report["total"]
+    print(f"{'TOTAL':36} {t['requests']:7} {t['rps']:8.1f} {t['p50_ms']:8.2f} {t['p95_ms']:8.2f} {t['p99_ms']:8.2f}")
+
+
+def start_server(asgi_app, port: int) -> Callable[[], None]:
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join()
+    return stop
+
+
+async def drive(args, base_url: str, count_sql: bool) -> dict:
+    rnd = random.Random(args.seed)
+    sample = load_sample(rnd)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        scenarios = Scenarios(sample, rnd)
+        load = LoadRun(client, scenarios, mix_weights(args.mix), count_sql)
+        users = sample.users[: args.users]
+        scenarios.admins = [u for u in users if u.admin]
+        scenarios.members = users
+        issued = await load.authenticate(users, args.header_auth_share, rnd)
+        print(f"users={len(users)} tokens={issued} chats={len(sample.chats)} tournaments={len(sample.tournaments)}")
+        elapsed = await load.run(args.concurrency, args.duration, args.warmup, args.seed)
+
+    everything = EndpointStats()
+    for stats in load.stats.values():
+        everything.latencies += stats.latencies
+        everything.statements += stats.statements
+        everything.response_bytes += stats.response_bytes
+        for status, n in stats.statuses.items():
+            everything.statuses[status] += n
+    return {
+        "endpoints": {name: summarize(stats, elapsed) for name, stats in load.stats.items()},
+        "total": summarize(everything, elapsed),
+        "elapsed": round(elapsed, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API со смешанной нагрузкой")
+    add_scale_arguments(parser)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Секунд измерения")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Секунд прогрева без записи результатов")
+    parser.add_argument("--users", type=int, default=200, help="Пользователей WebApp в нагрузке")
+    parser.add_argument("--header-auth-share", type=float, default=0.2, help="Доля пользователей с X-User-Tg-Id")
+    parser.add_argument("--base-url", help="Уже запущенный backend (та же БД); без подсчёта SQL")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="JSON с результатами (по умолчанию bench-results/load-<коммит>-<время>.json)")
+    args = parser.parse_args()
+    scale = scale_from_args(args)
+
+    create_schema()
+    if is_empty():
+        started = time.perf_counter()
+        seed(scale, args.seed)
+        print(f"seed {scale} за {time.perf_counter() - started:.1f}s")
+    else:
+        print("БД не пуста — используются существующие данные")
+
+    stop = None
+    if args.base_url:
+        base_url, count_sql = args.base_url, False
+    else:
+        stop = start_server(install_sql_counter(), args.port)
+        base_url, count_sql = f"http://127.0.0.1:{args.port}", True
+    try:
+        results = asyncio.run(drive(args, base_url, count_sql))
+    finally:
+        if stop is not None:
+            stop()
+
+    revision = git_revision()
+    report = {
+        "meta": {
+            "revision": revision,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": engine.dialect.name,
+            "scale_name": args.scale,
+            "scale": scale.__dict__,
+            "seed": args.seed,
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "in_process": not args.base_url,
+            "python": platform.python_version(),
+        },
+        **results,
+    }
+    print_report(report)
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"load-{revision}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"\nрезультаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
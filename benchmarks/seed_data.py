@@ -0,0 +1,306 @@
+"""
+Детерминированный генератор синтетических данных для нагрузочных бенчмарков.
+
+Заполняет пустую БД игроками, чатами, участниками, админами, турнирами
+(с участниками и матчами) и статистикой по режимам. Одинаковые --scale и
+--seed дают одинаковые данные, поэтому результаты прогонов на разных коммитах
+сравнимы.
+
+Пресеты --scale (каждый параметр можно переопределить отдельно):
+    small   2k игроков, 100 чатов, 200 турниров × 20 матчей
+    medium  20k игроков, 1k чатов, 5k турниров × 40 матчей (200k матчей)
+    large   100k игроков, 5k чатов, 50k турниров × 40 матчей (2M матчей)
+
+Схема создаётся create_all; в PostgreSQL дополнительно — объекты, которые
+есть только в миграциях (pg_trgm, player_search_key и индексы поиска).
+
+Запуск из корня репозитория:
+    python -m benchmarks.seed_data --scale small
+    DATABASE_URL=postgresql://... python -m benchmarks.seed_data --scale large
+"""
+import argparse
+import importlib.util
+import itertools
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Iterable, Iterator
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'seed_data.db')}"
+
+from sqlalchemy import insert, text  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from backend.db import Base, engine  # noqa: E402
+from backend.models import (  # noqa: E402
+    ChatAdmin,
+    ChatMember,
+    GenderEnum,
+    Player,
+    PlayerModeStats,
+    RatingModeEnum,
+    ScoringTypeEnum,
+    TelegramChat,
+    Tournament,
+    TournamentMatch,
+    TournamentPlayer,
+)
+
+TG_BASE = 50_000_000
+TG_CHAT_BASE = -1_000_000_000_000
+STAT_COLUMNS = (
+    "games_played", "wins_games", "draws_games", "losses_games", "wins_sets",
+    "losses_sets", "points_scored", "points_conceded", "delta_points", "delta_sets",
+)
+FIRST_NAMES = (
+    "Александр", "Алексей", "Мария", "Анна", "Дмитрий", "Екатерина", "Сергей", "Юлия",
+    "Щукин", "Жанна", "Ксения", "Борис", "Alexander", "Maria", "Dmitry", "Kate",
+    "Sergey", "Julia", "Xenia", "Boris", "Ivan", "Olga", "Nikita", "Sasha",
+)
+LAST_NAMES = (
+    "Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Соколова", "Лебедев", "Хабибуллин",
+    "Ivanov", "Petrova", "Smirnov", "Kuznetsova", "Popov", "Sokolova", "Lebedev", "Khabibullin",
+)
+# Таблицы с автоинкрементным id, которые заполняются с явными id
+SERIAL_TABLES = ("players", "tg_chats", "tournaments", "tournament_matches", "player_mode_stats")
+CHUNK = 20_000
+
+
+@dataclass(frozen=True)
+class Scale:
+    players: int
+    chats: int
+    members_per_chat: int
+    admins_per_chat: int
+    tournaments: int
+    players_per_tournament: int
+    matches_per_tournament: int
+
+
+SCALES = {
+    "small": Scale(2_000, 100, 40, 2, 200, 8, 20),
+    "medium": Scale(20_000, 1_000, 60, 2, 5_000, 12, 40),
+    "large": Scale(100_000, 5_000, 80, 3, 50_000, 12, 40),
+}
+
+
+def _migration(name: str):
+    path = Path(__file__).resolve().parent.parent / "alembic" / "versions" / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(f"migration_{name}", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+def create_schema(bind: Engine = engine) -> None:
+    """Таблицы моделей и (в PostgreSQL) объекты, которые создают только миграции."""
+    Base.metadata.create_all(bind)
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for name, table, expression in _migration("003_hot_query_indexes").TRGM_INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})"))
+        search = _migration("004_player_search_key")
+        conn.execute(
+            text(
+                "CREATE OR REPLACE FUNCTION player_search_key(value text) RETURNS text "
+                f"LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$ SELECT {search._search_key_sql()} $$"
+            )
+        )
+        for name, expression, method in search.SEARCH_INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON players USING {method} ({expression})"))
+        for name, _ in search.OLD_TRGM_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _chunks(rows: Iterable[dict]) -> Iterator[list[dict]]:
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, CHUNK)):
+        yield chunk
+
+
+def _stats(rnd: random.Random) -> dict:
+    games = rnd.randint(0, 60)
+    wins = rnd.randint(0, games)
+    scored, conceded = rnd.randint(0, 600), rnd.randint(0, 600)
+    return {
+        "games_played": games,
+        "wins_games": wins,
+        "draws_games": 0,
+        "losses_games": games - wins,
+        "wins_sets": wins,
+        "losses_sets": games - wins,
+        "points_scored": scored,
+        "points_conceded": conceded,
+        "delta_points": scored - conceded,
+        "delta_sets": 2 * wins - games,
+    }
+
+
+def seed(scale: Scale, seed_value: int = 1, bind: Engine = engine) -> dict:
+    """Заполняет пустую БД; возвращает число строк по таблицам."""
+    rnd = random.Random(seed_value)
+    modes = list(RatingModeEnum)
+    genders = [GenderEnum.MALE, GenderEnum.FEMALE, None]
+
+    players = [
+        {
+            "id": i,
+            "tg_id": TG_BASE + i,
+            "username": f"{rnd.choice(LAST_NAMES).lower()}{i}" if i % 3 else None,
+            "display_name": f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+            "gender": genders[i % 3],
+            "current_rating": round(rnd.gauss(1500, 150), 1),
+            "rating_letter": "ABCDE"[min(4, i % 7)],
+        }
+        for i in range(1, scale.players + 1)
+    ]
+    # участники чата: первые admins_per_chat — админы (всегда активны)
+    members_by_chat = {
+        chat_id: rnd.sample(range(1, scale.players + 1), min(scale.members_per_chat, scale.players))
+        for chat_id in range(1, scale.chats + 1)
+    }
+    active_by_chat = {
+        chat_id: [p for k, p in enumerate(members) if k < scale.admins_per_chat or rnd.random() < 0.9]
+        for chat_id, members in members_by_chat.items()
+    }
+
+    def member_rows():
+        for chat_id, members in members_by_chat.items():
+            active = set(active_by_chat[chat_id])
+            for player_id in members:
+                yield {"chat_id": chat_id, "player_id": player_id, "status": "active" if player_id in active else "left"}
+
+    def stats_rows():
+        stats_id = itertools.count(1)
+        for player in players:
+            for mode in rnd.sample(modes, 2):
+                yield {"id": next(stats_id), "player_id": player["id"], "mode": mode, "chat_id": None, **_stats(rnd)}
+        for chat_id, active in active_by_chat.items():
+            mode = modes[chat_id % len(modes)]
+            for player_id in active:
+                yield {"id": next(stats_id), "player_id": player_id, "mode": mode, "chat_id": chat_id, **_stats(rnd)}
+
+    rosters = {}
+    tournament_rows = []
+    for t in range(1, scale.tournaments + 1):
+        chat_id = (t - 1) % scale.chats + 1
+        mode = modes[t % len(modes)]
+        scoring = ScoringTypeEnum.SETS if t % 5 == 0 else ScoringTypeEnum.POINTS
+        tournament_rows.append({
+            "id": t,
+            "name": f"Турнир {t}",
+            "mode": mode,
+            "status": "finished" if t % 10 else "draft",
+            "scoring_type": scoring,
+            "points_limit": 21 if scoring == ScoringTypeEnum.POINTS else None,
+            "sets_limit": 3 if scoring == ScoringTypeEnum.SETS else None,
+            "chat_id": chat_id,
+        })
+        active = active_by_chat[chat_id]
+        rosters[t] = rnd.sample(active, min(scale.players_per_tournament, len(active)) // 2 * 2)
+
+    def match_rows():
+        match_id = itertools.count(1)
+        for tournament in tournament_rows:
+            roster = rosters[tournament["id"]]
+            courts = len(roster) // 2
+            if not courts:
+                continue
+            points = tournament["scoring_type"] == ScoringTypeEnum.POINTS
+            for m in range(scale.matches_per_tournament):
+                round_number, court = divmod(m, courts)
+                shift = round_number % len(roster)
+                low = rnd.randint(0, 19) if points else rnd.randint(0, 1)
+                yield {
+                    "id": next(match_id),
+                    "tournament_id": tournament["id"],
+                    "round_number": round_number + 1,
+                    "court_number": court + 1,
+                    "player1_id": roster[(2 * court + shift) % len(roster)],
+                    "player2_id": roster[(2 * court + 1 + shift) % len(roster)],
+                    "score_type": tournament["scoring_type"],
+                    "points1": 21 if points else None,
+                    "points2": low if points else None,
+                    "sets1": None if points else 2,
+                    "sets2": None if points else low,
+                }
+
+    tables = (
+        (Player, players),
+        (TelegramChat, (
+            {"id": c, "tg_chat_id": TG_CHAT_BASE - c, "title": f"Падел-чат {c}", "type": "supergroup"}
+            for c in range(1, scale.chats + 1)
+        )),
+        (ChatMember, member_rows()),
+        (ChatAdmin, (
+            {"chat_id": chat_id, "admin_player_id": player_id, "role": "owner" if k == 0 else "admin"}
+            for chat_id, members in members_by_chat.items()
+            for k, player_id in enumerate(members[: scale.admins_per_chat])
+        )),
+        (PlayerModeStats, stats_rows()),
+        (Tournament, tournament_rows),
+        (TournamentPlayer, (
+            {"tournament_id": t, "player_id": p} for t, roster in rosters.items() for p in roster
+        )),
+        (TournamentMatch, match_rows()),
+    )
+    with bind.begin() as conn:
+        for model, rows in tables:
+            for chunk in _chunks(rows):
+                conn.execute(insert(model), chunk)
+
+    with bind.begin() as conn:
+        if bind.dialect.name == "postgresql":
+            # последовательности после вставки с явными id
+            for table in SERIAL_TABLES:
+                conn.execute(
+                    text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))")
+                )
+        conn.execute(text("ANALYZE"))
+        return {
+            table.name: conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+            for table in Base.metadata.sorted_tables
+        }
+
+
+def is_empty(bind: Engine = engine) -> bool:
+    with bind.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM players LIMIT 1")).first() is None
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора")
+    for field in fields(Scale):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=int, help=f"Переопределить {field.name} пресета")
+
+
+def scale_from_args(args: argparse.Namespace) -> Scale:
+    overrides = {f.name: getattr(args, f.name) for f in fields(Scale) if getattr(args, f.name) is not None}
+    return replace(SCALES[args.scale], **overrides)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочных бенчмарков")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    scale = scale_from_args(args)
+
+    create_schema()
+    if not is_empty():
+        raise SystemExit("В БД уже есть игроки — генератор заполняет только пустую БД")
+    started = time.perf_counter()
+    sizes = seed(scale, args.seed)
+    print(f"{engine.dialect.name} {scale} за {time.perf_counter() - started:.1f}s")
+    for table, count in sizes.items():
+        print(f"  {table:22} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Кеш списков администраторов чатов.
+
+Список админов нужен и для проверки прав (/sync и другие команды только для
+админов), и для payload синхронизации. Вместо вызова Telegram API на каждую
+команду список берётся один раз и живёт ADMIN_CACHE_TTL секунд.
+
+- одновременные промахи по одному чату делают один get_chat_administrators;
+- повышение и понижение участников (апдейты chat_member) сбрасывают запись
+  чата сразу, поэтому TTL — лишь страховка от пропущенных апдейтов
+  (chat_member приходят, только если бот — админ группы).
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from telegram import Bot, ChatMember
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+class ChatAdminCache:
+    def __init__(self, ttl: float = 300.0, max_chats: int = 1000):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self._entries: OrderedDict[int, tuple[float, tuple[ChatMember, ...]]] = OrderedDict()
+        self._flights: dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "ChatAdminCache":
+        return cls(
+            ttl=float(os.getenv("ADMIN_CACHE_TTL", "300")),
+            max_chats=int(os.getenv("ADMIN_CACHE_SIZE", "1000")),
+        )
+
+    async def get(self, bot: Bot, chat_id: int) -> Sequence[ChatMember]:
+        """Администраторы чата (из кеша или одним вызовом get_chat_administrators)."""
+        entry = self._entries.get(chat_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            return entry[1]
+
+        future = self._flights.get(chat_id)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = self._flights[chat_id] = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            admins = tuple(await bot.get_chat_administrators(chat_id))
+        except BaseException as e:
+            if self._flights.get(chat_id) is future:
+                del self._flights[chat_id]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+
+        # Запись могли сбросить, пока шёл запрос: тогда результат не кешируем
+        if self._flights.get(chat_id) is future:
+            del self._flights[chat_id]
+            self._entries[chat_id] = (time.monotonic() + self.ttl, admins)
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_chats:
+                self._entries.popitem(last=False)
+        future.set_result(admins)
+        return admins
+
+    async def admin_ids(self, bot: Bot, chat_id: int) -> set[int]:
+        return {admin.user.id for admin in await self.get(bot, chat_id)}
+
+    async def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        return user_id in await self.admin_ids(bot, chat_id)
+
+    def invalidate(self, chat_id: int) -> None:
+        self._entries.pop(chat_id, None)
+        self._flights.pop(chat_id, None)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "chats": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+def admin_status_changed(old: Optional[ChatMember], new: Optional[ChatMember]) -> bool:
+    """Изменился ли набор админов чата (повышение, понижение, смена прав админа)."""
+    old_admin = old is not None and old.status in ADMIN_STATUSES
+    new_admin = new is not None and new.status in ADMIN_STATUSES
+    # права внутри админа (can_* и custom_title) тоже часть кешированного объекта
+    return old_admin or new_admin
@@ -0,0 +1,196 @@
+"""
+Общий HTTP-клиент бота к backend.
+
+Один долгоживущий httpx.AsyncClient на всё приложение (создаётся в post_init,
+закрывается в post_shutdown): пул соединений с keep-alive вместо нового
+TCP-соединения на каждый апдейт Telegram.
+
+- лимиты пула, keep-alive и HTTP/2 настраиваются через env;
+- таймауты задаются по эндпоинтам (endpoint_timeouts);
+- идемпотентные вызовы повторяются с экспоненциальной задержкой и jitter
+  при сетевых ошибках и ответах 502/503/504;
+- длительность каждого вызова пишется в лог и в метрики (по шаблону пути,
+  числовые сегменты заменены на {id}), сетевые ошибки и 5xx — в счётчик ошибок;
+- каждая попытка — спан трассы апдейта, контекст уходит в backend заголовком
+  traceparent (см. observability/tracing.py).
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from typing import Any, Optional
+
+import httpx
+
+from observability.metrics import Counter, HistogramFamily
+from tracing import TRACEPARENT, tracer
+
+logger = logging.getLogger(__name__)
+
+backend_duration = HistogramFamily(
+    "padel_bot_backend_request_duration_seconds", "Длительность попытки вызова backend", ("method", "route"),
+)
+backend_errors = Counter(
+    "padel_bot_backend_errors_total", "Неудачные попытки вызова backend (сеть или 5xx)", ("method", "route", "kind"),
+)
+_NUMERIC_SEGMENT = re.compile(r"/-?\d+(?=/|$)")
+
+
+def route_template(path: str) -> str:
+    """/players/by_tg/123 -> /players/by_tg/{id}: метки не должны расти с числом игроков."""
+    return _NUMERIC_SEGMENT.sub("/{id}", path)
+
+# Статусы, при которых идемпотентный запрос имеет смысл повторить
+RETRY_STATUSES = {502, 503, 504}
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class BackendClient:
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 50,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        default_timeout: float = 10.0,
+        endpoint_timeouts: Optional[dict[str, float]] = None,
+        retries: int = 3,
+        backoff_base: float = 0.2,
+        backoff_max: float = 3.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.default_timeout = default_timeout
+        # Таймауты по эндпоинтам (секунды); остальные — default_timeout
+        self.endpoint_timeouts = endpoint_timeouts or {}
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls, base_url: str) -> "BackendClient":
+        """Настройки из env (читаются после load_dotenv в bot.py)."""
+        return cls(
+            base_url,
+            max_connections=int(os.getenv("BACKEND_MAX_CONNECTIONS", "50")),
+            max_keepalive=int(os.getenv("BACKEND_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("BACKEND_KEEPALIVE_EXPIRY", "30")),
+            http2=_env_bool("BACKEND_HTTP2", False),
+            default_timeout=float(os.getenv("BACKEND_TIMEOUT", "10")),
+            endpoint_timeouts={
+                "/bot/chats/members/sync": float(os.getenv("BACKEND_SYNC_TIMEOUT", "30")),
+            },
+            retries=int(os.getenv("BACKEND_RETRIES", "3")),
+            backoff_base=float(os.getenv("BACKEND_BACKOFF_BASE", "0.2")),
+            backoff_max=float(os.getenv("BACKEND_BACKOFF_MAX", "3")),
+        )
+
+    async def start(self) -> None:
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("BACKEND_HTTP2 включён, но пакет h2 не установлен — используем HTTP/1.1")
+                http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=self.limits,
+            http2=http2,
+            timeout=self.default_timeout,
+        )
+        logger.info(
+            f"Backend client started: {self.base_url} "
+            f"(max_connections={self.limits.max_connections}, http2={http2})"
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": случайная задержка от 0 до экспоненциального потолка
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        idempotent: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Запрос к backend. GET считается идемпотентным по умолчанию,
+        для POST повтор нужно разрешить явно (idempotent=True).
+        """
+        if self._client is None:
+            raise RuntimeError("BackendClient не запущен (start() вызывается в post_init)")
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD", "PUT", "DELETE")
+        if timeout is None:
+            timeout = self.endpoint_timeouts.get(path, self.default_timeout)
+        attempts = 1 + (self.retries if idempotent else 0)
+        route = route_template(path)
+        histogram = backend_duration.labels(method, route)
+        headers = dict(kwargs.pop("headers", None) or {})
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                with tracer.span(f"backend {method} {route}", "client", **{
+                    "http.method": method, "http.target": path, "attempt": attempt + 1,
+                }) as span:
+                    traceparent = tracer.traceparent()
+                    if traceparent is not None:
+                        headers[TRACEPARENT] = traceparent
+                    resp = await self._client.request(method, path, timeout=timeout, headers=headers, **kwargs)
+                    if span is not None:
+                        span.set_attribute("http.status_code", resp.status_code)
+            except httpx.TransportError as e:
+                histogram.observe(time.perf_counter() - started)
+                backend_errors.labels(method, route, type(e).__name__).inc()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                logger.warning(
+                    f"backend {method} {path} failed in {elapsed_ms:.1f}ms "
+                    f"(attempt {attempt + 1}/{attempts}): {e!r}"
+                )
+                if attempt + 1 >= attempts:
+                    raise
+            else:
+                histogram.observe(time.perf_counter() - started)
+                if resp.status_code >= 500:
+                    backend_errors.labels(method, route, str(resp.status_code)).inc()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                logger.info(
+                    f"backend {method} {path} -> {resp.status_code} in {elapsed_ms:.1f}ms"
+                    + (f" (attempt {attempt + 1}/{attempts})" if attempt else "")
+                )
+                if resp.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return resp
+            await asyncio.sleep(self._backoff(attempt))
+
+        raise AssertionError("unreachable")
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
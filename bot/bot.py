@@ -1,8 +1,9 @@
+import asyncio
 import os
 import logging
+from typing import Optional
 
 from dotenv import load_dotenv
-import httpx
 from telegram import (
     Update,
     InlineKeyboardButton,
@@ -10,15 +11,23 @@ from telegram import (
     WebAppInfo,
 )
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
     ChatMemberHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 from telegram import ChatMember as TgChatMember
 
+from backend_client import BackendClient
+from outbox import MemberOutbox
+from update_processor import ChatOrderedUpdateProcessor
+from admin_cache import ChatAdminCache, admin_status_changed
+from instrumentation import MeteredRequest, count_update, serve_metrics, timed
+
 # локально подхватит .env, на Render переменные возьмутся из окружения
 load_dotenv()
 
@@ -32,7 +41,23 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
 # 🔹 URL твоего web-приложения (React/Next/что угодно)
 WEBAPP_URL = os.getenv("WEBAPP_URL", "https://example.com")
 
-print(">>> BACKEND_URL =", BACKEND_URL)
+# Режим получения апдейтов: polling (по умолчанию) или webhook (за nginx)
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL")  # публичный https-адрес, например https://example.com/telegram
+BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "webhook")
+BOT_WEBHOOK_LISTEN = os.getenv("BOT_WEBHOOK_LISTEN", "0.0.0.0")
+BOT_WEBHOOK_PORT = int(os.getenv("BOT_WEBHOOK_PORT", "8443"))
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET")
+BOT_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("BOT_WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Сколько апдейтов обрабатывается одновременно (1 — строго по одному, как раньше)
+BOT_CONCURRENCY = int(os.getenv("BOT_CONCURRENCY", "16"))
+BOT_MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", "1024"))
+
+# GET /metrics для Prometheus на отдельном порту (0 — выключено)
+BOT_METRICS_LISTEN = os.getenv("BOT_METRICS_LISTEN", "0.0.0.0")
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "9100"))
+METRICS_HANDLER_GROUP = -100
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is not set in environment variables")
@@ -42,6 +67,22 @@ logging.basicConfig(
     level=logging.INFO,
 )
 logger = logging.getLogger(__name__)
+logger.info(f"Backend URL: {BACKEND_URL}")
+
+
+def backend(context: ContextTypes.DEFAULT_TYPE) -> BackendClient:
+    """Общий клиент backend, созданный в on_startup."""
+    return context.application.bot_data["backend"]
+
+
+def outbox(context: ContextTypes.DEFAULT_TYPE) -> MemberOutbox:
+    """Очередь событий участников, созданная в on_startup."""
+    return context.application.bot_data["outbox"]
+
+
+def admin_cache(context: ContextTypes.DEFAULT_TYPE) -> ChatAdminCache:
+    """Кеш списков админов чатов, созданный в on_startup."""
+    return context.application.bot_data["admins"]
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -55,20 +96,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "display_name": (user.full_name or user.username or "Player"),
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(f"{BACKEND_URL}/players/register", json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            text = (
-                f"Привет, {data['display_name']}!\n"
-                f"Ты зарегистрирован в системе падела.\n"
-                f"Текущий рейтинг: {data['current_rating']:.0f}\n\n"
-                f"Нажми кнопку ниже, чтобы открыть приложение."
-            )
-        except Exception:
-            logger.exception("Error registering player")
-            text = "Ошибка при регистрации игрока. Попробуй позже."
+    try:
+        resp = await backend(context).post("/players/register", json=payload, idempotent=True)
+        resp.raise_for_status()
+        data = resp.json()
+        text = (
+            f"Привет, {data['display_name']}!\n"
+            f"Ты зарегистрирован в системе падела.\n"
+            f"Текущий рейтинг: {data['current_rating']:.0f}\n\n"
+            f"Нажми кнопку ниже, чтобы открыть приложение."
+        )
+    except Exception:
+        logger.exception("Error registering player")
+        text = "Ошибка при регистрации игрока. Попробуй позже."
 
     keyboard = [
         [
@@ -89,26 +129,25 @@ async def me(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user is None:
         return
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(f"{BACKEND_URL}/players/by_tg/{user.id}")
-            if resp.status_code == 404:
-                if update.message:
-                    await update.message.reply_text(
-                        "Ты ещё не зарегистрирован. Нажми /start."
-                    )
-                return
+    try:
+        resp = await backend(context).get(f"/players/by_tg/{user.id}")
+        if resp.status_code == 404:
+            if update.message:
+                await update.message.reply_text(
+                    "Ты ещё не зарегистрирован. Нажми /start."
+                )
+            return
 
-            resp.raise_for_status()
-            data = resp.json()
-            text = (
-                f"Игрок: {data['display_name']}\n"
-                f"Username: @{data['username']}\n"
-                f"Рейтинг: {data['current_rating']:.0f}"
-            )
-        except Exception:
-            logger.exception("Error getting player info")
-            text = "Ошибка при получении данных. Попробуй позже."
+        resp.raise_for_status()
+        data = resp.json()
+        text = (
+            f"Игрок: {data['display_name']}\n"
+            f"Username: @{data['username']}\n"
+            f"Рейтинг: {data['current_rating']:.0f}"
+        )
+    except Exception:
+        logger.exception("Error getting player info")
+        text = "Ошибка при получении данных. Попробуй позже."
 
     if update.message:
         await update.message.reply_text(text)
@@ -123,68 +162,81 @@ async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TY
     
     chat = update.my_chat_member.chat
     new_status = update.my_chat_member.new_chat_member.status
+
+    # Бота повысили/понизили или удалили — список админов чата изменился
+    admin_cache(context).invalidate(chat.id)
     
     # Регистрируем чат при добавлении бота
     if new_status in ("member", "administrator"):
-        async with httpx.AsyncClient() as client:
-            try:
-                payload = {
-                    "tg_chat_id": chat.id,
-                    "title": chat.title,
-                    "type": chat.type,
-                }
-                resp = await client.post(
-                    f"{BACKEND_URL}/bot/chats/register",
-                    json=payload,
-                    timeout=10.0
-                )
-                resp.raise_for_status()
-                logger.info(f"Chat {chat.id} ({chat.title}) registered")
-            except Exception:
-                logger.exception(f"Error registering chat {chat.id}")
+        try:
+            payload = {
+                "tg_chat_id": chat.id,
+                "title": chat.title,
+                "type": chat.type,
+            }
+            resp = await backend(context).post(
+                "/bot/chats/register",
+                json=payload,
+                idempotent=True,
+            )
+            resp.raise_for_status()
+            logger.info(f"Chat {chat.id} ({chat.title}) registered")
+        except Exception:
+            logger.exception(f"Error registering chat {chat.id}")
     
     # При удалении бота можно пометить чат как неактивный (опционально)
 
 
+async def handle_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обрабатывает изменения статуса участников (приходят, только если бот — админ).
+    Повышение и понижение сбрасывают кеш админов чата.
+    """
+    if update.chat_member is None:
+        return
+
+    change = update.chat_member
+    if admin_status_changed(change.old_chat_member, change.new_chat_member):
+        admin_cache(context).invalidate(change.chat.id)
+        logger.info(
+            f"Admin list of chat {change.chat.id} changed "
+            f"({change.new_chat_member.user.id}: {change.old_chat_member.status} -> {change.new_chat_member.status})"
+        )
+
+
 async def handle_new_chat_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обрабатывает событие добавления новых участников в группу.
+    Событие пишется в outbox и уходит в backend пачкой из фонового flusher.
     """
     if update.message is None or update.message.new_chat_members is None:
         return
     
     chat = update.message.chat
-    members = update.message.new_chat_members
-    
-    async with httpx.AsyncClient() as client:
-        for member in members:
-            try:
-                # Игнорируем ботов (кроме самого себя, если нужно)
-                if member.is_bot and member.id != context.bot.id:
-                    continue
-                
-                payload = {
-                    "tg_chat_id": chat.id,
-                    "tg_user_id": member.id,
-                    "username": member.username,
-                    "display_name": member.full_name or member.username or f"User {member.id}",
-                    "status": "active",
-                }
-                
-                resp = await client.post(
-                    f"{BACKEND_URL}/bot/chats/members/update",
-                    json=payload,
-                    timeout=10.0
-                )
-                resp.raise_for_status()
-                logger.info(f"Member {member.id} added to chat {chat.id}")
-            except Exception:
-                logger.exception(f"Error updating member {member.id} in chat {chat.id}")
+    events = [
+        {
+            "tg_chat_id": chat.id,
+            "tg_user_id": member.id,
+            "username": member.username,
+            "display_name": member.full_name or member.username or f"User {member.id}",
+            "status": "active",
+        }
+        for member in update.message.new_chat_members
+        # Игнорируем ботов (кроме самого себя, если нужно)
+        if not member.is_bot or member.id == context.bot.id
+    ]
+
+    try:
+        await outbox(context).put(*events)
+        logger.info(f"Members {[e['tg_user_id'] for e in events]} added to chat {chat.id} (queued)")
+    except Exception:
+        logger.exception(f"Error queueing new members in chat {chat.id}")
 
 
 async def handle_left_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обрабатывает событие ухода участника из группы.
+    Событие пишется в outbox и уходит в backend пачкой из фонового flusher.
     """
     if update.message is None or update.message.left_chat_member is None:
         return
@@ -192,23 +244,28 @@ async def handle_left_chat_member(update: Update, context: ContextTypes.DEFAULT_
     chat = update.message.chat
     member = update.message.left_chat_member
     
-    async with httpx.AsyncClient() as client:
-        try:
-            payload = {
-                "tg_chat_id": chat.id,
-                "tg_user_id": member.id,
-                "status": "left",
-            }
-            
-            resp = await client.post(
-                f"{BACKEND_URL}/bot/chats/members/update",
-                json=payload,
-                timeout=10.0
-            )
-            resp.raise_for_status()
-            logger.info(f"Member {member.id} left chat {chat.id}")
-        except Exception:
-            logger.exception(f"Error updating member {member.id} in chat {chat.id}")
+    try:
+        await outbox(context).put({
+            "tg_chat_id": chat.id,
+            "tg_user_id": member.id,
+            "status": "left",
+        })
+        logger.info(f"Member {member.id} left chat {chat.id} (queued)")
+    except Exception:
+        logger.exception(f"Error queueing member {member.id} in chat {chat.id}")
+
+
+async def outbox_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /outbox: глубина очереди событий участников."""
+    if update.message is None:
+        return
+    stats = await asyncio.to_thread(outbox(context).stats)
+    age = stats["oldest_age_seconds"]
+    await update.message.reply_text(
+        f"Событий в очереди: {stats['depth']}\n"
+        f"Самое старое: {f'{age:.0f} с назад' if age is not None else '—'}\n"
+        f"Отправлено с запуска: {stats['sent']}, ошибок отправки: {stats['failures']}"
+    )
 
 
 async def sync_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -227,95 +284,152 @@ async def sync_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Эта команда работает только в группах.")
         return
     
-    # Проверяем права админа (опционально, можно убрать для простоты)
+    # Один список админов (из кеша) и для проверки прав, и для payload
     try:
-        member = await context.bot.get_chat_member(chat.id, user.id)
-        if member.status not in ("administrator", "creator"):
-            await update.message.reply_text("Только администраторы могут использовать эту команду.")
-            return
+        chat_admins = await admin_cache(context).get(context.bot, chat.id)
     except Exception:
-        logger.exception("Error checking admin status")
-        # Продолжаем выполнение, если не удалось проверить
+        logger.exception("Could not get chat administrators")
+        await update.message.reply_text("Не удалось получить список участников.")
+        return
+
+    if user is None or user.id not in {admin.user.id for admin in chat_admins}:
+        await update.message.reply_text("Только администраторы могут использовать эту команду.")
+        return
     
     await update.message.reply_text("Синхронизирую участников...")
     
-    async with httpx.AsyncClient() as client:
-        try:
-            # Получаем список админов
-            admins = []
-            try:
-                chat_admins = await context.bot.get_chat_administrators(chat.id)
-                admin_ids = {admin.user.id for admin in chat_admins}
-            except Exception:
-                logger.warning("Could not get chat administrators")
-                admin_ids = set()
-            
-            # Получаем список участников
-            # В больших группах Telegram API не позволяет получить всех участников напрямую
-            # Поэтому используем только админов и полагаемся на события new_chat_members для остальных
-            members_data = []
-            try:
-                # Получаем список админов (это точно работает)
-                chat_admins = await context.bot.get_chat_administrators(chat.id)
-                admin_ids = {admin.user.id for admin in chat_admins}
-                
-                for admin in chat_admins:
-                    if admin.user.is_bot and admin.user.id != context.bot.id:
-                        continue
-                    members_data.append({
-                        "tg_id": admin.user.id,
-                        "username": admin.user.username,
-                        "display_name": admin.user.full_name or admin.user.username or f"User {admin.user.id}",
-                        "is_admin": True,
-                    })
-                
-                logger.info(f"Found {len(members_data)} admins in chat {chat.id}")
-            except Exception:
-                logger.warning("Could not get chat administrators")
-                admin_ids = set()
-            
-            if not members_data:
-                await update.message.reply_text("Не удалось получить список участников.")
-                return
-            
-            payload = {
-                "tg_chat_id": chat.id,
-                "members": members_data,
-            }
-            
-            resp = await client.post(
-                f"{BACKEND_URL}/bot/chats/members/sync",
-                json=payload,
-                timeout=30.0
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            
-            await update.message.reply_text(
-                f"Синхронизация завершена!\n"
-                f"Обработано участников: {data['members_processed']}\n"
-                f"Создано новых игроков: {data['players_created']}\n"
-                f"Обновлено игроков: {data['players_updated']}"
-            )
-        except Exception:
-            logger.exception("Error syncing members")
-            await update.message.reply_text("Ошибка при синхронизации участников.")
+    try:
+        # В больших группах Telegram API не позволяет получить всех участников напрямую
+        # Поэтому используем только админов и полагаемся на события new_chat_members для остальных
+        members_data = []
+        for admin in chat_admins:
+            if admin.user.is_bot and admin.user.id != context.bot.id:
+                continue
+            members_data.append({
+                "tg_id": admin.user.id,
+                "username": admin.user.username,
+                "display_name": admin.user.full_name or admin.user.username or f"User {admin.user.id}",
+                "is_admin": True,
+            })
+        logger.info(f"Found {len(members_data)} admins in chat {chat.id}")
+        
+        if not members_data:
+            await update.message.reply_text("Не удалось получить список участников.")
+            return
+        
+        payload = {
+            "tg_chat_id": chat.id,
+            "members": members_data,
+        }
+        
+        resp = await backend(context).post(
+            "/bot/chats/members/sync",
+            json=payload,
+            idempotent=True,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        
+        await update.message.reply_text(
+            f"Синхронизация завершена!\n"
+            f"Обработано участников: {data['members_processed']}\n"
+            f"Создано новых игроков: {data['players_created']}\n"
+            f"Обновлено игроков: {data['players_updated']}"
+        )
+    except Exception:
+        logger.exception("Error syncing members")
+        await update.message.reply_text("Ошибка при синхронизации участников.")
 
 
-def main():
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+async def on_startup(application: Application):
+    backend_client = BackendClient.from_env(BACKEND_URL)
+    await backend_client.start()
+    application.bot_data["backend"] = backend_client
+    application.bot_data["admins"] = ChatAdminCache.from_env()
+
+    member_outbox = MemberOutbox.from_env()
+    member_outbox.start(backend_client)
+    application.bot_data["outbox"] = member_outbox
+
+    application.bot_data["metrics_server"] = await serve_metrics(BOT_METRICS_LISTEN, BOT_METRICS_PORT)
+
+
+async def on_shutdown(application: Application):
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    backend_client = application.bot_data.pop("backend", None)
+    member_outbox = application.bot_data.pop("outbox", None)
+    if member_outbox is not None:
+        # Досылаем очередь, пока клиент ещё открыт; недоставленное останется в файле
+        await member_outbox.stop(backend_client)
+        member_outbox.close()
+    if backend_client is not None:
+        await backend_client.close()
+
+
+def register_handlers(application: Application) -> None:
+    # Счётчик апдейтов по типам: в группе обрабатывает только первый подошедший обработчик,
+    # поэтому у счётчика своя группа, раньше всех остальных
+    application.add_handler(TypeHandler(Update, count_update), group=METRICS_HANDLER_GROUP)
 
     # Команды
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("me", me))
-    application.add_handler(CommandHandler("sync", sync_members))
+    application.add_handler(CommandHandler("start", timed(start)))
+    application.add_handler(CommandHandler("me", timed(me)))
+    application.add_handler(CommandHandler("sync", timed(sync_members)))
+    application.add_handler(CommandHandler("outbox", timed(outbox_status)))
 
     # Обработчики событий группы
-    application.add_handler(ChatMemberHandler(handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
-    application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_chat_members))
-    application.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, handle_left_chat_member))
+    application.add_handler(ChatMemberHandler(timed(handle_my_chat_member), ChatMemberHandler.MY_CHAT_MEMBER))
+    application.add_handler(ChatMemberHandler(timed(handle_chat_member), ChatMemberHandler.CHAT_MEMBER))
+    application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, timed(handle_new_chat_members)))
+    application.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, timed(handle_left_chat_member)))
+
 
-    application.run_polling()  # для Render это ок
+def build_application(concurrency: int = BOT_CONCURRENCY, base_url: Optional[str] = None) -> Application:
+    """
+    Собирает приложение бота. concurrency > 1 — апдейты разных чатов
+    обрабатываются параллельно, внутри чата порядок сохраняется.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        # те же пулы, что строит ApplicationBuilder по умолчанию, но с метриками вызовов Bot API
+        .request(MeteredRequest(connection_pool_size=256))
+        .get_updates_request(MeteredRequest(connection_pool_size=1))
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if concurrency > 1:
+        builder = builder.concurrent_updates(
+            ChatOrderedUpdateProcessor(concurrency, max_pending_updates=BOT_MAX_PENDING_UPDATES)
+        )
+    application = builder.build()
+    register_handlers(application)
+    return application
+
+
+def main():
+    application = build_application()
+
+    if BOT_MODE == "webhook":
+        if not BOT_WEBHOOK_URL:
+            raise RuntimeError("BOT_WEBHOOK_URL is not set (required for BOT_MODE=webhook)")
+        # За nginx: Telegram -> https://<домен>/telegram/<path> -> bot:BOT_WEBHOOK_PORT
+        application.run_webhook(
+            listen=BOT_WEBHOOK_LISTEN,
+            port=BOT_WEBHOOK_PORT,
+            url_path=BOT_WEBHOOK_PATH,
+            webhook_url=f"{BOT_WEBHOOK_URL.rstrip('/')}/{BOT_WEBHOOK_PATH}",
+            secret_token=BOT_WEBHOOK_SECRET,
+            max_connections=BOT_WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)  # для Render это ок
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+"""
+Метрики бота: апдейты по типам, длительность обработчиков, вызовы Telegram API
+и HTTP-сервер GET /metrics для Prometheus.
+
+- count_update — TypeHandler в отдельной ранней группе: видит каждый апдейт до обработчиков
+  и считает его по типу (message, chat_member, my_chat_member, ...);
+- timed — обёртка обработчика: гистограмма длительности, счётчик ошибок
+  и трасса апдейта (корневой спан, см. tracing.py);
+- MeteredRequest — HTTPXRequest, который считает вызовы Bot API по методу
+  и исходу, меряет их длительность и пишет спан на каждый вызов;
+- serve_metrics — отдельный порт (BOT_METRICS_PORT): в режиме polling у бота
+  нет HTTP-сервера, а webhook-порт смотрит наружу через nginx.
+
+Метрики вызовов backend ведёт сам BackendClient (backend_client.py).
+"""
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import Update
+from telegram.error import NetworkError, TelegramError, TimedOut
+from telegram.ext import ContextTypes
+from telegram.request import HTTPXRequest
+
+from observability.metrics import CONTENT_TYPE, REGISTRY, Counter, HistogramFamily
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+updates_total = Counter("padel_bot_updates_total", "Апдейты Telegram по типу", ("type",))
+handler_duration = HistogramFamily(
+    "padel_bot_handler_duration_seconds", "Длительность обработчика апдейта", ("handler",),
+)
+handler_errors = Counter(
+    "padel_bot_handler_errors_total", "Обработчики, завершившиеся исключением", ("handler",),
+)
+telegram_calls = Counter(
+    "padel_bot_telegram_api_calls_total", "Вызовы Telegram Bot API по методу и исходу", ("method", "outcome"),
+)
+telegram_duration = HistogramFamily(
+    "padel_bot_telegram_api_duration_seconds", "Длительность вызова Telegram Bot API", ("method",),
+)
+
+
+def update_type(update: Update) -> str:
+    """Тип апдейта — имя заполненного поля (message, callback_query, chat_member, ...)."""
+    for name in Update.ALL_TYPES:
+        if getattr(update, name, None) is not None:
+            return name
+    return "unknown"
+
+
+async def count_update(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    updates_total.labels(update_type(update) if isinstance(update, Update) else "other").inc()
+
+
+def timed(callback: Callable[[Update, Any], Awaitable[Any]]) -> Callable[[Update, Any], Awaitable[Any]]:
+    """
+    Обработчик с метриками (длительность и исключения по имени функции)
+    и трассой: у апдейта новый trace id, для выбранных трасс — корневой спан.
+    """
+    name = callback.__name__
+    histogram = handler_duration.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: Any) -> Any:
+        started = time.perf_counter()
+        span = tracer.start_trace(f"handler {name}", kind="consumer")
+        if span is not None:
+            span.set_attribute("update.id", update.update_id)
+            span.set_attribute("update.type", update_type(update))
+            if update.effective_chat is not None:
+                span.set_attribute("chat.id", update.effective_chat.id)
+        try:
+            with span if span is not None else contextlib.nullcontext():
+                return await callback(update, context)
+        except Exception:
+            handler_errors.labels(name).inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def _outcome(error: Exception) -> str:
+    # 429 (RetryAfter) и прочие ошибки API разбираются выше по стеку — здесь это коды ответа
+    if isinstance(error, TimedOut):
+        return "timeout"
+    if isinstance(error, NetworkError):
+        return "network_error"
+    return "api_error"
+
+
+class MeteredRequest(HTTPXRequest):
+    """HTTPXRequest с метриками по методу Bot API (последний сегмент URL)."""
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"telegram {api_method}", "client") as span:
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+                if span is not None:
+                    span.set_attribute("http.status_code", code)
+        except TelegramError as e:
+            telegram_calls.labels(api_method, _outcome(e)).inc()
+            raise
+        finally:
+            telegram_duration.labels(api_method).observe(time.perf_counter() - started)
+        # ошибки API (400, 403, 429) приходят кодом ответа, исключение поднимет вызывающий
+        telegram_calls.labels(api_method, "ok" if code < 400 else str(code)).inc()
+        return code, payload
+
+
+async def _handle_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # заголовки запроса не нужны, но их надо дочитать до пустой строки
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, content_type, body = "200 OK", CONTENT_TYPE, REGISTRY.render().encode()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host: str, port: int) -> Optional[asyncio.AbstractServer]:
+    """Запускает сервер GET /metrics; port=0 — выключено."""
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle_metrics, host, port)
+    logger.info(f"Metrics server listening on {host}:{port}")
+    return server
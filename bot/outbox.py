@@ -0,0 +1,258 @@
+"""
+Надёжный outbox событий участников чатов.
+
+Обработчики new_chat_members / left_chat_member не ходят в backend сами: они
+записывают событие в локальный SQLite-файл и сразу возвращаются. Фоновый
+flusher раз в OUTBOX_FLUSH_INTERVAL секунд (или раньше, если накопился полный
+пакет) отправляет события пачкой в POST /bot/chats/members/batch.
+
+- события склеиваются по (tg_chat_id, tg_user_id): в очереди для пары всегда
+  одна строка, поздние поля перекрывают ранние (вошёл-вышел-вошёл = одна запись);
+- строка удаляется только после успешного ответа backend и только если её не
+  перезаписали новым событием во время отправки (проверка seq);
+- файл переживает перезапуск бота: недоставленные события уйдут после старта;
+- при ошибках backend — экспоненциальная задержка с jitter; пакет отбрасывается
+  только при 400/422 (backend отверг тело), остальные ответы — повтор.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from backend_client import BackendClient
+
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = "/bot/chats/members/batch"
+# Ответы, после которых пакет удаляется без доставки: тело отвергнуто валидацией
+REJECTED_STATUSES = (400, 422)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS member_events (
+    tg_chat_id INTEGER NOT NULL,
+    tg_user_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (tg_chat_id, tg_user_id)
+)
+"""
+
+
+class MemberOutbox:
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Запись идёт из потоков asyncio.to_thread, доступ сериализуем своим локом
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_member_events_seq ON member_events (seq)")
+        self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM member_events").fetchone()[0]
+
+        self._pending_since_flush = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.sent = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "MemberOutbox":
+        """Настройки из env (читаются после load_dotenv в bot.py)."""
+        return cls(
+            os.getenv("OUTBOX_PATH", "outbox.sqlite3"),
+            batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("OUTBOX_FLUSH_INTERVAL", "1")),
+            backoff_max=float(os.getenv("OUTBOX_BACKOFF_MAX", "60")),
+        )
+
+    # ---- запись (из обработчиков) ----
+
+    def _put(self, events: list[dict]) -> None:
+        rows = []
+        with self._lock:
+            for event in events:
+                self._seq += 1
+                payload = {k: v for k, v in event.items() if v is not None}
+                rows.append((
+                    payload.pop("tg_chat_id"),
+                    payload.pop("tg_user_id"),
+                    json.dumps(payload, ensure_ascii=False),
+                    self._seq,
+                    time.time(),
+                ))
+            # json_patch: поля нового события перекрывают поля ещё не отправленного
+            self._conn.executemany(
+                """
+                INSERT INTO member_events (tg_chat_id, tg_user_id, payload, seq, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (tg_chat_id, tg_user_id) DO UPDATE SET
+                    payload = json_patch(payload, excluded.payload),
+                    seq = excluded.seq
+                """,
+                rows,
+            )
+
+    async def put(self, *events: dict) -> None:
+        """
+        Ставит события в очередь. Каждое событие — поля MemberUpdateRequest
+        (tg_chat_id, tg_user_id, username, display_name, status, is_admin).
+        """
+        if not events:
+            return
+        await asyncio.to_thread(self._put, list(events))
+        self._pending_since_flush += len(events)
+        if self._wakeup is not None and self._pending_since_flush >= self.batch_size:
+            self._wakeup.set()
+
+    # ---- чтение (из flusher) ----
+
+    def _fetch(self, limit: int) -> list[tuple[int, int, str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT tg_chat_id, tg_user_id, payload, seq FROM member_events ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def _ack(self, rows: list[tuple[int, int, str, int]]) -> None:
+        # Перезаписанные во время отправки строки (новый seq) остаются в очереди
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM member_events WHERE tg_chat_id = ? AND tg_user_id = ? AND seq = ?",
+                [(chat_id, user_id, seq) for chat_id, user_id, _, seq in rows],
+            )
+
+    def depth(self) -> int:
+        """Число недоставленных событий (после склейки)."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM member_events").fetchone()[0]
+
+    def oldest_age(self) -> Optional[float]:
+        """Возраст самого старого недоставленного события в секундах."""
+        with self._lock:
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM member_events").fetchone()[0]
+        return None if oldest is None else time.time() - oldest
+
+    # ---- фоновая отправка ----
+
+    async def _send(self, client: BackendClient, rows: list[tuple[int, int, str, int]]) -> None:
+        updates = [
+            {"tg_chat_id": chat_id, "tg_user_id": user_id, **json.loads(payload)}
+            for chat_id, user_id, payload, _ in rows
+        ]
+        resp = await client.post(BATCH_PATH, json={"updates": updates}, idempotent=True)
+        if resp.status_code in REJECTED_STATUSES:
+            # Пакет, который backend никогда не примет, не должен блокировать очередь.
+            # Прочие 4xx (401/403 — токен, 404/405 — маршрут или прокси) — ошибки
+            # конфигурации: пакет остаётся в очереди и уходит повторно с задержкой
+            logger.error(
+                f"outbox: backend rejected batch of {len(rows)} events "
+                f"({resp.status_code}): {resp.text[:500]}"
+            )
+        else:
+            resp.raise_for_status()
+            skipped = resp.json().get("skipped_chats")
+            if skipped:
+                logger.warning(f"outbox: events for unregistered chats dropped: {skipped}")
+        await asyncio.to_thread(self._ack, rows)
+        self.sent += len(rows)
+
+    async def flush(self, client: BackendClient) -> int:
+        """Отправляет всё, что есть в очереди; возвращает число отправленных событий."""
+        self._pending_since_flush = 0
+        total = 0
+        while True:
+            rows = await asyncio.to_thread(self._fetch, self.batch_size)
+            if not rows:
+                return total
+            await self._send(client, rows)
+            total += len(rows)
+            if len(rows) < self.batch_size:
+                return total
+
+    async def _run(self, client: BackendClient) -> None:
+        failures = 0
+        while not self._stopping:
+            delay = self.flush_interval
+            try:
+                sent = await self.flush(client)
+                failures = 0
+                if sent:
+                    logger.info(f"outbox: sent {sent} events, depth={self.depth()}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                self.failures += 1
+                self.last_error = repr(e)
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** failures))
+                logger.warning(
+                    f"outbox: flush failed ({e!r}), depth={self.depth()}, retry in {delay:.1f}s"
+                )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self, client: BackendClient) -> None:
+        depth = self.depth()
+        if depth:
+            logger.info(f"outbox: {depth} undelivered events from previous run")
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(client), name="member-outbox")
+
+    async def stop(self, client: Optional[BackendClient] = None, timeout: float = 5.0) -> None:
+        """Останавливает flusher; при переданном client пытается дослать очередь."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            except Exception:
+                logger.exception("outbox: flusher crashed")
+            self._task = None
+        if client is not None:
+            try:
+                await asyncio.wait_for(self.flush(client), timeout=timeout)
+            except Exception as e:
+                logger.warning(f"outbox: final flush failed ({e!r}), depth={self.depth()}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "oldest_age_seconds": self.oldest_age(),
+            "sent": self.sent,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,90 @@
+"""
+Параллельная обработка апдейтов с сохранением порядка внутри чата.
+
+По умолчанию python-telegram-bot обрабатывает апдейты строго по одному:
+долгий /sync в большой группе задерживает все остальные чаты.
+ChatOrderedUpdateProcessor обрабатывает апдейты разных чатов параллельно
+(не больше concurrency одновременно), а апдейты одного чата —
+строго по очереди, поэтому вход и выход участника не переставляются.
+
+Очерёдность: Application запускает задачу на каждый апдейт в порядке
+получения, до захвата лока чата задача не уступает управление, а
+asyncio.Lock и asyncio.Semaphore отдаются ожидающим в порядке FIFO.
+
+Лок чата берётся до слота параллельности: апдейты, ждущие свой чат, не
+занимают слоты и не мешают другим чатам. Общее число принятых, но ещё не
+обработанных апдейтов ограничено max_pending_updates (обратное давление).
+"""
+import asyncio
+from typing import Any, Awaitable, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def ordering_key(update: object) -> Optional[Hashable]:
+    """Ключ очереди: чат апдейта, для апдейтов без чата (inline и т.п.) — пользователь."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return ("chat", update.effective_chat.id)
+    if update.effective_user is not None:
+        return ("user", update.effective_user.id)
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    __slots__ = ("_concurrency", "_slots", "_chat_locks")
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: Optional[int] = None):
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates must be a positive integer")
+        self._concurrency = max_concurrent_updates
+        # Семафор базового класса ограничивает принятые апдейты (в работе + ждущие свой чат)
+        super().__init__(max(max_pending_updates or 0, max_concurrent_updates * 16))
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # ключ -> [лок, число апдейтов в работе или в ожидании]
+        self._chat_locks: dict[Hashable, list[Any]] = {}
+
+    # max_concurrent_updates базового класса не переопределяется: по нему
+    # BaseUpdateProcessor.__init__ задаёт размер своего семафора, и это должен быть
+    # предел принятых апдейтов, а не число одновременно обрабатываемых
+
+    @property
+    def concurrency(self) -> int:
+        """Сколько апдейтов обрабатывается одновременно (слоты параллельности)."""
+        return self._concurrency
+
+    @property
+    def max_pending_updates(self) -> int:
+        return self._max_concurrent_updates
+
+    def active_chats(self) -> int:
+        """Число чатов, у которых есть апдейты в работе или в очереди."""
+        return len(self._chat_locks)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = ordering_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,6 @@
+"""
+Метрики и трассировка, общие для backend и бота.
+
+Пакет лежит в корне репозитория и копируется в оба образа (build context —
+корень репозитория, см. backend/Dockerfile и bot/Dockerfile).
+"""
@@ -0,0 +1,276 @@
+"""
+Метрики процесса в формате Prometheus (text exposition 0.0.4), без зависимостей.
+Общие для backend и бота: у каждого процесса свой REGISTRY.
+
+Горячий путь без блокировок: у каждого потока своя ячейка счётчиков
+(threading.local), пишет в неё только этот поток, а GET /metrics суммирует
+ячейки всех потоков. Увеличение счётчика — поиск своей ячейки и сложение;
+наблюдение в гистограмму — ещё bisect по заранее заданным корзинам (верхние
+границы, как le в Prometheus). Память не растёт с трафиком: хранится счётчик
+на корзину, сумма и число наблюдений.
+
+Лок берётся только при появлении нового набора меток или нового потока.
+Значения, которые дешевле прочитать при сборе (пул соединений, счётчики кеша),
+задаются колбэком (CallbackMetric).
+
+Квантили в stats() оцениваются по корзинам (верхняя граница корзины, в
+которую попал квантиль) — для сравнения маршрутов между собой этого достаточно.
+"""
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional, Sequence
+
+# Время, секунды: от 0.5 мс до 10 с
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Число SQL-выражений на запрос
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Sharded:
+    """Ячейки по потокам: пишет только поток-владелец, читают все."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._cells: list[list] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> list:
+        cell = getattr(self._local, "cell", None)
+        if cell is None:
+            cell = self._local.cell = [0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+        return cell
+
+    def totals(self) -> list:
+        with self._lock:
+            cells = list(self._cells)
+        totals = [0] * self._size
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class CounterChild:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards = _Sharded(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._shards.cell()[0] += amount
+
+    # Gauge (запросы в работе) — тот же счётчик, которому можно уменьшаться
+    def dec(self, amount: float = 1) -> None:
+        self._shards.cell()[0] -= amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class Histogram:
+    __slots__ = ("buckets", "_shards")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # корзины, последняя — +Inf; затем сумма и число наблюдений
+        self._shards = _Sharded(len(self.buckets) + 3)
+
+    def observe(self, value: float) -> None:
+        cell = self._shards.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def snapshot(self) -> tuple[list, float, int]:
+        """(счётчики по корзинам, сумма, число наблюдений)."""
+        totals = self._shards.totals()
+        return totals[:-2], totals[-2], totals[-1]
+
+    @property
+    def count(self) -> int:
+        return self.snapshot()[2]
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля сверху: граница корзины, в которую он попадает."""
+        counts, _, count = self.snapshot()
+        return self._quantile(counts, count, q)
+
+    def _quantile(self, counts: list, count: int, q: float) -> float:
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def stats(self) -> dict:
+        counts, total, count = self.snapshot()
+        cumulative, seen = {}, 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            seen += bucket_count
+            cumulative[_format_value(bound)] = seen
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "p50": self._quantile(counts, count, 0.5),
+            "p99": self._quantile(counts, count, 0.99),
+            "buckets": cumulative,
+        }
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple, object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def children(self) -> list[tuple[tuple, object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._render_samples()
+
+    def _render_samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+    def _render_samples(self) -> Iterable[str]:
+        for values, child in self.children():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1) -> None:
+        self._children[()].dec(amount)
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Histogram(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def stats(self) -> dict:
+        """Гистограммы по наборам меток (JSON для служебных эндпоинтов)."""
+        return {" ".join(values): child.stats() for values, child in self.children()}
+
+    def _render_samples(self) -> Iterable[str]:
+        for values, child in self.children():
+            counts, total, count = child.snapshot()
+            seen = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                seen += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {seen}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class CallbackMetric:
+    """Значения, которые читаются при сборе: collect() -> [(значения меток, число)]."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[tuple[tuple, float]]], registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,291 @@
+"""
+Трассировка запросов: trace id от апдейта бота до SQL в backend.
+
+Контекст передаётся заголовком W3C traceparent (00-<trace id>-<span id>-<флаги>):
+бот открывает трассу на каждый апдейт и ставит заголовок на все вызовы backend,
+backend продолжает её в middleware. Trace id есть у каждого запроса (он же в
+строке лога запроса и в заголовке ответа X-Trace-Id), а спаны пишутся только
+для выбранных трасс: решение принимается в начале трассы с вероятностью
+TRACE_SAMPLE_RATE и передаётся дальше флагом sampled.
+
+Спаны копятся в памяти и пачками уходят из фонового потока в формате
+OTLP/JSON (resourceSpans): POST на TRACE_OTLP_ENDPOINT (OTLP/HTTP,
+например http://collector:4318/v1/traces) или, если он не задан, строкой
+на пачку в файл TRACE_FILE. Очередь ограничена: при отставании экспорта
+спаны отбрасываются, а не копятся.
+
+При TRACE_SAMPLE_RATE=0 (по умолчанию) спаны не создаются вовсе: span()
+возвращает общий пустой контекст, а record() выходит на первой проверке.
+
+Общая реализация для backend и бота; трассировщик сервиса создаётся в
+backend/tracing.py и bot/tracing.py (Tracer.from_env с именем сервиса).
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = "traceparent"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """(trace id, span id родителя, sampled) или None для пустого/битого заголовка."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_trace_id() -> Optional[str]:
+    return _current_trace_id.get()
+
+
+def current_span() -> Optional["Span"]:
+    return _current_span.get()
+
+
+class Span:
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", trace_id: str, parent_id: Optional[str], name: str,
+                 kind: str = "internal", attributes: Optional[dict] = None, start_ns: Optional[int] = None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        self.tracer.exporter.export(self)
+
+    # спан — контекстный менеджер: внутри он текущий, на выходе закрывается
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+        if exc is not None and self.error is None:
+            self.error = repr(exc)
+        self.end()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class _NoopScope:
+    """Пустой контекст для невыбранных трасс: один объект на процесс."""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NOOP = _NoopScope()
+
+
+class SpanExporter:
+    """Пачки спанов в OTLP/JSON из фонового потока: HTTP POST или строка в файл."""
+
+    def __init__(self, service: str, path: Optional[str], endpoint: Optional[str],
+                 batch_size: int = 512, interval: float = 1.0, max_queue: int = 10_000):
+        self.service = service
+        self.path = path
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, span: Span) -> None:
+        if self._queue.qsize() >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.put(span)
+        if self._thread is None:
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def payload(self, spans: list[Span]) -> bytes:
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service)]},
+            "scopeSpans": [{"scope": {"name": f"padel.{self.service}"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def flush(self, spans: list[Span]) -> None:
+        body = self.payload(spans)
+        try:
+            if self.endpoint:
+                request = urllib.request.Request(
+                    self.endpoint, data=body, method="POST", headers={"Content-Type": "application/json"},
+                )
+                with urllib.request.urlopen(request, timeout=5):
+                    pass
+            else:
+                with open(self.path, "ab") as f:
+                    f.write(body + b"\n")
+            self.exported += len(spans)
+        except Exception as e:  # трассы — диагностика, сервис от них не зависит
+            self.dropped += len(spans)
+            logger.warning(f"span export failed ({len(spans)} spans): {e!r}")
+
+
+class Tracer:
+    def __init__(self, service: str, sample_rate: float, exporter: SpanExporter):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @classmethod
+    def from_env(cls, service: str) -> "Tracer":
+        return cls(
+            service,
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")),
+            exporter=SpanExporter(
+                service,
+                path=os.getenv("TRACE_FILE", "traces.jsonl"),
+                endpoint=os.getenv("TRACE_OTLP_ENDPOINT") or None,
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, kind: str = "server",
+                    attributes: Optional[dict] = None) -> Optional[Span]:
+        """
+        Начинает (или продолжает по заголовку traceparent) трассу в текущем контексте.
+        Trace id запоминается всегда, корневой спан возвращается только для выбранной трассы.
+        """
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = _new_id(128), None
+            sampled = self.enabled and random.random() < self.sample_rate
+        _current_trace_id.set(trace_id)
+        if not (sampled and self.enabled):
+            return None
+        return Span(self, trace_id, parent_id, name, kind, attributes)
+
+    def span(self, name: str, kind: str = "internal", **attributes: Any):
+        """Дочерний спан текущего; вне выбранной трассы — пустой контекст."""
+        parent = _current_span.get()
+        if parent is None:
+            return _NOOP
+        return Span(self, parent.trace_id, parent.span_id, name, kind, attributes)
+
+    def record(self, name: str, start_ns: int, end_ns: int, kind: str = "internal", **attributes: Any) -> None:
+        """Уже завершившийся дочерний спан (время известно постфактум, как у SQL)."""
+        parent = _current_span.get()
+        if parent is None:
+            return
+        Span(self, parent.trace_id, parent.span_id, name, kind, attributes, start_ns).end(end_ns)
+
+    def traceparent(self) -> Optional[str]:
+        """Заголовок для исходящего вызова: от текущего спана или с trace id невыбранной трассы."""
+        span = _current_span.get()
+        if span is not None:
+            return span.traceparent()
+        trace_id = _current_trace_id.get()
+        if trace_id is not None:
+            return f"00-{trace_id}-{_new_id(64)}-00"
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "exported": self.exporter.exported,
+            "dropped": self.exporter.dropped,
+            "queued": self.exporter._queue.qsize(),
+        }
@@ -27,8 +27,10 @@ import {
 } from "@mui/material";
 import ParticipantPicker from "./ParticipantPicker";
 import ChatSelector from "./ChatSelector";
+import { authHeaders, ensureSession, fetchPlayersPage } from "./api";
 
 const API_URL = import.meta.env.VITE_API_URL as string;
+const PLAYERS_PAGE_SIZE = 100;
 
 interface PlayerRow {
   player_id: number;
@@ -280,18 +282,30 @@ function App() {
   // просмотр игроков (общий список)
   const [players, setPlayers] = useState<Player[]>([]);
   const [loadingPlayers, setLoadingPlayers] = useState(false);
+  const [playersCursor, setPlayersCursor] = useState<string | null>(null);
 
   // Управление группами
   const [activeChatId, setActiveChatId] = useState<number | null>(() => {
     const stored = localStorage.getItem("activeChatId");
     return stored ? parseInt(stored, 10) : null;
   });
-  // TODO: Добавить UI для ввода userTgId или получать из Telegram WebApp
-  const [userTgId] = useState<number | null>(() => {
+  // userTgId берётся из сессии Telegram WebApp, вне Telegram — из localStorage
+  const [userTgId, setUserTgId] = useState<number | null>(() => {
     const stored = localStorage.getItem("userTgId");
     return stored ? parseInt(stored, 10) : null;
   });
 
+  // обмениваем Telegram initData на сессионный токен один раз при старте
+  useEffect(() => {
+    ensureSession()
+      .then((session) => {
+        if (session) {
+          setUserTgId(session.tg_id);
+        }
+      })
+      .catch((err) => console.error("Ошибка получения сессии", err));
+  }, []);
+
   // подгружаем режимы рейтинга при старте
   useEffect(() => {
     fetch(`${API_URL}/rating/modes`)
@@ -325,21 +339,20 @@ function App() {
     }
   };
 
-  // подгрузка списка игроков для экрана "Игроки"
-  const loadPlayers = async () => {
+  // подгрузка списка игроков для экрана "Игроки" — страницами по рейтингу
+  const loadPlayers = async (cursor: string | null = null) => {
     setLoadingPlayers(true);
     setError(null);
     try {
-      const res = await fetch(`${API_URL}/players`);
-      if (!res.ok) {
-        throw new Error(`HTTP ${res.status}`);
-      }
-      const data: Player[] = await res.json();
-      setPlayers(data);
+      const page = await fetchPlayersPage<Player>(cursor, PLAYERS_PAGE_SIZE);
+      setPlayers((prev) => (cursor ? [...prev, ...page.players] : page.players));
+      setPlayersCursor(page.nextCursor);
     } catch (e: any) {
       console.error(e);
       setError("Не удалось загрузить список игроков");
-      setPlayers([]);
+      if (!cursor) {
+        setPlayers([]);
+      }
     } finally {
       setLoadingPlayers(false);
     }
@@ -415,7 +428,7 @@ function App() {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
-          "X-User-Tg-Id": userTgId.toString(),
+          ...authHeaders(userTgId),
         },
         body: JSON.stringify(requestBody),
       });
@@ -821,7 +834,7 @@ function App() {
           Игроки
         </Typography>
 
-        {loadingPlayers && (
+        {loadingPlayers && players.length === 0 && (
           <Box display="flex" justifyContent="center" mt={4}>
             <CircularProgress />
           </Box>
@@ -831,7 +844,7 @@ function App() {
           <Alert severity="info">Пока нет игроков.</Alert>
         )}
 
-        {!loadingPlayers && players.length > 0 && (
+        {players.length > 0 && (
           <Paper sx={{ p: { xs: 1, sm: 2 }, overflow: 'auto' }}>
             <Box sx={{ overflowX: 'auto' }}>
               <Table size="small" sx={{ minWidth: 500 }}>
@@ -879,6 +892,17 @@ function App() {
                 </TableBody>
               </Table>
             </Box>
+            {playersCursor && (
+              <Box display="flex" justifyContent="center" mt={2}>
+                <Button
+                  variant="outlined"
+                  disabled={loadingPlayers}
+                  onClick={() => loadPlayers(playersCursor)}
+                >
+                  {loadingPlayers ? <CircularProgress size={20} /> : "Показать ещё"}
+                </Button>
+              </Box>
+            )}
           </Paper>
         )}
       </Box>
@@ -10,6 +10,7 @@ import {
   CircularProgress,
   Alert,
 } from "@mui/material";
+import { authHeaders } from "./api";
 
 const API_URL = import.meta.env.VITE_API_URL as string;
 
@@ -37,9 +38,7 @@ export default function ChatSelector({ userTgId, onChatSelected }: ChatSelectorP
       setError(null);
       try {
         const response = await fetch(`${API_URL}/chats?admin_only=true`, {
-          headers: {
-            "X-User-Tg-Id": userTgId.toString(),
-          },
+          headers: authHeaders(userTgId),
         });
 
         if (!response.ok) {
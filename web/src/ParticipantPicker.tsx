@@ -42,7 +42,11 @@ import {
 } from "@dnd-kit/sortable";
 import { CSS } from "@dnd-kit/utilities";
 
+import { fetchPlayersPage } from "./api";
+
 const API_URL = import.meta.env.VITE_API_URL as string;
+const PICKER_PAGE_SIZE = 100;
+const SEARCH_DEBOUNCE_MS = 250;
 
 interface Player {
   id: number;
@@ -209,6 +213,7 @@ export default function ParticipantPicker({
   const [activeTab, setActiveTab] = useState<TabType>("all");
   const [searchQuery, setSearchQuery] = useState("");
   const [allPlayers, setAllPlayers] = useState<Player[]>([]);
+  const [searchResults, setSearchResults] = useState<Player[] | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [activeId, setActiveId] = useState<string | null>(null);
@@ -220,17 +225,13 @@ export default function ParticipantPicker({
     })
   );
 
-  // Загрузка всех игроков
+  // Первая страница игроков по рейтингу; остальных находит поиск на сервере
   useEffect(() => {
     setLoading(true);
     setError(null);
-    fetch(`${API_URL}/players`)
-      .then((res) => {
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        return res.json();
-      })
-      .then((data: Player[]) => {
-        setAllPlayers(data);
+    fetchPlayersPage<Player>(null, PICKER_PAGE_SIZE)
+      .then((page) => {
+        setAllPlayers(page.players);
       })
       .catch((err) => {
         console.error(err);
@@ -241,20 +242,43 @@ export default function ParticipantPicker({
       });
   }, []);
 
-  // Фильтрация игроков по поиску
-  const filteredPlayers = useMemo(() => {
-    let players = allPlayers;
-
-    // Фильтр по поиску
-    if (searchQuery.trim()) {
-      const query = searchQuery.toLowerCase();
-      players = players.filter(
-        (p) =>
-          p.display_name.toLowerCase().includes(query) ||
-          p.username?.toLowerCase().includes(query) ||
-          p.tg_id.toString().includes(query)
-      );
+  // Поиск по всем игрокам (/players/search) с задержкой после ввода
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
     }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      fetch(`${API_URL}/players/search?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+        .then((res) => {
+          if (!res.ok) throw new Error(`HTTP ${res.status}`);
+          return res.json();
+        })
+        .then((data: Player[]) => {
+          setSearchResults(data);
+        })
+        .catch((err) => {
+          if (err.name === "AbortError") return;
+          console.error(err);
+          setError("Не удалось выполнить поиск");
+        });
+    }, SEARCH_DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchQuery]);
+
+  const shownPlayers = searchResults ?? allPlayers;
+  const findPlayer = (id: string) =>
+    shownPlayers.find((p) => p.id.toString() === id) ||
+    allPlayers.find((p) => p.id.toString() === id);
+
+  // Список для выбора
+  const filteredPlayers = useMemo(() => {
+    let players = shownPlayers;
 
     // Фильтр по табам (пока упрощённо - все табы показывают всех)
     // TODO: Реализовать логику для "Частые", "Последние", "Избранные"
@@ -266,7 +290,7 @@ export default function ParticipantPicker({
     // Исключаем уже выбранных
     const selectedIds = new Set(selectedParticipants.map((p) => p.id));
     return players.filter((p) => !selectedIds.has(p.id));
-  }, [allPlayers, searchQuery, activeTab, selectedParticipants]);
+  }, [shownPlayers, activeTab, selectedParticipants]);
 
   const handleToggleParticipant = (player: Player) => {
     const isSelected = selectedParticipants.some((p) => p.id === player.id);
@@ -296,7 +320,7 @@ export default function ParticipantPicker({
 
     // Если перетаскиваем в drop zone выбранных
     if (overId === "selected-drop-zone") {
-      const player = allPlayers.find((p) => p.id.toString() === activeId);
+      const player = findPlayer(activeId);
       if (player && !selectedParticipants.some((p) => p.id === player.id)) {
         if (selectedParticipants.length < maxParticipants) {
           handleToggleParticipant(player);
@@ -314,7 +338,7 @@ export default function ParticipantPicker({
 
     // Если перетаскиваем из списка всех в выбранные (на другую карточку)
     if (activeSource === "all" && overSource === "selected") {
-      const player = allPlayers.find((p) => p.id.toString() === activeId);
+      const player = findPlayer(activeId);
       if (player && !selectedParticipants.some((p) => p.id === player.id)) {
         if (selectedParticipants.length < maxParticipants) {
           handleToggleParticipant(player);
@@ -339,7 +363,7 @@ export default function ParticipantPicker({
 
   const selectedIds = new Set(selectedParticipants.map((p) => p.id));
   const draggedPlayer = activeId
-    ? allPlayers.find((p) => p.id.toString() === activeId) ||
+    ? findPlayer(activeId) ||
       selectedParticipants.find((p) => p.id.toString() === activeId)
     : null;
 
@@ -4,15 +4,86 @@
 
 const API_URL = import.meta.env.VITE_API_URL as string;
 
+// ==================== Сессия WebApp ====================
+
+export interface Session {
+  token: string;
+  expires_at: number;
+  player_id: number;
+  tg_id: number;
+  roles: Record<string, "admin" | "member">;
+}
+
+const SESSION_KEY = "padelSession";
+
+function telegramInitData(): string | null {
+  const initData = (window as any).Telegram?.WebApp?.initData;
+  return initData ? (initData as string) : null;
+}
+
+export function getSession(): Session | null {
+  const stored = sessionStorage.getItem(SESSION_KEY);
+  if (!stored) {
+    return null;
+  }
+  const session: Session = JSON.parse(stored);
+  // обновляем токен заранее, за 30 секунд до истечения
+  if (session.expires_at - 30 < Date.now() / 1000) {
+    sessionStorage.removeItem(SESSION_KEY);
+    return null;
+  }
+  return session;
+}
+
+/**
+ * Один раз обменивает Telegram initData на сессионный токен.
+ * Вне Telegram (нет initData) возвращает null — тогда работает X-User-Tg-Id.
+ */
+export async function ensureSession(force = false): Promise<Session | null> {
+  if (!force) {
+    const existing = getSession();
+    if (existing) {
+      return existing;
+    }
+  }
+
+  const initData = telegramInitData();
+  if (!initData) {
+    return null;
+  }
+
+  const res = await fetch(`${API_URL}/auth/session`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ init_data: initData }),
+  });
+  if (!res.ok) {
+    sessionStorage.removeItem(SESSION_KEY);
+    return null;
+  }
+
+  const session: Session = await res.json();
+  sessionStorage.setItem(SESSION_KEY, JSON.stringify(session));
+  return session;
+}
+
+export function authHeaders(userTgId: number | null): Record<string, string> {
+  const session = getSession();
+  if (session) {
+    return { Authorization: `Bearer ${session.token}` };
+  }
+  if (userTgId !== null) {
+    return { "X-User-Tg-Id": userTgId.toString() };
+  }
+  return {};
+}
+
 export function getHeaders(userTgId: number | null, chatId: number | null): HeadersInit {
-  const headers: HeadersInit = {
+  const headers: Record<string, string> = {
     "Content-Type": "application/json",
+    ...authHeaders(userTgId),
   };
   
-  if (userTgId !== null) {
-    headers["X-User-Tg-Id"] = userTgId.toString();
-  }
-  
   if (chatId !== null) {
     headers["X-Chat-Id"] = chatId.toString();
   }
@@ -27,13 +98,53 @@ export async function apiFetch(
   chatId: number | null = null
 ): Promise<Response> {
   const url = endpoint.startsWith("http") ? endpoint : `${API_URL}${endpoint}`;
-  
-  return fetch(url, {
-    ...options,
-    headers: {
-      ...getHeaders(userTgId, chatId),
-      ...options.headers,
-    },
-  });
+  const doFetch = () =>
+    fetch(url, {
+      ...options,
+      headers: {
+        ...getHeaders(userTgId, chatId),
+        ...options.headers,
+      },
+    });
+
+  const res = await doFetch();
+  // токен истёк или отозван (сменились роли) — получаем новый и повторяем один раз
+  if (res.status === 401 && getSession()) {
+    sessionStorage.removeItem(SESSION_KEY);
+    if (await ensureSession(true)) {
+      return doFetch();
+    }
+  }
+  return res;
+}
+
+
+// ==================== Игроки ====================
+
+export interface PlayersPage<T> {
+  players: T[];
+  nextCursor: string | null;
 }
 
+/**
+ * Страница GET /players (по рейтингу). cursor — из nextCursor предыдущей
+ * страницы, null — первая страница.
+ */
+export async function fetchPlayersPage<T>(
+  cursor: string | null,
+  limit = 100,
+  chatId: number | null = null
+): Promise<PlayersPage<T>> {
+  const params = new URLSearchParams({ limit: limit.toString() });
+  if (cursor) {
+    params.set("cursor", cursor);
+  }
+  if (chatId !== null) {
+    params.set("chat_id", chatId.toString());
+  }
+  const res = await fetch(`${API_URL}/players?${params}`);
+  if (!res.ok) {
+    throw new Error(`HTTP ${res.status}`);
+  }
+  return { players: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
+}